@@ -1 +1 @@
-from .core import proc_sideband
+from .core import proc_sideband, proc_sideband_stack
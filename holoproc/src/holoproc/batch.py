@@ -0,0 +1,626 @@
+"""Reprocess directories of archived holograms on many processes and machines.
+
+Every TIFF file in the input directory is a task of a work queue that lives in the
+output directory, so that any number of workers on any number of machines that share
+the filesystem can process the same archive at once:
+
+    <out_root>/<params id>/params.json      the processing parameters
+    <out_root>/<params id>/claims/<task>    claim of a task by a live worker
+    <out_root>/<params id>/done/<task>.json completion record of a task
+    <out_root>/<params id>/failed/<task>    traceback of the last failure of a task
+    <out_root>/<params id>/partial/<task>/  output of a task that is in progress
+    <out_root>/<params id>/phase/<task>/    finished output of a task
+
+The queue relies only on operations that are atomic on POSIX filesystems, including
+NFS v3 and later: exclusive creation of claim files, and renames. Claims are leases
+that their worker renews after every batch. A claim that is not renewed for lease_s
+seconds, because its worker or its machine died, is taken over by another worker,
+which resumes the partial output from its last checkpoint.
+
+Outputs are idempotent. A task's output is written to partial/ and renamed into
+phase/ only once it is complete, and finished tasks are never processed again. Each
+set of processing parameters has its own output directory, so changing them starts a
+new run instead of mixing the outputs of different parameters.
+
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields, replace
+from enum import Enum
+import hashlib
+import json
+import os
+from pathlib import Path
+import socket
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+import uuid
+
+from .core import Precision, proc_sideband_stack
+from .fft_backends import (
+    FFTBackend,
+    NumpyBackend,
+    PyFFTWBackend,
+    ScipyBackend,
+    resolve_workers,
+)
+from .ingest import center_crop, iter_tiff_batches, tiff_shape
+from .store import NpyChunkWriter
+from .unwrapping import UnwrapMethod, Unwrapper
+
+
+class ClaimLost(Exception):
+    """Raised when another worker took over a task after its lease expired."""
+
+
+@dataclass(frozen=True)
+class BatchParams:
+    """Parameters of the processing of every file of an archive.
+
+    Only parameters that change the outputs belong here, since they are hashed into
+    the name of the output directory. Options that only change how the files are
+    processed, such as the batch size, are arguments of run_worker instead.
+
+    Parameters
+    ----------
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels, as returned by
+        locate_carrier. Overrides the shift computed from the grating period.
+    num_px : Optional[int]
+        Side length of the crop about the center of each frame. Frames, which must
+        then be square, are not cropped if it is None.
+    precision : Precision
+        Floating point precision of the processing and of the outputs.
+    unwrap_method : UnwrapMethod
+        Unwrapping algorithm.
+
+    """
+
+    px_size_um: float = 5.2
+    wavelength_um: float = 0.641
+    mag_obj: float = 20
+    mag_4f: float = 4
+    na: float = 0.4
+    grating_period: float = 3.3333
+    carrier: Optional[Tuple[float, float]] = None
+    num_px: Optional[int] = 256
+    precision: Precision = Precision.DOUBLE
+    unwrap_method: UnwrapMethod = UnwrapMethod.QUALITY_GUIDED
+
+    def to_dict(self) -> Dict:
+        """Return the parameters as a dictionary that can be written as JSON."""
+        data = asdict(self)
+        for field in fields(self):
+            value = data[field.name]
+            if isinstance(value, Enum):
+                data[field.name] = value.value
+            elif field.type is float:
+                # So that e.g. 20 and 20.0 hash to the same run
+                data[field.name] = float(value)
+            elif field.name == "carrier" and value is not None:
+                data[field.name] = [float(v) for v in value]
+
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BatchParams":
+        """Return the parameters of a dictionary as written by to_dict."""
+        data = dict(data)
+        if data.get("carrier") is not None:
+            data["carrier"] = tuple(data["carrier"])
+        if "precision" in data:
+            data["precision"] = Precision(data["precision"])
+        if "unwrap_method" in data:
+            data["unwrap_method"] = UnwrapMethod(data["unwrap_method"])
+
+        return cls(**data)
+
+    @property
+    def id(self) -> str:
+        """Short hash that identifies the parameters."""
+        data = json.dumps(self.to_dict(), sort_keys=True).encode()
+
+        return hashlib.sha256(data).hexdigest()[:12]
+
+    @property
+    def optics(self) -> Dict:
+        """Parameters of proc_sideband_stack that determine the sideband plan."""
+        return dict(
+            px_size_um=self.px_size_um,
+            wavelength_um=self.wavelength_um,
+            mag_obj=self.mag_obj,
+            mag_4f=self.mag_4f,
+            na=self.na,
+            grating_period=self.grating_period,
+            carrier=self.carrier,
+        )
+
+
+def worker_id() -> str:
+    """Return the name of this worker in claims: its host and process ID."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    """Write a file so that readers see either nothing or all of it."""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def task_name(path: Path, input_dir: Path) -> str:
+    """Return the name of the task of a file, from its path relative to input_dir."""
+    relative_path = Path(path).relative_to(input_dir).with_suffix("")
+
+    return relative_path.as_posix().replace("/", "__")
+
+
+class WorkQueue:
+    """A queue of tasks that is shared through files on a shared filesystem.
+
+    Parameters
+    ----------
+    root : Path
+        Directory of the queue.
+    lease_s : float
+        Time in seconds after which a claim that was not renewed is considered
+        abandoned and may be taken over by another worker. It must be longer than the
+        time needed to process one batch.
+
+    """
+
+    def __init__(self, root: Path, lease_s: float = 600) -> None:
+        self.root = Path(root)
+        self.lease_s = lease_s
+        self.worker = worker_id()
+        for name in ("claims", "done", "failed"):
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+
+    def _claim_path(self, task: str) -> Path:
+        return self.root / "claims" / task
+
+    def _done_path(self, task: str) -> Path:
+        return self.root / "done" / f"{task}.json"
+
+    def _failed_path(self, task: str) -> Path:
+        return self.root / "failed" / task
+
+    def is_done(self, task: str) -> bool:
+        return self._done_path(task).exists()
+
+    def _is_stale(self, path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime > self.lease_s
+        except FileNotFoundError:
+            return False
+
+    def _create_claim(self, task: str) -> bool:
+        try:
+            fd = os.open(self._claim_path(task), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, "w") as f:
+            f.write(self.worker)
+
+        return True
+
+    def claim(self, task: str) -> bool:
+        """Try to claim a task, and return whether this worker now holds it.
+
+        A claim whose lease expired is taken over. Of several workers that try to
+        take over the same claim, only the one whose rename succeeds does.
+
+        """
+        if self.is_done(task):
+            return False
+
+        if self._create_claim(task):
+            return True
+
+        path = self._claim_path(task)
+        if not self._is_stale(path):
+            return False
+
+        stale_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.stale")
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+
+        # Another worker may have replaced the stale claim by a fresh one between the
+        # check and the rename. If so, put it back.
+        if not self._is_stale(stale_path):
+            try:
+                os.link(stale_path, path)
+            except FileExistsError:
+                pass
+            stale_path.unlink()
+            return False
+
+        stale_path.unlink()
+
+        return self._create_claim(task)
+
+    def renew(self, task: str) -> None:
+        """Renew the lease of a claimed task, or raise ClaimLost if it was lost."""
+        path = self._claim_path(task)
+        try:
+            if path.read_text() != self.worker:
+                raise ClaimLost(task)
+            os.utime(path)
+        except FileNotFoundError:
+            raise ClaimLost(task) from None
+
+    def release(self, task: str) -> None:
+        """Give up the claim of a task, if this worker still holds it."""
+        path = self._claim_path(task)
+        try:
+            if path.read_text() == self.worker:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def mark_done(self, task: str, info: Optional[Dict] = None) -> None:
+        """Record that a task is finished and release its claim."""
+        record = {"worker": self.worker, "time": time.time(), **(info or {})}
+        _write_atomic(self._done_path(task), json.dumps(record))
+
+        failed_path = self._failed_path(task)
+        if failed_path.exists():
+            failed_path.unlink()
+
+        self.release(task)
+
+    def mark_failed(self, task: str, error: str) -> None:
+        """Record the failure of a task and release it, so that it can be retried."""
+        _write_atomic(self._failed_path(task), f"{self.worker}\n{error}")
+        self.release(task)
+
+    def status(self, tasks: List[str]) -> Dict[str, int]:
+        """Count the tasks that are done, claimed, failed and pending."""
+        counts = {"done": 0, "claimed": 0, "failed": 0, "pending": 0}
+        for task in tasks:
+            if self.is_done(task):
+                counts["done"] += 1
+            elif self._claim_path(task).exists():
+                counts["claimed"] += 1
+            elif self._failed_path(task).exists():
+                counts["failed"] += 1
+            else:
+                counts["pending"] += 1
+
+        return counts
+
+
+def prepare_run(out_root: Path, params: BatchParams) -> Path:
+    """Create the output directory of a parameter set and record its parameters."""
+    run_dir = Path(out_root) / params.id
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    params_path = run_dir / "params.json"
+    if not params_path.exists():
+        _write_atomic(params_path, json.dumps(params.to_dict(), indent=2))
+
+    return run_dir
+
+
+def process_file(
+    path: Path,
+    out_dir: Path,
+    params: BatchParams,
+    unwrapper: Unwrapper,
+    batch_size: int = 16,
+    backend: Optional[FFTBackend] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+) -> int:
+    """Write the unwrapped phase of every frame of a TIFF file to a chunked store.
+
+    Frames that are already in the store, up to its last flush, are skipped, so an
+    interrupted file is resumed where it stopped. The sideband plan is cached between
+    calls with the same parameters and frame shape.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the TIFF file.
+    out_dir : Path
+        Directory of the store of the unwrapped phase.
+    params : BatchParams
+        Processing parameters.
+    unwrapper : Unwrapper
+        Unwrapper of the phase.
+    batch_size : int
+        Number of frames processed at once. The store is flushed after every batch.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    checkpoint : Optional[Callable[[], None]]
+        Function called without arguments after every batch has been flushed.
+
+    Returns
+    -------
+    int
+        Number of frames in the store.
+
+    """
+    frame_shape = tiff_shape(path)[-2:]
+    crop = None if params.num_px is None else center_crop(frame_shape, params.num_px)
+    num_px = frame_shape[-1] if params.num_px is None else params.num_px
+
+    writer = NpyChunkWriter(
+        out_dir, (num_px, num_px), dtype=params.precision.real_dtype, resume=True
+    )
+    try:
+        batches = iter_tiff_batches(
+            path,
+            batch_size=batch_size,
+            crop=crop,
+            start=writer.count,
+            dtype=params.precision.real_dtype,
+        )
+        for batch in batches:
+            results = proc_sideband_stack(
+                batch,
+                backend=backend,
+                precision=params.precision,
+                unwrapper=unwrapper,
+                outputs=["phase_unwrapped"],
+                **params.optics,
+            )
+            writer.append(results["phase_unwrapped"])
+
+            writer.flush()
+            if checkpoint is not None:
+                checkpoint()
+    finally:
+        writer.close()
+
+    return writer.count
+
+
+def find_files(input_dir: Path, pattern: str = "*.tif") -> List[Path]:
+    """Return the files of an archive that match a pattern, in every subdirectory."""
+    return sorted(Path(input_dir).rglob(pattern))
+
+
+def run_worker(
+    input_dir: Path,
+    out_root: Path,
+    params: BatchParams = BatchParams(),
+    pattern: str = "*.tif",
+    lease_s: float = 600,
+    poll_s: Optional[float] = None,
+    batch_size: int = 16,
+    backend: Optional[FFTBackend] = None,
+) -> int:
+    """Process the files of an archive that no other worker has processed or claimed.
+
+    Run this on as many machines as needed, with the same arguments and an out_root
+    on a shared filesystem.
+
+    Parameters
+    ----------
+    input_dir : Path
+        Directory of the TIFF files to process.
+    out_root : Path
+        Directory of the outputs and the work queue.
+    params : BatchParams
+        Processing parameters.
+    pattern : str
+        Pattern of the names of the files to process.
+    lease_s : float
+        Time in seconds after which the claim of a worker that stopped renewing it
+        is taken over.
+    poll_s : Optional[float]
+        If set, wait for this many seconds between passes over the files until every
+        file is done, so that the tasks of workers that die are taken over when their
+        leases expire. Otherwise make a single pass.
+    batch_size : int
+        Number of frames processed at once. The output is checkpointed after every
+        batch. It does not change the outputs, so it may differ between workers and
+        between runs.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to single-threaded SciPy FFTs, since
+        workers usually run in as many processes as there are CPUs.
+
+    Returns
+    -------
+    int
+        Number of files processed by this worker.
+
+    """
+    input_dir = Path(input_dir)
+    run_dir = prepare_run(out_root, params)
+    work_queue = WorkQueue(run_dir, lease_s=lease_s)
+    backend = ScipyBackend(workers=1) if backend is None else backend
+
+    num_processed = 0
+    with Unwrapper(workers=1, method=params.unwrap_method) as unwrapper:
+        while True:
+            remaining = 0
+            for path in find_files(input_dir, pattern):
+                task = task_name(path, input_dir)
+                if work_queue.is_done(task):
+                    continue
+                if not work_queue.claim(task):
+                    remaining += 1
+                    continue
+
+                partial_dir = run_dir / "partial" / task
+                final_dir = run_dir / "phase" / task
+                try:
+                    # The output may be complete if a worker died before marking it
+                    if not final_dir.exists():
+                        process_file(
+                            path,
+                            partial_dir,
+                            params,
+                            unwrapper,
+                            batch_size=batch_size,
+                            backend=backend,
+                            checkpoint=lambda: work_queue.renew(task),
+                        )
+                        work_queue.renew(task)
+                        final_dir.parent.mkdir(exist_ok=True)
+                        os.replace(partial_dir, final_dir)
+                except ClaimLost:
+                    continue
+                except Exception:
+                    work_queue.mark_failed(task, traceback.format_exc())
+                    continue
+
+                work_queue.mark_done(task, {"input": str(path)})
+                num_processed += 1
+
+            if poll_s is None or remaining == 0:
+                break
+            time.sleep(poll_s)
+
+    return num_processed
+
+
+def run(
+    input_dir: Path,
+    out_root: Path,
+    params: BatchParams = BatchParams(),
+    processes: int = -1,
+    **kwargs,
+) -> int:
+    """Process an archive with several local worker processes.
+
+    Each process runs run_worker, by default with single-threaded FFTs and
+    unwrapping, which scales better over files than threads do over the frames of one
+    file.
+
+    Parameters
+    ----------
+    input_dir : Path
+        Directory of the TIFF files to process.
+    out_root : Path
+        Directory of the outputs and the work queue.
+    params : BatchParams
+        Processing parameters.
+    processes : int
+        Number of worker processes, as for resolve_workers.
+    **kwargs
+        Additional arguments of run_worker.
+
+    Returns
+    -------
+    int
+        Number of files processed by the processes.
+
+    """
+    processes = resolve_workers(processes)
+    if processes == 1:
+        return run_worker(input_dir, out_root, params, **kwargs)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(run_worker, input_dir, out_root, params, **kwargs)
+            for _ in range(processes)
+        ]
+
+        return sum(f.result() for f in futures)
+
+
+BACKENDS = {"numpy": NumpyBackend, "scipy": ScipyBackend, "pyfftw": PyFFTWBackend}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("out_root", type=Path)
+    parser.add_argument(
+        "--params",
+        type=Path,
+        help="JSON file of processing parameters, e.g. the params.json of a run. "
+        "The options below override its values.",
+    )
+
+    # Processing parameters, which default to those of BatchParams
+    for field in fields(BatchParams):
+        if field.name in ("carrier", "precision", "unwrap_method", "num_px"):
+            continue
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=float)
+    parser.add_argument(
+        "--carrier",
+        type=float,
+        nargs=2,
+        metavar=("ROW", "COL"),
+        help="Row and column frequencies of the sideband in pixels",
+    )
+    parser.add_argument(
+        "--num-px", type=int, help="Side length of the center crop; 0 to not crop"
+    )
+    parser.add_argument("--precision", choices=[p.value for p in Precision])
+    parser.add_argument("--unwrap-method", choices=[m.value for m in UnwrapMethod])
+
+    # Execution options, which do not change the outputs
+    parser.add_argument("--processes", type=int, default=-1)
+    parser.add_argument("--pattern", default="*.tif")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--backend", choices=list(BACKENDS), default="scipy")
+    parser.add_argument("--fft-workers", type=int, default=1)
+    parser.add_argument("--lease", type=float, default=600)
+    parser.add_argument("--poll", type=float, default=None)
+    args = parser.parse_args()
+
+    params = BatchParams()
+    if args.params is not None:
+        params = BatchParams.from_dict(json.loads(args.params.read_text()))
+
+    overrides = {
+        field.name: getattr(args, field.name)
+        for field in fields(BatchParams)
+        if getattr(args, field.name) is not None
+    }
+    if "carrier" in overrides:
+        overrides["carrier"] = tuple(overrides["carrier"])
+    if "num_px" in overrides:
+        overrides["num_px"] = overrides["num_px"] or None
+    if "precision" in overrides:
+        overrides["precision"] = Precision(overrides["precision"])
+    if "unwrap_method" in overrides:
+        overrides["unwrap_method"] = UnwrapMethod(overrides["unwrap_method"])
+    params = replace(params, **overrides)
+
+    backend_cls = BACKENDS[args.backend]
+    backend = (
+        backend_cls() if backend_cls is NumpyBackend else backend_cls(args.fft_workers)
+    )
+
+    num_processed = run(
+        args.input_dir,
+        args.out_root,
+        params,
+        processes=args.processes,
+        pattern=args.pattern,
+        lease_s=args.lease,
+        poll_s=args.poll,
+        batch_size=args.batch_size,
+        backend=backend,
+    )
+
+    files = find_files(args.input_dir, args.pattern)
+    tasks = [task_name(path, args.input_dir) for path in files]
+    status = WorkQueue(args.out_root / params.id).status(tasks)
+    print(f"Processed {num_processed} files in {args.out_root / params.id}; {status}")
+
+
+if __name__ == "__main__":
+    main()
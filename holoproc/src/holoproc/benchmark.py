@@ -0,0 +1,227 @@
+"""Benchmark the speed and accuracy of the processing on synthetic holograms."""
+
+from dataclasses import dataclass
+import statistics
+import time
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from numpy.fft import fft2, fftshift
+
+from .core import (
+    Precision,
+    compute_mask_radius_px,
+    mask_fft,
+    proc_sideband,
+    proc_sideband_stack,
+)
+from .fft_backends import FFTBackend
+from .synthetic import gaussian_bump, spherical_bead, synthetic_stack
+from .unwrapping import UnwrapMethod, unwrap
+
+
+SIZES = (256, 512, 1024, 2048, 4096)
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """The speed and, where it applies, the accuracy of one operation at one size.
+
+    phase_rmse is the RMS difference in radians between the recovered and the true
+    phase, after removing their mean difference, inside the central 3/4 of the frame.
+
+    """
+
+    name: str
+    num_px: int
+    frames_per_s: float
+    phase_rmse: Optional[float] = None
+
+
+def phase_rmse(phase: np.ndarray, truth: np.ndarray) -> float:
+    """Return the RMS phase error of one or more frames away from their borders."""
+    border = truth.shape[-1] // 8
+    inner = (Ellipsis, slice(border, -border), slice(border, -border))
+    diff = phase[inner] - truth[inner]
+    diff = diff - diff.mean(axis=(-2, -1), keepdims=True)
+
+    return float(np.sqrt(np.mean(diff**2)))
+
+
+def time_call(func: Callable[[], object], repeats: int = 3) -> float:
+    """Return the median time in seconds of calls to func, after one warm-up call.
+
+    The warm-up call builds the plans and caches that later calls reuse.
+
+    """
+    func()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def benchmark_size(
+    num_px: int,
+    num_frames: int = 4,
+    repeats: int = 3,
+    noise: float = 0.005,
+    backend: Optional[FFTBackend] = None,
+    precision: Precision = Precision.DOUBLE,
+) -> List[BenchmarkResult]:
+    """Benchmark proc_sideband, proc_sideband_stack, mask_fft and unwrap at one size.
+
+    The holograms are of a Gaussian phase bump whose width scales with the frame, so
+    that it is resolved equally well at every size. proc_sideband_stack is also run on
+    a spherical bead, whose sharp edge is not band limited, so its RMSE shows the error
+    that the NA of the sideband mask causes at the edges of objects.
+
+    """
+    truth = gaussian_bump(num_px, height=4.0, sigma_px=num_px / 16)
+    holograms = synthetic_stack(truth, num_frames, noise=noise)
+    params = dict(backend=backend, precision=precision)
+    results = []
+
+    frame_results = {}
+
+    def run_frame():
+        frame_results.update(proc_sideband(holograms[0], **params))
+
+    seconds = time_call(run_frame, repeats)
+    results.append(
+        BenchmarkResult(
+            "proc_sideband",
+            num_px,
+            1 / seconds,
+            phase_rmse(frame_results["phase_unwrapped"], truth),
+        )
+    )
+
+    stack_results = {}
+
+    def run_stack():
+        stack_results.update(proc_sideband_stack(holograms, **params))
+
+    seconds = time_call(run_stack, repeats)
+    results.append(
+        BenchmarkResult(
+            "proc_sideband_stack",
+            num_px,
+            num_frames / seconds,
+            phase_rmse(stack_results["phase_unwrapped"], truth),
+        )
+    )
+
+    bead = spherical_bead(num_px)
+    bead_holograms = synthetic_stack(bead, num_frames, noise=noise)
+    bead_results = {}
+
+    def run_bead_stack():
+        bead_results.update(proc_sideband_stack(bead_holograms, **params))
+
+    seconds = time_call(run_bead_stack, repeats)
+    results.append(
+        BenchmarkResult(
+            "proc_sideband_stack (bead)",
+            num_px,
+            num_frames / seconds,
+            phase_rmse(bead_results["phase_unwrapped"], bead),
+        )
+    )
+
+    img_fft = fftshift(fft2(holograms[0]))
+    radius_px = compute_mask_radius_px(
+        num_px=num_px, px_size_um=5.2, wavelength_um=0.641, mag=80, na=0.4
+    )
+    seconds = time_call(lambda: mask_fft(img_fft, radius_px=radius_px), repeats)
+    results.append(BenchmarkResult("mask_fft", num_px, 1 / seconds))
+
+    # A taller bump so that the phase wraps several times
+    tall = gaussian_bump(num_px, height=30.0, sigma_px=num_px / 8)
+    wrapped = precision.cast(np.angle(np.exp(1j * tall)))
+    for method in UnwrapMethod:
+        unwrapped = {}
+
+        def run_unwrap():
+            unwrapped["phase"] = unwrap(wrapped, method=method)
+
+        seconds = time_call(run_unwrap, repeats)
+        results.append(
+            BenchmarkResult(
+                f"unwrap ({method.value})",
+                num_px,
+                1 / seconds,
+                phase_rmse(unwrapped["phase"], tall),
+            )
+        )
+
+    return results
+
+
+def benchmark(
+    sizes: Sequence[int] = SIZES,
+    num_frames: int = 4,
+    repeats: int = 3,
+    noise: float = 0.005,
+    backend: Optional[FFTBackend] = None,
+    precision: Precision = Precision.DOUBLE,
+) -> List[BenchmarkResult]:
+    """Benchmark the processing at several frame sizes.
+
+    Parameters
+    ----------
+    sizes : Sequence[int]
+        Side lengths of the square frames in pixels.
+    num_frames : int
+        Number of frames of the stack processed by proc_sideband_stack.
+    repeats : int
+        Number of timed calls of each operation, of which the median is reported.
+    noise : float
+        Standard deviation of the noise of the holograms.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    precision : Precision
+        Floating point precision of the processing.
+
+    """
+    results = []
+    for num_px in sizes:
+        results.extend(
+            benchmark_size(
+                num_px,
+                num_frames=num_frames,
+                repeats=repeats,
+                noise=noise,
+                backend=backend,
+                precision=precision,
+            )
+        )
+
+    return results
+
+
+def format_results(results: Sequence[BenchmarkResult]) -> str:
+    """Format benchmark results as a table, one operation and size per row."""
+    lines = [f"{'operation':<28} {'size':>6} {'frames/s':>10} {'RMSE (rad)':>11}"]
+    for r in results:
+        rmse = "" if r.phase_rmse is None else f"{r.phase_rmse:.2e}"
+        lines.append(f"{r.name:<28} {r.num_px:>6} {r.frames_per_s:>10.1f} {rmse:>11}")
+
+    return "\n".join(lines)
+
+
+def main(
+    sizes: Sequence[int] = SIZES,
+    num_frames: int = 4,
+    precision: Precision = Precision.DOUBLE,
+):
+    results = benchmark(sizes=sizes, num_frames=num_frames, precision=precision)
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 from enum import Enum
-from typing import TypedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple, TypedDict
 
 import numpy as np
-from numpy.fft import fft2, fftshift
-from skimage import restoration
+from numpy.fft import fftshift
+
+from .fft_backends import FFTBackend, get_backend
+from .unwrapping import Unwrapper, unwrap
 
 
 class PhaseOption(Enum):
@@ -12,8 +15,35 @@ class PhaseOption(Enum):
     ARCTAN = "arctan"
 
 
-class Results(TypedDict):
-    """Results of processing a single sideband hologram."""
+class Precision(Enum):
+    """Floating point precision of the processing."""
+
+    SINGLE = "single"
+    DOUBLE = "double"
+
+    @property
+    def real_dtype(self) -> np.dtype:
+        return np.dtype(np.float32 if self == Precision.SINGLE else np.float64)
+
+    @property
+    def complex_dtype(self) -> np.dtype:
+        return np.dtype(np.complex64 if self == Precision.SINGLE else np.complex128)
+
+    def cast(self, imgs: np.ndarray) -> np.ndarray:
+        """Cast real or complex images to this precision without copying if possible."""
+        if np.iscomplexobj(imgs):
+            return imgs.astype(self.complex_dtype, copy=False)
+
+        return imgs.astype(self.real_dtype, copy=False)
+
+
+class Results(TypedDict, total=False):
+    """Results of processing a single sideband hologram or a stack of holograms.
+
+    For a stack, each array has the shape (T, H, W) of the input stack. Only the
+    requested outputs are present.
+
+    """
 
     img: np.ndarray
     img_fft: np.ndarray
@@ -21,6 +51,37 @@ class Results(TypedDict):
     phase_unwrapped: np.ndarray
 
 
+OUTPUTS = frozenset(Results.__annotations__)
+
+# The shifted FFT is a large complex array that is only needed for inspection, so it
+# is not returned unless it is requested.
+DEFAULT_OUTPUTS = frozenset({"img", "phase", "phase_unwrapped"})
+
+
+class CroppedField(TypedDict):
+    """The complex field demodulated from only the sideband's bounding square.
+
+    field has the shape (..., N, N), where N is the crop size of the sideband plan, and
+    px_size_um is the size of one of its pixels in the sample plane in microns.
+
+    """
+
+    field: np.ndarray
+    px_size_um: float
+
+
+def next_fast_len(n: int) -> int:
+    """Return the smallest integer >= n whose only prime factors are 2, 3 and 5."""
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
 def compute_mask_radius_px(
     num_px: int, px_size_um: float, wavelength_um: float, mag: float, na: float
 ) -> int:
@@ -56,20 +117,490 @@ def compute_mask_radius_px(
     return radius_px
 
 
+def compute_shift_px(
+    num_px: int,
+    px_size_um: float,
+    mag_obj: float,
+    mag_4f: float,
+    grating_period: float,
+) -> int:
+    """Compute the number of pixels that brings the modulated component to the center.
+
+    Parameters
+    ----------
+    num_px : int
+        Number of pixels in the image (must be square).
+    px_size_um : float
+        Physical size of a pixel in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    grating_period : float
+        Period of the grating in microns.
+
+    """
+    dk = 2 * np.pi / (num_px * px_size_um / (mag_obj * mag_4f))
+    carrier_freq = (
+        2 * np.pi * mag_obj / grating_period
+    )  # Multiply by mag_obj to get carrier freq in sample plane
+
+    return int(carrier_freq / dk)
+
+
+def compute_height_map(
+    phase: np.ndarray, wavelength_um: float, dn: float
+) -> np.ndarray:
+    """Compute the height map from the unwrapped phase image.
+
+    Parameters
+    ----------
+    dn: float
+        Refractive index difference between the sample and the surrounding medium.
+
+    """
+    return phase * wavelength_um / (2 * np.pi * dn)
+
+
+@lru_cache(maxsize=8)
+def circular_mask(shape: Tuple[int, int], radius_px: int) -> np.ndarray:
+    """Return a boolean circular mask about the center of an array of the given shape.
+
+    Masks are cached, so the returned array must not be modified.
+
+    """
+    y, x = np.ogrid[0 : shape[0], 0 : shape[1]]
+    mask = (x - shape[1] // 2) ** 2 + (y - shape[0] // 2) ** 2 <= radius_px**2
+    mask.flags.writeable = False
+
+    return mask
+
+
 def mask_fft(img_fft: np.ndarray, radius_px: int = 10) -> np.ndarray:
-    """Apply a circular mask to a shifted FFT about the origin."""
-    fft_cp = img_fft.copy()
-    y, x = np.ogrid[0 : fft_cp.shape[0], 0 : fft_cp.shape[1]]
-    mask = (x - fft_cp.shape[0] // 2) ** 2 + (
-        y - fft_cp.shape[1] // 2
-    ) ** 2 <= radius_px**2
-    fft_cp[~mask] = 0
+    """Apply a circular mask to a shifted FFT about the origin.
+
+    The mask is applied over the last two axes, so a stack of FFTs is masked at once.
+
+    """
+    mask = circular_mask(img_fft.shape[-2:], radius_px)
+
+    return np.where(mask, img_fft, 0)
+
+
+@lru_cache(maxsize=8)
+def _residual_ramps(
+    shape: Tuple[int, int], residual: Tuple[float, float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the separable row and column phase ramps that cancel a frequency offset.
+
+    The offset is in pixels of the full-size FFT, so that it applies unchanged to
+    fields sampled more coarsely over the same area. Ramps are cached, so the returned
+    arrays must not be modified.
+
+    """
+    ramp_rows = np.exp(-2j * np.pi * residual[0] * np.arange(shape[0]) / shape[0])
+    ramp_cols = np.exp(-2j * np.pi * residual[1] * np.arange(shape[1]) / shape[1])
+    ramp_rows, ramp_cols = ramp_rows[:, np.newaxis], ramp_cols[np.newaxis, :]
+    ramp_rows.flags.writeable = False
+    ramp_cols.flags.writeable = False
+
+    return ramp_rows, ramp_cols
+
+
+def locate_carrier(
+    img: np.ndarray,
+    exclude_radius_px: Optional[int] = None,
+    backend: Optional[FFTBackend] = None,
+) -> Tuple[float, float]:
+    """Locate the sideband carrier of a hologram to a fraction of a pixel.
+
+    The strongest peak of the windowed spectrum outside a disk about the origin is
+    found among the negative column frequencies, and its position is refined by fitting
+    a Gaussian to it and its neighbors along each axis.
+
+    Parameters
+    ----------
+    img : np.ndarray
+        Hologram of shape (H, W).
+    exclude_radius_px : Optional[int]
+        Radius in pixels of the disk about the origin of the spectrum that holds the
+        unmodulated terms. Defaults to 1/16 of the smaller side of the image.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+
+    Returns
+    -------
+    Tuple[float, float]
+        Row and column frequencies of the sideband in pixels of the FFT.
+
+    """
+    backend = get_backend() if backend is None else backend
+    num_rows, num_cols = img.shape
+    if exclude_radius_px is None:
+        exclude_radius_px = min(num_rows, num_cols) // 16
+
+    window = np.outer(np.hanning(num_rows), np.hanning(num_cols))
+    spectrum = np.abs(backend.fft2((img - img.mean()) * window))
+
+    freq_rows = np.fft.fftfreq(num_rows, 1 / num_rows)[:, np.newaxis]
+    freq_cols = np.fft.fftfreq(num_cols, 1 / num_cols)[np.newaxis, :]
+    search = (freq_cols < 0) & (freq_rows**2 + freq_cols**2 > exclude_radius_px**2)
+    row, col = np.unravel_index(np.argmax(np.where(search, spectrum, 0)), img.shape)
+
+    def refine(left: float, center: float, right: float) -> float:
+        left, center, right = np.log([left, center, right])
+        denom = left - 2 * center + right
+
+        return 0.5 * (left - right) / denom if denom != 0 else 0.0
+
+    d_row = refine(
+        spectrum[(row - 1) % num_rows, col],
+        spectrum[row, col],
+        spectrum[(row + 1) % num_rows, col],
+    )
+    d_col = refine(
+        spectrum[row, (col - 1) % num_cols],
+        spectrum[row, col],
+        spectrum[row, (col + 1) % num_cols],
+    )
+
+    return float(freq_rows[row, 0] + d_row), float(freq_cols[0, col] + d_col)
+
+
+class SidebandPlan:
+    """A precomputed Fourier-plane filter for sideband holograms.
+
+    A plan holds the shift and circular mask for one image shape and set of optical
+    parameters. Rather than shifting the FFT to center the origin, rolling the sideband
+    to the center, masking it and shifting back, the plan stores the indices of the
+    masked pixels in the unshifted FFT before and after these operations. Applying the
+    plan is then a single gather and scatter on the unshifted FFT.
+
+    Because the images are real, their FFTs are Hermitian. The plan can therefore also
+    gather the sideband from the half spectrum computed by rfft2, conjugating the pixels
+    that lie in the missing half.
+
+    If the carrier frequency of the sideband is given, e.g. from locate_carrier, it
+    replaces the shift computed from the grating period. The sideband is then moved by
+    the nearest whole number of pixels, and the remaining sub-pixel offset, which would
+    otherwise leave a tilt in the phase, is removed by multiplying the demodulated
+    field by a precomputed phase ramp.
+
+    Use get_sideband_plan to reuse plans across calls.
+
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        px_size_um: float,
+        wavelength_um: float,
+        mag_obj: float,
+        mag_4f: float,
+        na: float,
+        grating_period: float,
+        carrier: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        self.shape = shape
+        num_rows, num_px = shape
+
+        # Size of a pixel in the sample plane
+        self.sample_px_size_um = px_size_um / (mag_obj * mag_4f)
+
+        # Row and column frequencies of the sideband in pixels. Without a measured
+        # carrier, the sideband lies along the columns at negative frequencies.
+        if carrier is None:
+            shift_px = compute_shift_px(
+                num_px=num_px,
+                px_size_um=px_size_um,
+                mag_obj=mag_obj,
+                mag_4f=mag_4f,
+                grating_period=grating_period,
+            )
+            carrier = (0.0, -float(shift_px))
+        self.carrier = carrier
+        self.shift_rows = -int(round(carrier[0]))
+        self.shift_px = -int(round(carrier[1]))
+        self.residual = (
+            carrier[0] + self.shift_rows,
+            carrier[1] + self.shift_px,
+        )
+        self.radius_px = compute_mask_radius_px(
+            num_px=num_px,
+            px_size_um=px_size_um,
+            wavelength_um=wavelength_um,
+            mag=mag_obj * mag_4f,
+            na=na,
+        )
+
+        # Mask about the center of the shifted (centered) FFT
+        self.mask = circular_mask(shape, self.radius_px)
+
+        # Destination indices of the masked pixels in the unshifted FFT, and the
+        # indices in the unshifted FFT from which they are taken.
+        rows, cols = np.nonzero(self.mask)
+        self.dst_rows = (rows - num_rows // 2) % num_rows
+        self.dst_cols = (cols - num_px // 2) % num_px
+        self.src_rows = (self.dst_rows - self.shift_rows) % num_rows
+        self.src_cols = (self.dst_cols - self.shift_px) % num_px
+
+        # Indices of the same pixels in the half spectrum of rfft2, using
+        # F[-k] = conj(F[k]) for the pixels that are not in it
+        self.conj = self.src_cols > num_px // 2
+        self.rsrc_rows = np.where(self.conj, -self.src_rows % num_rows, self.src_rows)
+        self.rsrc_cols = np.where(self.conj, -self.src_cols % num_px, self.src_cols)
+
+        # Destination indices of the masked pixels in the unshifted FFT of the square
+        # that bounds the mask, zero-padded to a size that is fast to transform.
+        self.crop_px = next_fast_len(2 * self.radius_px + 1)
+        self.crop_dst_rows = (rows - num_rows // 2) % self.crop_px
+        self.crop_dst_cols = (cols - num_px // 2) % self.crop_px
+
+    def remove_residual(self, fields: np.ndarray) -> np.ndarray:
+        """Remove the tilt due to the sub-pixel carrier offset from fields, in place.
+
+        Parameters
+        ----------
+        fields : np.ndarray
+            Demodulated fields of shape (..., H, W), or cropped fields of shape
+            (..., crop_px, crop_px).
+
+        """
+        if self.residual == (0.0, 0.0):
+            return fields
+
+        ramp_rows, ramp_cols = _residual_ramps(fields.shape[-2:], self.residual)
+        fields *= ramp_rows
+        fields *= ramp_cols
+
+        return fields
+
+    def gather(self, imgs_fft: np.ndarray, real: bool = False) -> np.ndarray:
+        """Return the pixels of the sideband inside the mask.
+
+        Parameters
+        ----------
+        imgs_fft : np.ndarray
+            Unshifted FFT of an image or stack of images as returned by fft2, or the
+            half spectrum as returned by rfft2 if real is True.
+        real : bool
+            Whether imgs_fft is the half spectrum of real images.
+
+        """
+        if not real:
+            return imgs_fft[..., self.src_rows, self.src_cols]
+
+        sideband = imgs_fft[..., self.rsrc_rows, self.rsrc_cols]
+        np.conjugate(sideband, out=sideband, where=self.conj)
+
+        return sideband
+
+    def apply(self, imgs_fft: np.ndarray) -> np.ndarray:
+        """Shift the sideband to the origin and mask it, in place.
+
+        Parameters
+        ----------
+        imgs_fft : np.ndarray
+            Unshifted FFT of an image or stack of images, as returned by fft2. It is
+            overwritten by the filtered FFT.
+
+        """
+        sideband = imgs_fft[..., self.src_rows, self.src_cols]
+        imgs_fft[...] = 0
+        imgs_fft[..., self.dst_rows, self.dst_cols] = sideband
+
+        return imgs_fft
+
+    def apply_real(self, imgs_rfft: np.ndarray) -> np.ndarray:
+        """Shift the sideband to the origin and mask it, starting from rfft2 output.
+
+        Parameters
+        ----------
+        imgs_rfft : np.ndarray
+            Half spectrum of a real image or stack of real images, as returned by rfft2.
+
+        Returns
+        -------
+        np.ndarray
+            Full-size, unshifted FFT that holds only the sideband.
+
+        """
+        imgs_fft = np.zeros(imgs_rfft.shape[:-2] + self.shape, dtype=imgs_rfft.dtype)
+        imgs_fft[..., self.dst_rows, self.dst_cols] = self.gather(imgs_rfft, real=True)
+
+        return imgs_fft
+
+    def apply_cropped(self, imgs_fft: np.ndarray, real: bool = False) -> np.ndarray:
+        """Extract the masked sideband into a small, unshifted FFT about the origin.
+
+        Parameters
+        ----------
+        imgs_fft : np.ndarray
+            Unshifted FFT of an image or stack of images as returned by fft2, or the
+            half spectrum as returned by rfft2 if real is True.
+        real : bool
+            Whether imgs_fft is the half spectrum of real images.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (..., crop_px, crop_px) that holds the sideband.
+
+        """
+        cropped = np.zeros(
+            imgs_fft.shape[:-2] + (self.crop_px, self.crop_px), dtype=imgs_fft.dtype
+        )
+        cropped[..., self.crop_dst_rows, self.crop_dst_cols] = self.gather(
+            imgs_fft, real=real
+        )
+
+        return cropped
+
+    @property
+    def crop_px_size_um(self) -> float:
+        """Size of a pixel of a cropped field in the sample plane in microns."""
+        return self.sample_px_size_um * self.shape[-1] / self.crop_px
+
+
+@lru_cache(maxsize=1)
+def get_sideband_plan(
+    shape: Tuple[int, int],
+    px_size_um: float,
+    wavelength_um: float,
+    mag_obj: float,
+    mag_4f: float,
+    na: float,
+    grating_period: float,
+    carrier: Optional[Tuple[float, float]] = None,
+) -> SidebandPlan:
+    """Return the sideband plan for an image shape and set of optical parameters.
+
+    The most recent plan is cached and reused for as long as the parameters do not
+    change.
+
+    """
+    return SidebandPlan(
+        shape,
+        px_size_um=px_size_um,
+        wavelength_um=wavelength_um,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
+        na=na,
+        grating_period=grating_period,
+        carrier=carrier,
+    )
+
+
+def _angle(z: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the angle of complex numbers like np.angle, optionally into out."""
+    return np.arctan2(z.imag, z.real, out=out)
+
+
+def _filter_sideband(
+    imgs: np.ndarray, plan: SidebandPlan, backend: FFTBackend
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the filtered, unshifted FFTs of images and their inverse transforms."""
+    axes = (-2, -1)
+
+    # Compute the FFT of the images, then shift and mask them. Real images only need
+    # half of their spectrum.
+    if np.iscomplexobj(imgs):
+        imgs_fft = plan.apply(backend.fft2(imgs, axes=axes))
+    else:
+        imgs_fft = plan.apply_real(backend.rfft2(imgs, axes=axes))
+
+    # Inverse FFT to get the modulated component
+    return imgs_fft, plan.remove_residual(backend.ifft2(imgs_fft, axes=axes))
 
-    return fft_cp
 
+class BackgroundReference:
+    """The filtered complex field of a background hologram, computed once.
+
+    Passing a reference to proc_sideband or proc_sideband_stack replaces the phase of
+    each frame by its phase relative to the background, angle(img * conj(bg)), which
+    has the same angle as img / bg but cannot divide by zero. Only this differential
+    phase is unwrapped, so the background is never transformed or unwrapped again and
+    the aberrations and carrier tilt that it shares with the frames are removed before
+    unwrapping. See Pham, et al., "Fast phase reconstruction in white light
+    diffraction phase microscopy," Applied Optics 52, A97 (2013).
+
+    Parameters
+    ----------
+    bg : np.ndarray
+        Background image of shape (H, W), or stack of shape (T, H, W) of one
+        background per frame, e.g. of the same regions of interest as the frames.
+        Images must be square. Pixel values must be between 0 and 1.
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels, as returned by
+        locate_carrier. Overrides the shift computed from the grating period.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    precision : Precision
+        Floating point precision of the field.
+
+    """
 
-def unwrap(phase: np.ndarray) -> np.ndarray:
-    return restoration.unwrap_phase(phase)
+    def __init__(
+        self,
+        bg: np.ndarray,
+        px_size_um: float = 5.2,
+        wavelength_um: float = 0.641,
+        mag_obj: float = 20,
+        mag_4f: float = 4,
+        na: float = 0.4,
+        grating_period: float = 3.3333,
+        carrier: Optional[Tuple[float, float]] = None,
+        backend: Optional[FFTBackend] = None,
+        precision: Precision = Precision.DOUBLE,
+    ) -> None:
+        backend = get_backend() if backend is None else backend
+        plan = get_sideband_plan(
+            bg.shape[-2:],
+            px_size_um=px_size_um,
+            wavelength_um=wavelength_um,
+            mag_obj=mag_obj,
+            mag_4f=mag_4f,
+            na=na,
+            grating_period=grating_period,
+            carrier=carrier,
+        )
+        bgs = bg if bg.ndim == 3 else bg[np.newaxis]
+        _, field = _filter_sideband(precision.cast(bgs), plan, backend)
+
+        # Store the conjugate, since that is what every frame is multiplied by
+        self.field = field if bg.ndim == 3 else field[0]
+        self.field_conj = np.conj(self.field)
+
+    def relative_phase(
+        self, imgs_filtered: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Return the wrapped phase of filtered fields relative to the background.
+
+        The filtered fields are overwritten. The phase is written into out if it is
+        given.
+
+        """
+        if imgs_filtered.shape[-self.field.ndim :] != self.field.shape:
+            raise ValueError(
+                f"Background of shape {self.field.shape} does not match images of "
+                f"shape {imgs_filtered.shape}"
+            )
+
+        imgs_filtered *= self.field_conj.astype(imgs_filtered.dtype, copy=False)
+
+        return _angle(imgs_filtered, out=out)
 
 
 def proc_sideband(
@@ -80,8 +611,15 @@ def proc_sideband(
     mag_4f: float = 4,
     na: float = 0.4,
     grating_period: float = 3.3333,
+    carrier: Optional[Tuple[float, float]] = None,
     phase_option: PhaseOption = PhaseOption.ARCTAN,
-) -> np.ndarray:
+    backend: Optional[FFTBackend] = None,
+    precision: Precision = Precision.DOUBLE,
+    unwrapper: Optional[Unwrapper] = None,
+    background: Optional[BackgroundReference] = None,
+    outputs: Iterable[str] = DEFAULT_OUTPUTS,
+    out: Optional[Dict[str, np.ndarray]] = None,
+) -> Results:
     """Process a single sideband hologram.
 
     Parameters
@@ -98,51 +636,243 @@ def proc_sideband(
         Magnification of the 4f system.
     na : float
         Numerical aperture of the objective.
-    carrier_freq : float
-        Frequency of the carrier wave in radians per micron.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels, as returned by
+        locate_carrier. Overrides the shift computed from the grating period.
     phase_option : PhaseOption
         Option for computing the phase image.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    precision : Precision
+        Floating point precision of the processing. The images are cast to it, and all
+        the results are computed in it.
+    unwrapper : Optional[Unwrapper]
+        Unwrapper of the phase images, e.g. one that runs in parallel. Defaults to
+        unwrapping one frame at a time in the calling process.
+    background : Optional[BackgroundReference]
+        Background relative to which the phase is computed. The phase is absolute if
+        it is None.
+    outputs : Iterable[str]
+        Names of the results to return. img_fft is only computed if it is requested.
+    out : Optional[Dict[str, np.ndarray]]
+        Preallocated arrays of shape (H, W) into which results are written, by name.
+        Their results are returned even if they are not in outputs.
 
     """
-    num_px = img.shape[0]
+    results = proc_sideband_stack(
+        img[np.newaxis, :, :],
+        px_size_um=px_size_um,
+        wavelength_um=wavelength_um,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
+        na=na,
+        grating_period=grating_period,
+        carrier=carrier,
+        phase_option=phase_option,
+        backend=backend,
+        precision=precision,
+        unwrapper=unwrapper,
+        background=background,
+        outputs=outputs,
+        out=None if out is None else {k: v[np.newaxis] for k, v in out.items()},
+    )
 
-    # Compute the FFT of the image
-    img_fft = fftshift(fft2(img))
+    return {k: v[0] for k, v in results.items()}
 
-    # Circular shift the FFTs to center the origin
-    dk = 2 * np.pi / (num_px * px_size_um / (mag_obj * mag_4f))
-    carrier_freq = (
-        2 * np.pi * mag_obj / grating_period
-    )  # Multiply by mag_obj to get carrier freq in sample plane
-    shift_px = int(carrier_freq / dk)  # Amount to bring modulated component to center
-    img_fft = np.roll(img_fft, shift=shift_px, axis=1)
 
-    # Compute the radius of the circular mask in pixels
-    # The radius is k * NA in angular frequency, or NA / wavelength in spatial frequency
-    radius_px = compute_mask_radius_px(
-        num_px=num_px,
+def proc_sideband_stack(
+    imgs: np.ndarray,
+    px_size_um: float = 5.2,
+    wavelength_um: float = 0.641,
+    mag_obj: float = 20,
+    mag_4f: float = 4,
+    na: float = 0.4,
+    grating_period: float = 3.3333,
+    carrier: Optional[Tuple[float, float]] = None,
+    phase_option: PhaseOption = PhaseOption.ARCTAN,
+    backend: Optional[FFTBackend] = None,
+    precision: Precision = Precision.DOUBLE,
+    unwrapper: Optional[Unwrapper] = None,
+    background: Optional[BackgroundReference] = None,
+    outputs: Iterable[str] = DEFAULT_OUTPUTS,
+    out: Optional[Dict[str, np.ndarray]] = None,
+) -> Results:
+    """Process a stack of sideband holograms.
+
+    The FFTs of all the frames are computed at once over the last two axes, and the
+    same shift and mask are applied to every frame.
+
+    Parameters
+    ----------
+    imgs : np.ndarray
+        Stack of images to process with shape (T, H, W). Each image must be square.
+        Pixel values must be between 0 and 1.
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels, as returned by
+        locate_carrier. Overrides the shift computed from the grating period.
+    phase_option : PhaseOption
+        Option for computing the phase image.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    precision : Precision
+        Floating point precision of the processing. The images are cast to it, and all
+        the results are computed in it.
+    unwrapper : Optional[Unwrapper]
+        Unwrapper of the phase images, e.g. one that runs in parallel. Defaults to
+        unwrapping one frame at a time in the calling process.
+    background : Optional[BackgroundReference]
+        Background relative to which the phase is computed. The phase is absolute if
+        it is None.
+    outputs : Iterable[str]
+        Names of the results to return. img_fft is only computed, and the phase is
+        only unwrapped, if they are requested.
+    out : Optional[Dict[str, np.ndarray]]
+        Preallocated arrays of shape (T, H, W) into which results are written, by
+        name, to avoid allocating them for every stack. Their results are returned
+        even if they are not in outputs.
+
+    """
+    backend = get_backend() if backend is None else backend
+    unwrapper = Unwrapper() if unwrapper is None else unwrapper
+    imgs = precision.cast(imgs)
+
+    out = {} if out is None else out
+    outputs = set(outputs) | set(out)
+    if not outputs <= OUTPUTS:
+        raise ValueError(f"Unknown outputs: {', '.join(sorted(outputs - OUTPUTS))}")
+
+    # The plan holds the shift that brings the modulated component to the origin and
+    # the circular mask of radius k * NA in angular frequency, or NA / wavelength in
+    # spatial frequency
+    plan = get_sideband_plan(
+        imgs.shape[-2:],
         px_size_um=px_size_um,
         wavelength_um=wavelength_um,
-        mag=mag_obj * mag_4f,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
         na=na,
+        grating_period=grating_period,
+        carrier=carrier,
     )
 
-    # Apply a circular mask of radius R to the FFT
-    img_fft = mask_fft(img_fft, radius_px=radius_px)
+    results: Results = {}
+    if "img" in outputs:
+        results["img"] = imgs
+        if "img" in out:
+            np.copyto(out["img"], imgs)
+            results["img"] = out["img"]
 
-    # Inverse FFT to get the modulated component
-    img_filtered = np.fft.ifft2(np.fft.ifftshift(img_fft))
+    imgs_fft, imgs_filtered = _filter_sideband(imgs, plan, backend)
+    if "img_fft" in outputs:
+        results["img_fft"] = fftshift(imgs_fft, axes=(-2, -1))
+        if "img_fft" in out:
+            np.copyto(out["img_fft"], results["img_fft"])
+            results["img_fft"] = out["img_fft"]
+    del imgs_fft
+
+    if not outputs & {"phase", "phase_unwrapped"}:
+        return results
+
+    # Compute the phase images directly into the output arrays
+    if phase_option == PhaseOption.ARCTAN and background is not None:
+        imgs_wrapped = background.relative_phase(imgs_filtered, out=out.get("phase"))
+    elif phase_option == PhaseOption.ARCTAN:
+        imgs_wrapped = _angle(imgs_filtered, out=out.get("phase"))
+
+    if "phase" in outputs:
+        results["phase"] = imgs_wrapped
+
+    # Unwrap the phase images
+    if "phase_unwrapped" in outputs:
+        results["phase_unwrapped"] = unwrapper(
+            imgs_wrapped, out=out.get("phase_unwrapped")
+        )
+
+    return results
+
+
+def demodulate_cropped(
+    imgs: np.ndarray,
+    px_size_um: float = 5.2,
+    wavelength_um: float = 0.641,
+    mag_obj: float = 20,
+    mag_4f: float = 4,
+    na: float = 0.4,
+    grating_period: float = 3.3333,
+    carrier: Optional[Tuple[float, float]] = None,
+    backend: Optional[FFTBackend] = None,
+    precision: Precision = Precision.DOUBLE,
+) -> CroppedField:
+    """Demodulate sideband holograms by inverse transforming only the sideband.
+
+    Only the square that bounds the circular mask is extracted from the FFT, zero-padded
+    to a fast FFT size, and inverse transformed. The result is the same complex field
+    as the one computed by proc_sideband_stack, but sampled at the lower resolution
+    that the NA of the objective supports.
+
+    Parameters
+    ----------
+    imgs : np.ndarray
+        Image of shape (H, W) or stack of images of shape (T, H, W) to process. Each
+        image must be square. Pixel values must be between 0 and 1.
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels, as returned by
+        locate_carrier. Overrides the shift computed from the grating period.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    precision : Precision
+        Floating point precision of the processing. The images are cast to it, and all
+        the results are computed in it.
+
+    """
+    axes = (-2, -1)
+    backend = get_backend() if backend is None else backend
+    imgs = precision.cast(imgs)
+    plan = get_sideband_plan(
+        imgs.shape[-2:],
+        px_size_um=px_size_um,
+        wavelength_um=wavelength_um,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
+        na=na,
+        grating_period=grating_period,
+        carrier=carrier,
+    )
 
-    # Compute the phase image
-    if phase_option == PhaseOption.ARCTAN:
-        img_wrapped = np.angle(img_filtered)
+    if np.iscomplexobj(imgs):
+        cropped = plan.apply_cropped(backend.fft2(imgs, axes=axes))
+    else:
+        cropped = plan.apply_cropped(backend.rfft2(imgs, axes=axes), real=True)
 
-    # Unwrap the phase image
-    img_unwrapped = unwrap(img_wrapped)
+    # Rescale so that the amplitude matches the full-size inverse FFT
+    field = backend.ifft2(cropped, axes=axes)
+    field *= plan.crop_px**2 / (imgs.shape[-2] * imgs.shape[-1])
+    plan.remove_residual(field)
 
-    return {
-        "img": img,
-        "img_fft": img_fft,
-        "phase": img_wrapped,
-        "phase_unwrapped": img_unwrapped,
-    }
+    return {"field": field, "px_size_um": plan.crop_px_size_um}
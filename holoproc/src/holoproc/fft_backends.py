@@ -0,0 +1,257 @@
+"""Interchangeable FFT implementations.
+
+The NumPy backend is always available and is the default. The SciPy backend runs
+multithreaded transforms, and the pyFFTW backend, which requires pyFFTW, additionally
+reuses FFTW plans and can save and load FFTW wisdom. Either is opted into with
+set_backend.
+
+"""
+
+from abc import ABC, abstractmethod
+import os
+from pathlib import Path
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import scipy.fft
+
+try:
+    import pyfftw
+except ImportError:  # pragma: no cover
+    pyfftw = None
+
+
+Axes = Tuple[int, int]
+AXES: Axes = (-2, -1)
+
+# Kind of transform, shape and dtype of its input, and its axes
+PlanKey = Tuple[str, Tuple[int, ...], str, Axes]
+
+# Precisions of the wisdom returned by pyfftw.export_wisdom, in order
+WISDOM_PRECISIONS = ("double", "single", "long_double")
+
+
+def resolve_workers(workers: int) -> int:
+    """Return the number of threads or processes that a number of workers stands for.
+
+    Positive values are used as they are. Negative values count back from the number of
+    CPUs, so -1 uses all of them, and at least one worker is always used.
+
+    """
+    if workers == 0:
+        raise ValueError("The number of workers must not be 0")
+    if workers > 0:
+        return workers
+
+    return max(1, (os.cpu_count() or 1) + 1 + workers)
+
+
+class FFTBackend(ABC):
+    """2D FFTs over the last two axes of an array.
+
+    The SciPy and pyFFTW backends transform single precision inputs in single
+    precision, i.e. float32 and complex64 inputs produce complex64 outputs. NumPy does
+    the same from version 2.0.
+
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def fft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def ifft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def rfft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        pass
+
+
+class NumpyBackend(FFTBackend):
+    """FFTs from numpy.fft."""
+
+    name = "numpy"
+
+    def fft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return np.fft.fft2(a, axes=axes)
+
+    def ifft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return np.fft.ifft2(a, axes=axes)
+
+    def rfft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return np.fft.rfft2(a, axes=axes)
+
+
+class ScipyBackend(FFTBackend):
+    """Multithreaded FFTs from scipy.fft.
+
+    Parameters
+    ----------
+    workers : int
+        Number of threads to use, as for resolve_workers.
+
+    """
+
+    name = "scipy"
+
+    def __init__(self, workers: int = -1) -> None:
+        # Validate the number of workers now rather than on the first transform
+        resolve_workers(workers)
+        self.workers = workers
+
+    def fft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return scipy.fft.fft2(a, axes=axes, workers=self.workers)
+
+    def ifft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return scipy.fft.ifft2(a, axes=axes, workers=self.workers)
+
+    def rfft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return scipy.fft.rfft2(a, axes=axes, workers=self.workers)
+
+
+class PyFFTWBackend(FFTBackend):
+    """Multithreaded FFTs from pyFFTW that reuse FFTW plans.
+
+    A plan is built the first time that an array of a given shape and dtype is
+    transformed, and reused for every later array of the same shape and dtype.
+
+    Each FFTW plan owns its input and output arrays, so a plan cannot be executed by
+    two threads at once. Plans are therefore kept per thread, and the backend can be
+    shared by threads, e.g. the workers of a Pipeline.
+
+    Parameters
+    ----------
+    workers : int
+        Number of threads to use, as for resolve_workers.
+    planner_effort : str
+        FFTW planner effort, e.g. FFTW_ESTIMATE or FFTW_MEASURE.
+    wisdom_path : Optional[Path]
+        File from which FFTW wisdom is loaded, if it exists. Call save_wisdom to write
+        the wisdom that was accumulated while planning back to it.
+
+    """
+
+    name = "pyfftw"
+
+    def __init__(
+        self,
+        workers: int = -1,
+        planner_effort: str = "FFTW_MEASURE",
+        wisdom_path: Optional[Path] = None,
+    ) -> None:
+        if pyfftw is None:
+            raise ImportError("pyFFTW is not installed")
+
+        self.threads = resolve_workers(workers)
+        self.planner_effort = planner_effort
+        self.wisdom_path = wisdom_path
+        self._local = threading.local()
+        self._planner_lock = threading.Lock()
+
+        self._load_wisdom()
+
+    def __getstate__(self) -> Dict:
+        # Plans and locks cannot be pickled, e.g. to pass the backend to another
+        # process. That process builds its own plans.
+        state = self.__dict__.copy()
+        del state["_local"], state["_planner_lock"]
+
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._planner_lock = threading.Lock()
+        self._load_wisdom()
+
+    def save_wisdom(self) -> None:
+        """Write the accumulated FFTW wisdom to the wisdom path."""
+        if self.wisdom_path is None:
+            raise ValueError("No wisdom path was given")
+
+        with self._planner_lock:
+            wisdom = pyfftw.export_wisdom()
+
+        # Store the raw bytes of each precision rather than a pickle, so that loading a
+        # wisdom file cannot run code
+        with open(self.wisdom_path, "wb") as file:
+            np.savez(
+                file,
+                **{
+                    precision: np.frombuffer(w, dtype=np.uint8)
+                    for precision, w in zip(WISDOM_PRECISIONS, wisdom)
+                },
+            )
+
+    def _load_wisdom(self) -> None:
+        """Import the FFTW wisdom of the wisdom path, if it exists."""
+        if self.wisdom_path is None or not Path(self.wisdom_path).exists():
+            return
+
+        with np.load(self.wisdom_path, allow_pickle=False) as data:
+            wisdom = tuple(data[precision].tobytes() for precision in WISDOM_PRECISIONS)
+        pyfftw.import_wisdom(wisdom)
+
+    def _thread_plans(self) -> Dict[PlanKey, "pyfftw.FFTW"]:
+        """Return the plans of the calling thread."""
+        if not hasattr(self._local, "plans"):
+            self._local.plans = {}
+
+        return self._local.plans
+
+    def _execute(self, kind: str, a: np.ndarray, axes: Axes) -> np.ndarray:
+        plans = self._thread_plans()
+        key = (kind, a.shape, a.dtype.str, axes)
+        plan = plans.get(key)
+        if plan is None:
+            # The FFTW planner is not thread-safe
+            with self._planner_lock:
+                builder = getattr(pyfftw.builders, kind)
+                plan = builder(
+                    pyfftw.empty_aligned(a.shape, dtype=a.dtype),
+                    axes=axes,
+                    threads=self.threads,
+                    planner_effort=self.planner_effort,
+                    avoid_copy=False,
+                )
+            plans[key] = plan
+
+        # Copy the output, since the plan reuses its output array for every call
+        return plan(a).copy()
+
+    def fft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return self._execute("fft2", a, axes)
+
+    def ifft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return self._execute("ifft2", a, axes)
+
+    def rfft2(self, a: np.ndarray, axes: Axes = AXES) -> np.ndarray:
+        return self._execute("rfft2", a, axes)
+
+
+_backend: Optional[FFTBackend] = None
+
+
+def get_backend() -> FFTBackend:
+    """Return the default FFT backend.
+
+    Unless it was set with set_backend, the default is the single-threaded NumPy
+    backend, which can be called from many threads, e.g. the workers of a Pipeline,
+    without oversubscribing the CPUs.
+
+    """
+    global _backend
+    if _backend is None:
+        _backend = NumpyBackend()
+
+    return _backend
+
+
+def set_backend(backend: FFTBackend) -> None:
+    """Set the default FFT backend."""
+    global _backend
+    _backend = backend
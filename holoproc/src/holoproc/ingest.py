@@ -0,0 +1,110 @@
+"""Stream frames from multi-frame TIFF files in fixed-size batches."""
+
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import tifffile
+
+
+Crop = Tuple[slice, slice]
+
+
+def center_crop(shape: Tuple[int, int], num_px: int) -> Crop:
+    """Return the row and column slices of a num_px x num_px crop about the center."""
+    num_rows, num_cols = shape
+
+    return (
+        slice((num_rows - num_px) // 2, (num_rows + num_px) // 2),
+        slice((num_cols - num_px) // 2, (num_cols + num_px) // 2),
+    )
+
+
+def tiff_shape(path: Path) -> Tuple[int, ...]:
+    """Return the shape of the frames stored in a TIFF file without reading them."""
+    with tifffile.TiffFile(path) as tif:
+        return tif.series[0].shape
+
+
+def _iter_frames(path: Path, start: int, stop: Optional[int]) -> Iterator[np.ndarray]:
+    """Yield frames from a memory map of the file, or one page at a time.
+
+    Memory mapping is only possible for uncompressed, contiguous files. Otherwise the
+    pages are decoded one at a time.
+
+    """
+    try:
+        frames = tifffile.memmap(path, mode="r")
+    except ValueError:
+        frames = None
+
+    if frames is not None:
+        frames = frames.reshape((-1,) + frames.shape[-2:])
+        yield from frames[start:stop]
+        return
+
+    with tifffile.TiffFile(path) as tif:
+        for page in tif.pages[start:stop]:
+            yield page.asarray()
+
+
+def iter_tiff_batches(
+    path: Path,
+    batch_size: int = 16,
+    crop: Optional[Crop] = None,
+    start: int = 0,
+    stop: Optional[int] = None,
+    dtype: np.dtype = np.float64,
+) -> Iterator[np.ndarray]:
+    """Stream a multi-frame TIFF file as batches of normalized float frames.
+
+    Each frame is cropped before it is converted to float, and at most one batch is
+    held in memory at a time. Integer pixel values are normalized to [0, 1] by the
+    maximum value of their type.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the TIFF file.
+    batch_size : int
+        Number of frames per batch. The last batch may be smaller.
+    crop : Optional[Crop]
+        Row and column slices applied to every frame.
+    start : int
+        Index of the first frame to read.
+    stop : Optional[int]
+        Index one past the last frame to read. Defaults to the end of the file.
+    dtype : np.dtype
+        Floating point type of the batches.
+
+    Yields
+    ------
+    np.ndarray
+        Batches of shape (T, H, W), where T <= batch_size.
+
+    """
+    crop = (slice(None), slice(None)) if crop is None else crop
+
+    batch: Optional[np.ndarray] = None
+    num_frames = 0
+    for frame in _iter_frames(path, start, stop):
+        frame = frame[crop]
+
+        if batch is None:
+            batch = np.empty((batch_size,) + frame.shape, dtype=dtype)
+            scale = (
+                1 / np.iinfo(frame.dtype).max
+                if np.issubdtype(frame.dtype, np.integer)
+                else 1
+            )
+
+        np.multiply(frame, scale, out=batch[num_frames], casting="unsafe")
+        num_frames += 1
+
+        if num_frames == batch_size:
+            yield batch
+            batch = np.empty_like(batch)
+            num_frames = 0
+
+    if batch is not None and num_frames > 0:
+        yield batch[:num_frames]
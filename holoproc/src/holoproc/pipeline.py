@@ -0,0 +1,401 @@
+"""Concurrent processing of frame streams in stages connected by bounded queues."""
+
+from dataclasses import dataclass, field
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .core import BackgroundReference, Precision, compute_height_map, proc_sideband
+from .unwrapping import UnwrapMethod, unwrap
+
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """A processing step that is applied to every item of a stream.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage in the metrics.
+    func : Callable[[Any], Any]
+        Function that maps an item to the item passed to the next stage.
+    workers : int
+        Number of threads that apply func concurrently. NumPy and SciPy release the
+        GIL in FFTs and most array operations, so threads run these in parallel.
+    queue_size : int
+        Maximum number of items that wait for the stage. When its queue is full, the
+        previous stage blocks until there is room.
+
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 8
+
+
+@dataclass
+class StageMetrics:
+    """Latency and throughput of a stage.
+
+    Latencies are the times spent in the stage's function, excluding the time that
+    items wait in its queue.
+
+    """
+
+    name: str
+    workers: int
+    count: int = 0
+    busy_s: float = 0.0
+    max_latency_s: float = 0.0
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, start: float, end: float) -> None:
+        """Record one item that was processed from start to end."""
+        with self._lock:
+            self.count += 1
+            self.busy_s += end - start
+            self.max_latency_s = max(self.max_latency_s, end - start)
+            if self.first_start is None or start < self.first_start:
+                self.first_start = start
+            if self.last_end is None or end > self.last_end:
+                self.last_end = end
+
+    @property
+    def mean_latency_s(self) -> float:
+        return self.busy_s / self.count if self.count else 0.0
+
+    @property
+    def elapsed_s(self) -> float:
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+
+        return self.last_end - self.first_start
+
+    @property
+    def throughput(self) -> float:
+        """Items per second from the start of the first item to the end of the last."""
+        return self.count / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of the elapsed time that the workers were busy."""
+        if self.elapsed_s == 0:
+            return 0.0
+
+        return self.busy_s / (self.workers * self.elapsed_s)
+
+
+def format_metrics(metrics: Dict[str, StageMetrics]) -> str:
+    """Format stage metrics as a table, one stage per row."""
+    lines = [
+        f"{'stage':<12} {'workers':>7} {'items':>7} {'items/s':>9} "
+        f"{'mean ms':>9} {'max ms':>9} {'busy':>6}"
+    ]
+    for m in metrics.values():
+        lines.append(
+            f"{m.name:<12} {m.workers:>7} {m.count:>7} {m.throughput:>9.1f} "
+            f"{1000 * m.mean_latency_s:>9.2f} {1000 * m.max_latency_s:>9.2f} "
+            f"{m.utilization:>6.0%}"
+        )
+
+    return "\n".join(lines)
+
+
+class Pipeline:
+    """Runs stages concurrently over a stream of items.
+
+    Each stage has its own pool of worker threads and a bounded input queue. The
+    source is read in the calling thread and blocks when the first queue is full, so
+    that a slow stage applies back-pressure all the way to the source instead of
+    letting queues grow without bound. Stages with several workers may finish items
+    out of order, but the sink receives them in the order of the source. Items that
+    finish ahead of an earlier, slow item wait for it in a reorder buffer. To bound
+    that buffer too, the source also blocks while max_in_flight items have been read
+    but not yet passed to the sink.
+
+    If a stage raises an exception, the source stops, the items that are in flight
+    are discarded, and the exception is raised by run.
+
+    Parameters
+    ----------
+    stages : Sequence[Stage]
+        The stages, in the order in which they are applied.
+    max_in_flight : Optional[int]
+        Largest number of items between the source and the sink, including those in
+        the queues, in the stages and in the reorder buffer. Defaults to the number
+        that fit in the queues and workers of all the stages.
+
+    """
+
+    def __init__(
+        self, stages: Sequence[Stage], max_in_flight: Optional[int] = None
+    ) -> None:
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+
+        self.stages = list(stages)
+        if max_in_flight is None:
+            max_in_flight = sum(stage.queue_size + stage.workers for stage in stages)
+        if max_in_flight < 1:
+            raise ValueError("At least one item must be allowed in flight")
+        self.max_in_flight = max_in_flight
+        self._error: Optional[BaseException] = None
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+
+    def _work(
+        self,
+        stage: Stage,
+        metrics: StageMetrics,
+        q_in: queue.Queue,
+        q_out: queue.Queue,
+        finished: List[int],
+        num_consumers: int,
+        lock: threading.Lock,
+    ) -> None:
+        while True:
+            item = q_in.get()
+            if item is _DONE:
+                break
+
+            # Keep draining after an error so that no stage blocks on a full queue
+            if self._error is not None:
+                self._in_flight.release()
+                continue
+
+            index, value = item
+            start = time.perf_counter()
+            try:
+                value = stage.func(value)
+            except BaseException as error:
+                self._fail(error)
+                self._in_flight.release()
+                continue
+            metrics.record(start, time.perf_counter())
+
+            q_out.put((index, value))
+
+        # The last worker of the stage to finish tells the consumers of its output
+        with lock:
+            finished[0] += 1
+            if finished[0] == stage.workers:
+                for _ in range(num_consumers):
+                    q_out.put(_DONE)
+
+    def _drain(
+        self,
+        q_in: queue.Queue,
+        sink: Optional[Callable[[Any], None]],
+        metrics: StageMetrics,
+    ) -> None:
+        pending: Dict[int, Any] = {}
+        next_index = 0
+        while True:
+            item = q_in.get()
+            if item is _DONE:
+                break
+
+            if self._error is not None:
+                self._in_flight.release()
+                continue
+
+            index, value = item
+            pending[index] = value
+            while next_index in pending:
+                value = pending.pop(next_index)
+                start = time.perf_counter()
+                try:
+                    if sink is not None:
+                        sink(value)
+                except BaseException as error:
+                    self._fail(error)
+                    for _ in range(len(pending) + 1):
+                        self._in_flight.release()
+                    pending.clear()
+                    break
+                metrics.record(start, time.perf_counter())
+                next_index += 1
+                self._in_flight.release()
+
+    def run(
+        self, source: Iterable[Any], sink: Optional[Callable[[Any], None]] = None
+    ) -> Dict[str, StageMetrics]:
+        """Process every item of the source and pass the results to the sink.
+
+        Parameters
+        ----------
+        source : Iterable[Any]
+            The items to process, e.g. frames from a camera.
+        sink : Optional[Callable[[Any], None]]
+            Function that consumes the output of the last stage, e.g. to store it. It
+            is called from a single thread, in the order of the source.
+
+        Returns
+        -------
+        Dict[str, StageMetrics]
+            Metrics of the source, every stage and the sink, by name.
+
+        """
+        self._error = None
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.stages[-1].queue_size))
+
+        metrics = {"source": StageMetrics("source", workers=1)}
+        threads = []
+        for i, stage in enumerate(self.stages):
+            metrics[stage.name] = StageMetrics(stage.name, workers=stage.workers)
+            num_consumers = (
+                self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            )
+            finished, lock = [0], threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(
+                            stage,
+                            metrics[stage.name],
+                            queues[i],
+                            queues[i + 1],
+                            finished,
+                            num_consumers,
+                            lock,
+                        ),
+                        daemon=True,
+                    )
+                )
+        metrics["sink"] = StageMetrics("sink", workers=1)
+        threads.append(
+            threading.Thread(
+                target=self._drain,
+                args=(queues[-1], sink, metrics["sink"]),
+                daemon=True,
+            )
+        )
+
+        for thread in threads:
+            thread.start()
+
+        items = iter(source)
+        index = 0
+        try:
+            while self._error is None:
+                # Wait for the sink to catch up, but stop waiting if a stage fails
+                if not self._in_flight.acquire(timeout=0.1):
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    value = next(items)
+                except StopIteration:
+                    break
+                metrics["source"].record(start, time.perf_counter())
+
+                queues[0].put((index, value))
+                index += 1
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        return metrics
+
+
+def sideband_stages(
+    background: np.ndarray,
+    px_size_um: float = 5.2,
+    wavelength_um: float = 0.641,
+    mag_obj: float = 20,
+    mag_4f: float = 4,
+    na: float = 0.4,
+    grating_period: float = 3.3333,
+    carrier: Optional[Tuple[float, float]] = None,
+    dn: float = 0.59,
+    precision: Precision = Precision.DOUBLE,
+    unwrap_method: UnwrapMethod = UnwrapMethod.QUALITY_GUIDED,
+    workers: Tuple[int, int, int] = (2, 4, 1),
+) -> List[Stage]:
+    """Return the stages that turn sideband holograms into height maps.
+
+    The stages demodulate each frame relative to the background, unwrap its phase and
+    convert the phase to height.
+
+    Parameters
+    ----------
+    background : np.ndarray
+        Background hologram. Its filtered field is computed once.
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels, as returned by
+        locate_carrier. Overrides the shift computed from the grating period.
+    dn : float
+        Refractive index difference between the sample and the surrounding medium.
+    precision : Precision
+        Floating point precision of the processing.
+    unwrap_method : UnwrapMethod
+        Unwrapping algorithm.
+    workers : Tuple[int, int, int]
+        Number of workers of the demodulation, unwrapping and height stages.
+
+    """
+    params = dict(
+        px_size_um=px_size_um,
+        wavelength_um=wavelength_um,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
+        na=na,
+        grating_period=grating_period,
+        carrier=carrier,
+        precision=precision,
+    )
+    reference = BackgroundReference(background, **params)
+
+    def demodulate(img: np.ndarray) -> np.ndarray:
+        results = proc_sideband(img, background=reference, outputs=["phase"], **params)
+
+        return results["phase"]
+
+    def height(phase: np.ndarray) -> np.ndarray:
+        return compute_height_map(phase, wavelength_um=wavelength_um, dn=dn)
+
+    demodulate_workers, unwrap_workers, height_workers = workers
+
+    return [
+        Stage("demodulate", demodulate, workers=demodulate_workers),
+        Stage(
+            "unwrap",
+            lambda phase: unwrap(phase, method=unwrap_method),
+            workers=unwrap_workers,
+        ),
+        Stage("height", height, workers=height_workers),
+    ]
@@ -0,0 +1,210 @@
+"""Render image stacks to video without drawing figures.
+
+Frames are color mapped in batches through a lookup table into uint8 RGB arrays that
+are piped as raw video to an FFmpeg subprocess, which encodes them while the next batch
+is mapped.
+
+"""
+
+from functools import lru_cache
+from pathlib import Path
+import subprocess
+from typing import Iterable, List, Optional, Tuple
+
+import matplotlib
+import numpy as np
+
+
+@lru_cache(maxsize=8)
+def colormap_lut(cmap: str = "viridis", num_colors: int = 256) -> np.ndarray:
+    """Return a (num_colors, 3) uint8 lookup table of RGB colors of a colormap.
+
+    Tables are cached, so the returned array must not be modified.
+
+    """
+    colors = matplotlib.colormaps[cmap].resampled(num_colors)(np.arange(num_colors))
+    lut = np.round(255 * colors[:, :3]).astype(np.uint8)
+    lut.flags.writeable = False
+
+    return lut
+
+
+def to_rgb(
+    frames: np.ndarray, vmin: float, vmax: float, lut: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Color map a frame or a batch of frames into uint8 RGB.
+
+    Parameters
+    ----------
+    frames : np.ndarray
+        Frame of shape (H, W) or batch of frames of shape (T, H, W).
+    vmin : float
+        Value mapped to the first color. Smaller values are clipped to it.
+    vmax : float
+        Value mapped to the last color. Larger values are clipped to it.
+    lut : Optional[np.ndarray]
+        Lookup table as returned by colormap_lut. Defaults to viridis.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (..., H, W, 3).
+
+    """
+    lut = colormap_lut() if lut is None else lut
+    num_colors = lut.shape[0]
+
+    scale = (num_colors - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    indices = np.subtract(frames, vmin, dtype=np.float32)
+    indices *= scale
+    np.clip(indices, 0, num_colors - 1, out=indices)
+
+    # Round to the nearest color; NaNs are mapped to the first one
+    indices += 0.5
+    indices = np.nan_to_num(indices, copy=False).astype(np.intp)
+
+    return lut[indices]
+
+
+class FFmpegWriter:
+    """Encodes uint8 RGB frames to a video file with an FFmpeg subprocess.
+
+    Frames are written to the standard input of FFmpeg as raw video. Use the writer as
+    a context manager, or call close, to finish the file.
+
+    Parameters
+    ----------
+    out_path : Path
+        Path of the video file.
+    frame_shape : Tuple[int, int]
+        Height and width of the frames in pixels. Odd sizes are padded by one pixel,
+        since most codecs need even sizes.
+    fps : float
+        Frame rate of the video.
+    codec : str
+        Name of the FFmpeg video encoder.
+    extra_args : Optional[List[str]]
+        Additional FFmpeg output options, e.g. ["-crf", "18"].
+    ffmpeg : str
+        Name or path of the FFmpeg executable.
+
+    """
+
+    def __init__(
+        self,
+        out_path: Path,
+        frame_shape: Tuple[int, int],
+        fps: float = 10,
+        codec: str = "libx264",
+        extra_args: Optional[List[str]] = None,
+        ffmpeg: str = "ffmpeg",
+    ) -> None:
+        self.frame_shape = tuple(frame_shape)
+        height, width = frame_shape
+        cmd = [
+            ffmpeg,
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v",
+            codec,
+            "-pix_fmt",
+            "yuv420p",
+            *(extra_args or []),
+            str(out_path),
+        ]
+        self._process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def write(self, rgb: np.ndarray) -> None:
+        """Write a frame of shape (H, W, 3) or a batch of shape (T, H, W, 3)."""
+        if rgb.shape[-3:-1] != self.frame_shape:
+            raise ValueError(
+                f"Frames of shape {rgb.shape[-3:-1]} do not match the video's frames "
+                f"of shape {self.frame_shape}"
+            )
+
+        try:
+            self._process.stdin.write(np.ascontiguousarray(rgb, dtype=np.uint8).data)
+        except BrokenPipeError:
+            self.close()
+
+    def close(self) -> None:
+        """Finish encoding and raise an error if FFmpeg failed."""
+        if self._process.stdin.closed:
+            return
+
+        self._process.stdin.close()
+        stderr = self._process.stderr.read().decode(errors="replace")
+        if self._process.wait() != 0:
+            raise RuntimeError(f"FFmpeg failed: {stderr.strip()}")
+
+    def __enter__(self) -> "FFmpegWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def render_movie(
+    batches: Iterable[np.ndarray],
+    out_path: Path,
+    vmin: float,
+    vmax: float,
+    fps: float = 10,
+    cmap: str = "viridis",
+    **kwargs,
+) -> int:
+    """Color map batches of frames and encode them to a video.
+
+    Parameters
+    ----------
+    batches : Iterable[np.ndarray]
+        Batches of frames of shape (T, H, W), e.g. from a stack store or TIFF file.
+    out_path : Path
+        Path of the video file.
+    vmin : float
+        Value mapped to the first color of the colormap.
+    vmax : float
+        Value mapped to the last color of the colormap.
+    fps : float
+        Frame rate of the video.
+    cmap : str
+        Name of a Matplotlib colormap.
+    **kwargs
+        Additional arguments of FFmpegWriter.
+
+    Returns
+    -------
+    int
+        Number of frames written.
+
+    """
+    lut = colormap_lut(cmap)
+    writer: Optional[FFmpegWriter] = None
+    num_frames = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = FFmpegWriter(out_path, batch.shape[-2:], fps=fps, **kwargs)
+
+            writer.write(to_rgb(batch, vmin, vmax, lut))
+            num_frames += batch.shape[0]
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return num_frames
@@ -0,0 +1,301 @@
+"""Process many objects in a field of view as a batch of regions of interest.
+
+When a frame holds many small objects, such as beads or cells, cropping a square
+about each of them and processing the crops as one stack is much faster than
+processing the whole frame, since the crops cover only a fraction of it and share a
+single sideband plan and a single batched FFT, mask and unwrap pass.
+
+"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from scipy import ndimage
+from skimage.feature import peak_local_max
+
+from .core import (
+    BackgroundReference,
+    Precision,
+    Results,
+    demodulate_cropped,
+    locate_carrier,
+    proc_sideband_stack,
+)
+from .fft_backends import FFTBackend
+from .unwrapping import UnwrapMethod, Unwrapper, unwrap
+
+
+def roi_origins(
+    centers: np.ndarray, frame_shape: Tuple[int, int], num_px: int
+) -> np.ndarray:
+    """Return the top left corners of num_px x num_px squares about centers.
+
+    Squares that would extend past the edges of the frame are moved inside it, so that
+    every region of interest has the same size.
+
+    Parameters
+    ----------
+    centers : np.ndarray
+        Row and column of the center of each region, of shape (K, 2).
+    frame_shape : Tuple[int, int]
+        Shape of the frames.
+    num_px : int
+        Side length of the regions in pixels.
+
+    Returns
+    -------
+    np.ndarray
+        Row and column of the top left corner of each region, of shape (K, 2).
+
+    """
+    if num_px > min(frame_shape):
+        raise ValueError(f"Regions of {num_px} px do not fit in a {frame_shape} frame")
+
+    centers = np.round(np.asarray(centers, dtype=float)).astype(np.intp)
+    origins = centers.reshape(-1, 2) - num_px // 2
+
+    return np.clip(origins, 0, np.subtract(frame_shape, num_px))
+
+
+def extract_rois(imgs: np.ndarray, centers: np.ndarray, num_px: int) -> np.ndarray:
+    """Crop num_px x num_px regions of interest about centers from images.
+
+    All the regions are gathered in one indexing operation from a strided view of the
+    images, without a Python loop over the regions.
+
+    Parameters
+    ----------
+    imgs : np.ndarray
+        Image of shape (H, W) or stack of images of shape (T, H, W).
+    centers : np.ndarray
+        Row and column of the center of each region, of shape (K, 2). Regions are
+        moved inside the frame as by roi_origins.
+    num_px : int
+        Side length of the regions in pixels.
+
+    Returns
+    -------
+    np.ndarray
+        Regions of shape (K, num_px, num_px), or (T, K, num_px, num_px) for a stack.
+
+    """
+    origins = roi_origins(centers, imgs.shape[-2:], num_px)
+    windows = np.lib.stride_tricks.sliding_window_view(
+        imgs, (num_px, num_px), axis=(-2, -1)
+    )
+
+    return windows[..., origins[:, 0], origins[:, 1], :, :]
+
+
+def roi_carrier(
+    carrier: Tuple[float, float], frame_shape: Tuple[int, int], num_px: int
+) -> Tuple[float, float]:
+    """Convert the carrier of a whole frame to that of a num_px x num_px crop of it.
+
+    The carrier is in pixels of the FFT, i.e. in cycles over the image, so it scales
+    with the size of the image.
+
+    """
+    return (
+        carrier[0] * num_px / frame_shape[0],
+        carrier[1] * num_px / frame_shape[1],
+    )
+
+
+def detect_objects(
+    img: np.ndarray,
+    bg: np.ndarray,
+    min_distance_px: int = 32,
+    threshold_rad: float = 1.0,
+    max_objects: Optional[int] = None,
+    px_size_um: float = 5.2,
+    wavelength_um: float = 0.641,
+    mag_obj: float = 20,
+    mag_4f: float = 4,
+    na: float = 0.4,
+    carrier: Optional[Tuple[float, float]] = None,
+    backend: Optional[FFTBackend] = None,
+) -> np.ndarray:
+    """Locate phase objects in a hologram from a coarse phase image.
+
+    The phase of the frame relative to the background is computed at the low
+    resolution that the NA supports, which is cheap even for large frames. Objects are
+    the local maxima of its smoothed magnitude, after removing its median.
+
+    Parameters
+    ----------
+    img : np.ndarray
+        Hologram of shape (H, W). Must be square. Pixel values must be between 0 and
+        1.
+    bg : np.ndarray
+        Background hologram of the same shape.
+    min_distance_px : int
+        Smallest distance in pixels between objects.
+    threshold_rad : float
+        Smallest magnitude of the phase of an object in radians.
+    max_objects : Optional[int]
+        Largest number of objects returned, in order of decreasing phase. All of them
+        are returned if it is None.
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels. Defaults to the carrier
+        located on the background.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+
+    Returns
+    -------
+    np.ndarray
+        Row and column of the center of each object in pixels of the frame, of shape
+        (K, 2).
+
+    """
+    carrier = locate_carrier(bg, backend=backend) if carrier is None else carrier
+    params = dict(
+        px_size_um=px_size_um,
+        wavelength_um=wavelength_um,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
+        na=na,
+        carrier=carrier,
+        backend=backend,
+    )
+    field = demodulate_cropped(np.stack([img, bg]), **params)["field"]
+
+    phase = unwrap(np.angle(field[0] * np.conj(field[1])))
+    magnitude = np.abs(phase - np.median(phase))
+
+    scale = img.shape[-1] / field.shape[-1]
+    min_distance = max(1, int(round(min_distance_px / scale)))
+    magnitude = ndimage.gaussian_filter(magnitude, sigma=min_distance / 4)
+
+    peaks = peak_local_max(
+        magnitude,
+        min_distance=min_distance,
+        threshold_abs=threshold_rad,
+        num_peaks=np.inf if max_objects is None else max_objects,
+        exclude_border=False,
+    )
+
+    # Refine each peak to a fraction of a coarse pixel by the centroid of its 3 x 3
+    # neighborhood, then map it to pixels of the frame. Coarse pixel i samples the
+    # frame at pixel i * scale.
+    padded = np.pad(magnitude, 1, mode="edge")
+    offsets = np.array([-1, 0, 1])
+    centers = np.empty((len(peaks), 2))
+    for k, (row, col) in enumerate(peaks):
+        weights = padded[row : row + 3, col : col + 3]
+        weights = weights - weights.min()
+        total = weights.sum()
+        if total > 0:
+            d_row = weights.sum(axis=1) @ offsets / total
+            d_col = weights.sum(axis=0) @ offsets / total
+        else:
+            d_row = d_col = 0.0
+        centers[k] = row + d_row, col + d_col
+
+    return np.round(centers * scale).astype(np.intp)
+
+
+def proc_rois(
+    img: np.ndarray,
+    centers: np.ndarray,
+    num_px: int,
+    bg: Optional[np.ndarray] = None,
+    px_size_um: float = 5.2,
+    wavelength_um: float = 0.641,
+    mag_obj: float = 20,
+    mag_4f: float = 4,
+    na: float = 0.4,
+    grating_period: float = 3.3333,
+    carrier: Optional[Tuple[float, float]] = None,
+    backend: Optional[FFTBackend] = None,
+    precision: Precision = Precision.DOUBLE,
+    unwrap_method: UnwrapMethod = UnwrapMethod.QUALITY_GUIDED,
+    unwrapper: Optional[Unwrapper] = None,
+    outputs: Iterable[str] = ("phase", "phase_unwrapped"),
+) -> Results:
+    """Process num_px x num_px regions of interest of a hologram as one stack.
+
+    Parameters
+    ----------
+    img : np.ndarray
+        Hologram of shape (H, W). Pixel values must be between 0 and 1.
+    centers : np.ndarray
+        Row and column of the center of each region, of shape (K, 2), e.g. from
+        detect_objects. Regions are moved inside the frame as by roi_origins.
+    num_px : int
+        Side length of the regions in pixels.
+    bg : Optional[np.ndarray]
+        Background hologram of shape (H, W). The phase of each region is relative to
+        the same region of the background if it is given.
+    px_size_um : float
+        Physical size of a pixel in microns.
+    wavelength_um : float
+        Wavelength of the illumination in microns.
+    mag_obj : float
+        Magnification of the objective.
+    mag_4f : float
+        Magnification of the 4f system.
+    na : float
+        Numerical aperture of the objective.
+    grating_period : float
+        Period of the grating in microns.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels of the whole frame, as
+        returned by locate_carrier. Defaults to the carrier located on the background,
+        or on the hologram if there is no background.
+    backend : Optional[FFTBackend]
+        FFT implementation to use. Defaults to the backend returned by get_backend.
+    precision : Precision
+        Floating point precision of the processing.
+    unwrap_method : UnwrapMethod
+        Unwrapping algorithm, if no unwrapper is given.
+    unwrapper : Optional[Unwrapper]
+        Unwrapper of the phase images, e.g. one that runs in parallel.
+    outputs : Iterable[str]
+        Names of the results to return, as for proc_sideband_stack.
+
+    Returns
+    -------
+    Results
+        Results of shape (K, num_px, num_px), in the order of centers.
+
+    """
+    # Locate the carrier on the whole frame, where it spans many more fringes than in
+    # any of the regions
+    if carrier is None:
+        carrier = locate_carrier(img if bg is None else bg, backend=backend)
+    carrier = roi_carrier(carrier, img.shape[-2:], num_px)
+
+    params = dict(
+        px_size_um=px_size_um,
+        wavelength_um=wavelength_um,
+        mag_obj=mag_obj,
+        mag_4f=mag_4f,
+        na=na,
+        grating_period=grating_period,
+        carrier=carrier,
+        backend=backend,
+        precision=precision,
+    )
+    background = None
+    if bg is not None:
+        background = BackgroundReference(extract_rois(bg, centers, num_px), **params)
+
+    return proc_sideband_stack(
+        extract_rois(img, centers, num_px),
+        unwrapper=Unwrapper(method=unwrap_method) if unwrapper is None else unwrapper,
+        background=background,
+        outputs=outputs,
+        **params,
+    )
@@ -1,10 +1,14 @@
 """Process images from digital sideband holography."""
 
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
-from numpy.fft import fft2, fftshift
-from skimage import io, restoration
+from skimage import io
+from skimage.util import montage
+
+from holoproc.core import compute_height_map, locate_carrier
+from holoproc.roi import detect_objects, proc_rois
 
 
 IMG_PATH = Path(
@@ -15,134 +19,55 @@ BG_PATH = Path(
 )
 
 
-def compute_mask_radius_px(
-    num_px: int, px_size_um: float, wavelength_um: float, mag: float, na: float
-) -> int:
-    """Compute the radius of the circular mask in pixels.
-
-    Parameters
-    ----------
-    num_px : int
-        Number of pixels in the image (must be square).
-    px_size : float
-        Physical size of a pixel in microns.
-
-    """
-    # Compute the size of a pixel in the sample plane
-    dx = px_size_um / mag
-
-    # Sampling frequency in the sample plane
-    f_S = 1 / dx
-
-    # Sampling frequency in the Fourier plane
-    df = f_S / num_px
-
-    # Mask radius in the Fourier plane in pixels
-    # R = NA / wavelength / df
-    radius_px = int(na / wavelength_um / df)
-
-    return radius_px
-
-
-def mask_fft(img_fft: np.ndarray, radius_px: int = 10) -> np.ndarray:
-    """Apply a circular mask to a shifted FFT about the origin."""
-    fft_cp = img_fft.copy()
-    y, x = np.ogrid[0 : fft_cp.shape[0], 0 : fft_cp.shape[1]]
-    mask = (x - fft_cp.shape[0] // 2) ** 2 + (
-        y - fft_cp.shape[1] // 2
-    ) ** 2 <= radius_px**2
-    fft_cp[~mask] = 0
-
-    return fft_cp
-
-
-def unwrap(phase: np.ndarray) -> np.ndarray:
-    """Unwrap the phase image using Goldstein's algorithm."""
-    return restoration.unwrap_phase(phase)
-
-
-def compute_height_map(
-    phase: np.ndarray, wavelength_um: float, dn: float
-) -> np.ndarray:
-    """Compute the height map from the unwrapped phase image.
-
-    Parameters
-    ----------
-    dn: float
-        Refractive index difference between the sample and the surrounding medium.
-
-    """
-    return phase * wavelength_um / (2 * np.pi * dn)
-
-
-def main(img_path: Path = IMG_PATH, bg_path: Path = BG_PATH):
+def main(
+    img_path: Path = IMG_PATH,
+    bg_path: Path = BG_PATH,
+    centers: Optional[np.ndarray] = None,
+    crop_size: int = 512,
+):
     img = io.imread(img_path)
     bg = io.imread(bg_path)
 
-    # Crop to a region containing a single bead
-    bead_row, bead_col = (500, 500)
-    crop_size = 512  # px; must be a power of 2
-    img = img[
-        (bead_row - crop_size // 2) : (bead_row + crop_size // 2),
-        (bead_col - crop_size // 2) : (bead_col + crop_size // 2),
-    ]
-    bg = bg[
-        (bead_row - crop_size // 2) : (bead_row + crop_size // 2),
-        (bead_col - crop_size // 2) : (bead_col + crop_size // 2),
-    ]
-
     # Convert to grayscale from 0 to 1
     img = img.mean(axis=2) / 255
     bg = bg.mean(axis=2) / 255
 
-    # Compute the FFT of the image and background
-    img_fft = fftshift(fft2(img))
-    bg_fft = fftshift(fft2(bg))
-
-    # Circular shift the FFTs to center the origin
-    shift_px = int(
-        25 * crop_size / 64
-    )  # Amount to bring modulated component to center; pre-computed for 64x64 crop
-    img_fft = np.roll(img_fft, shift=shift_px, axis=1)
-    bg_fft = np.roll(bg_fft, shift=shift_px, axis=1)
-
-    # Compute the radius of the circular mask in pixels
-    # The radius is k * NA in angular frequency, or NA / wavelength in spatial frequency
+    # Locate the sideband to a fraction of a pixel on the whole background
+    carrier = locate_carrier(bg)
+    print(f"Carrier: ({carrier[0]:.2f}, {carrier[1]:.2f}) px")
+
+    # Detect the beads from a coarse phase image of the whole frame, unless their
+    # locations are given
+    if centers is None:
+        centers = detect_objects(
+            img, bg, min_distance_px=crop_size // 4, carrier=carrier
+        )
+    print(f"Regions of interest: {len(centers)}")
+
+    # Crop a region about each bead from the image and background, and process all of
+    # them at once. The phase of each region is computed relative to the same region
+    # of the background and unwrapped only once.
     # Magnification (80x) is objective mag. (20x) times 4f system mag. (4x)
-    radius_px = compute_mask_radius_px(
-        num_px=crop_size, px_size_um=5.2, wavelength_um=0.641, mag=80, na=0.4
+    results = proc_rois(
+        img,
+        centers,
+        crop_size,
+        bg=bg,
+        px_size_um=5.2,
+        wavelength_um=0.641,
+        mag_obj=20,
+        mag_4f=4,
+        na=0.4,
+        carrier=carrier,
+        outputs=["phase_unwrapped"],
     )
-    print(f"Mask radius: {radius_px} px")
 
-    # Apply a circular mask of radius R to the FFTs
-    img_fft = mask_fft(img_fft, radius_px=radius_px)
-    bg_fft = mask_fft(bg_fft, radius_px=radius_px)
-
-    # Inverse FFT to get the modulated component
-    img_filtered = np.fft.ifft2(np.fft.ifftshift(img_fft))
-    bg_filtered = np.fft.ifft2(np.fft.ifftshift(bg_fft))
-
-    # Compute the phase image
-    # This is only valid for thin objects where the phase difference is less than 2 * pi
-    # See Pham, et al., "Fast phase reconstruction in white light diffraction phase microscopy,"
-    # Applied Optics 52, A97 (2013)
-    # phase = np.angle(img_filtered / bg_filtered)
-
-    # Compute the phase image using the arctangent
-    img_wrapped = np.angle(img_filtered)
-    bg_wrapped = np.angle(bg_filtered)
-
-    # Unwrap the phase image
-    img_unwrapped = unwrap(img_wrapped)
-    bg_unwrapped = unwrap(bg_wrapped)
-
-    # Subtract the background from the image
-    phase = img_unwrapped - bg_unwrapped
-
-    # Compute the height map
-    height_map = compute_height_map(phase, wavelength_um=0.641, dn=0.59)
+    # Compute the height maps
+    height_maps = compute_height_map(
+        results["phase_unwrapped"], wavelength_um=0.641, dn=0.59
+    )
 
-    io.imshow(height_map)
+    io.imshow(montage(height_maps))
     io.show()
 
 
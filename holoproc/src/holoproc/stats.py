@@ -0,0 +1,94 @@
+"""Per-pixel statistics of image streams computed in constant memory."""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class RunningStats:
+    """Per-pixel count, mean, variance, minimum and maximum of a stream of frames.
+
+    Frames are accumulated with Welford's algorithm, generalized to batches by Chan et
+    al., so that the memory used does not depend on the number of frames. Accumulators
+    that were updated with different parts of a stream, e.g. by parallel workers, can be
+    merged into one.
+
+    Parameters
+    ----------
+    shape : Tuple[int, ...]
+        Shape of a single frame.
+
+    """
+
+    def __init__(self, shape: Tuple[int, ...]) -> None:
+        self.shape = shape
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    def update(self, frames: np.ndarray) -> None:
+        """Add a frame or a batch of frames of shape (T, ...) to the statistics."""
+        if frames.shape == self.shape:
+            frames = frames[np.newaxis]
+
+        count = frames.shape[0]
+        if count == 0:
+            return
+
+        mean = frames.mean(axis=0, dtype=np.float64)
+        m2 = ((frames - mean) ** 2).sum(axis=0, dtype=np.float64)
+        self._combine(count, mean, m2, frames.min(axis=0), frames.max(axis=0))
+
+    def merge(self, other: "RunningStats") -> None:
+        """Add the statistics of another accumulator to this one."""
+        if other.shape != self.shape:
+            raise ValueError(
+                f"Cannot merge statistics of shape {other.shape} into {self.shape}"
+            )
+
+        if other.count == 0:
+            return
+
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(
+        self,
+        count: int,
+        mean: np.ndarray,
+        m2: np.ndarray,
+        min_: np.ndarray,
+        max_: np.ndarray,
+    ) -> None:
+        total = self.count + count
+        delta = mean - self.mean
+
+        self.mean += delta * (count / total)
+        self.m2 += m2 + delta**2 * (self.count * count / total)
+        self.count = total
+        np.minimum(self.min, min_, out=self.min)
+        np.maximum(self.max, max_, out=self.max)
+
+    def variance(self, ddof: int = 0) -> np.ndarray:
+        """Return the per-pixel variance, dividing by count - ddof like np.var."""
+        if self.count <= ddof:
+            return np.full(self.shape, np.nan)
+
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 0) -> np.ndarray:
+        """Return the per-pixel standard deviation, dividing by count - ddof."""
+        return np.sqrt(self.variance(ddof))
+
+
+def merge_all(stats: List[RunningStats]) -> Optional[RunningStats]:
+    """Merge several accumulators into a new one, or return None if there are none."""
+    if not stats:
+        return None
+
+    merged = RunningStats(stats[0].shape)
+    for s in stats:
+        merged.merge(s)
+
+    return merged
@@ -0,0 +1,329 @@
+"""Chunked, compressed storage of image stacks with random access to frames.
+
+The default format is a directory of one compressed .npy file per frame plus a JSON
+file of metadata, which needs nothing beyond the standard library. Zarr and HDF5 are
+used instead when they are requested and installed.
+
+"""
+
+from abc import ABC, abstractmethod
+import bz2
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import io
+import json
+import lzma
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import zlib
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:  # pragma: no cover
+    h5py = None
+
+try:
+    import zarr
+except ImportError:  # pragma: no cover
+    zarr = None
+
+
+METADATA_FILE = "stack.json"
+COMPRESSORS = {
+    "zlib": lambda data, level: zlib.compress(data, level),
+    "bz2": lambda data, level: bz2.compress(data, compresslevel=max(level, 1)),
+    "lzma": lambda data, level: lzma.compress(data, preset=level),
+}
+DECOMPRESSORS = {
+    "zlib": zlib.decompress,
+    "bz2": bz2.decompress,
+    "lzma": lzma.decompress,
+}
+
+
+class StackWriter(ABC):
+    """Appends frames of a fixed shape and type to a stack on disk."""
+
+    @abstractmethod
+    def append(self, frames: np.ndarray) -> None:
+        """Append a frame of shape (H, W) or a batch of frames of shape (T, H, W)."""
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "StackWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class NpyChunkWriter(StackWriter):
+    """Writes each frame to its own compressed .npy file in a directory.
+
+    Frames are compressed and written by a pool of threads while the caller continues,
+    and the number of frames in flight is bounded. The metadata, including the number
+    of frames, is rewritten by flush and close, so a reader sees every frame that was
+    written before the last flush.
+
+    Parameters
+    ----------
+    path : Path
+        Directory of the stack. It is created if it does not exist.
+    frame_shape : Tuple[int, int]
+        Shape of each frame.
+    dtype : np.dtype
+        Type of the frames.
+    compression : Optional[str]
+        Name of the codec, one of zlib, bz2 and lzma, or None to store uncompressed
+        .npy files that can be memory mapped.
+    level : int
+        Compression level. Low levels are much faster and compress phase images
+        nearly as well.
+    workers : int
+        Number of threads that compress and write frames.
+    resume : bool
+        Append to the frames of an existing stack in path, up to its last flush,
+        instead of starting a new one. Its frames must have the same shape, type and
+        compression.
+
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        frame_shape: Tuple[int, int],
+        dtype: np.dtype = np.float32,
+        compression: Optional[str] = "zlib",
+        level: int = 1,
+        workers: int = 4,
+        resume: bool = False,
+    ) -> None:
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.path = Path(path)
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.compression = compression
+        self.level = level
+        self.workers = workers
+        self.count = 0
+
+        if resume and (self.path / METADATA_FILE).exists():
+            existing = NpyChunkReader(self.path)
+            if (
+                existing.shape[1:] != self.frame_shape
+                or existing.dtype != self.dtype
+                or existing.compression != compression
+            ):
+                raise ValueError(f"Cannot resume the different stack in {self.path}")
+            self.count = len(existing)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending: List[Future] = []
+        self._write_metadata()
+
+    def _write_metadata(self) -> None:
+        metadata = {
+            "shape": [self.count, *self.frame_shape],
+            "dtype": self.dtype.str,
+            "compression": self.compression,
+        }
+        # Replace the file atomically, so that a crash never leaves it half written
+        tmp_path = self.path / f"{METADATA_FILE}.tmp"
+        tmp_path.write_text(json.dumps(metadata))
+        os.replace(tmp_path, self.path / METADATA_FILE)
+
+    def _write_frame(self, index: int, frame: np.ndarray) -> None:
+        buffer = io.BytesIO()
+        np.save(buffer, frame)
+        data = buffer.getvalue()
+        if self.compression is not None:
+            data = COMPRESSORS[self.compression](data, self.level)
+
+        chunk_path(self.path, index, self.compression).write_bytes(data)
+
+    def append(self, frames: np.ndarray) -> None:
+        """Append a frame of shape (H, W) or a batch of frames of shape (T, H, W)."""
+        frames = np.asarray(frames, dtype=self.dtype)
+        if frames.shape == self.frame_shape:
+            frames = frames[np.newaxis]
+        if frames.shape[1:] != self.frame_shape:
+            raise ValueError(
+                f"Frames of shape {frames.shape[1:]} do not match the stack's frames "
+                f"of shape {self.frame_shape}"
+            )
+
+        for frame in frames:
+            # Copy the frame, since the caller may reuse its buffer
+            self._pending.append(
+                self._executor.submit(self._write_frame, self.count, frame.copy())
+            )
+            self.count += 1
+
+            # Bound the number of frames held in memory while they are compressed
+            if len(self._pending) > 2 * self.workers:
+                self._collect(wait(self._pending, return_when=FIRST_COMPLETED).done)
+
+    def _collect(self, done: Set[Future]) -> None:
+        for future in done:
+            future.result()
+        self._pending = [f for f in self._pending if f not in done]
+
+    def flush(self) -> None:
+        """Wait for all frames to be written and update the metadata."""
+        self._collect(wait(self._pending).done)
+        self._write_metadata()
+
+    def close(self) -> None:
+        self.flush()
+        self._executor.shutdown()
+
+
+class ZarrWriter(StackWriter):
+    """Appends frames to a Zarr array with one chunk per frame.
+
+    Zarr compresses the chunks with Blosc, which uses several threads.
+
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        frame_shape: Tuple[int, int],
+        dtype: np.dtype = np.float32,
+    ) -> None:
+        if zarr is None:
+            raise ImportError("zarr is not installed")
+
+        self.frame_shape = tuple(frame_shape)
+        self.array = zarr.open(
+            str(path),
+            mode="w",
+            shape=(0, *frame_shape),
+            chunks=(1, *frame_shape),
+            dtype=dtype,
+        )
+
+    def append(self, frames: np.ndarray) -> None:
+        frames = np.asarray(frames)
+        if frames.shape == self.frame_shape:
+            frames = frames[np.newaxis]
+
+        self.array.append(frames, axis=0)
+
+    def close(self) -> None:
+        pass
+
+
+class HDF5Writer(StackWriter):
+    """Appends frames to a resizable HDF5 dataset of gzip-compressed frame chunks."""
+
+    def __init__(
+        self,
+        path: Path,
+        frame_shape: Tuple[int, int],
+        dtype: np.dtype = np.float32,
+        dataset: str = "frames",
+        level: int = 1,
+    ) -> None:
+        if h5py is None:
+            raise ImportError("h5py is not installed")
+
+        self.frame_shape = tuple(frame_shape)
+        self.file = h5py.File(path, "w")
+        self.dataset = self.file.create_dataset(
+            dataset,
+            shape=(0, *frame_shape),
+            maxshape=(None, *frame_shape),
+            chunks=(1, *frame_shape),
+            dtype=dtype,
+            compression="gzip",
+            compression_opts=level,
+        )
+
+    def append(self, frames: np.ndarray) -> None:
+        frames = np.asarray(frames)
+        if frames.shape == self.frame_shape:
+            frames = frames[np.newaxis]
+
+        count = self.dataset.shape[0]
+        self.dataset.resize(count + frames.shape[0], axis=0)
+        self.dataset[count:] = frames
+
+    def close(self) -> None:
+        self.file.close()
+
+
+WRITERS = {"npy": NpyChunkWriter, "zarr": ZarrWriter, "hdf5": HDF5Writer}
+
+
+def open_writer(
+    path: Path,
+    frame_shape: Tuple[int, int],
+    dtype: np.dtype = np.float32,
+    format: str = "npy",
+    **kwargs,
+) -> StackWriter:
+    """Open a writer of a stack in one of the formats npy, zarr and hdf5."""
+    if format not in WRITERS:
+        raise ValueError(f"Unknown format: {format}")
+
+    return WRITERS[format](path, frame_shape, dtype=dtype, **kwargs)
+
+
+def chunk_path(path: Path, index: int, compression: Optional[str]) -> Path:
+    """Return the path of the file of a frame of a .npy chunk directory."""
+    suffix = "" if compression is None else f".{compression}"
+
+    return Path(path) / f"{index:08d}.npy{suffix}"
+
+
+class NpyChunkReader:
+    """Random access to the frames of a stack written by NpyChunkWriter.
+
+    Indexing with an integer decodes a single frame, and indexing with a slice decodes
+    only the frames in it.
+
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        metadata: Dict = json.loads((self.path / METADATA_FILE).read_text())
+        self.shape = tuple(metadata["shape"])
+        self.dtype = np.dtype(metadata["dtype"])
+        self.compression: Optional[str] = metadata["compression"]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _read_frame(self, index: int) -> np.ndarray:
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"Frame {index} is out of range for {len(self)} frames")
+
+        path = chunk_path(self.path, index % len(self), self.compression)
+        if self.compression is None:
+            return np.load(path, mmap_mode="r")
+
+        data = DECOMPRESSORS[self.compression](path.read_bytes())
+        return np.load(io.BytesIO(data))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            frames = np.empty((len(indices), *self.shape[1:]), dtype=self.dtype)
+            for i, j in enumerate(indices):
+                frames[i] = self._read_frame(j)
+
+            return frames
+
+        return self._read_frame(index)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self._read_frame(i)
@@ -0,0 +1,173 @@
+"""Synthetic sideband holograms of known phase objects."""
+
+import time
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from .core import compute_shift_px
+
+
+def default_carrier(num_px: int) -> Tuple[float, float]:
+    """Return the carrier of the default optical parameters for a frame size."""
+    shift_px = compute_shift_px(
+        num_px=num_px, px_size_um=5.2, mag_obj=20, mag_4f=4, grating_period=3.3333
+    )
+
+    return 0.0, -float(shift_px)
+
+
+def gaussian_bump(
+    num_px: int, height: float = 2.0, sigma_px: float = 16.0
+) -> np.ndarray:
+    """Return a Gaussian phase bump in radians centered in a num_px x num_px frame."""
+    y, x = np.mgrid[0:num_px, 0:num_px]
+    r_sq = (x - num_px / 2) ** 2 + (y - num_px / 2) ** 2
+
+    return height * np.exp(-r_sq / (2 * sigma_px**2))
+
+
+def spherical_bead(
+    num_px: int, height: float = 6.0, radius_px: Optional[float] = None
+) -> np.ndarray:
+    """Return the phase in radians of a sphere centered in a num_px x num_px frame.
+
+    The phase is proportional to the thickness of the sphere, and is height at its
+    center. The radius defaults to 1/8 of the frame.
+
+    """
+    radius_px = num_px / 8 if radius_px is None else radius_px
+    y, x = np.mgrid[0:num_px, 0:num_px]
+    r_sq = (x - num_px / 2) ** 2 + (y - num_px / 2) ** 2
+
+    return height * np.sqrt(np.clip(1 - r_sq / radius_px**2, 0, None))
+
+
+def sideband_hologram(
+    phase: np.ndarray,
+    carrier: Optional[Tuple[float, float]] = None,
+    modulation: float = 0.4,
+    noise: float = 0.0,
+    rng: Optional[np.random.Generator] = None,
+    bit_depth: Optional[int] = None,
+) -> np.ndarray:
+    """Return the off-axis hologram of a phase object on a tilted carrier.
+
+    Parameters
+    ----------
+    phase : np.ndarray
+        Phase of the object in radians, of shape (H, W).
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels. Defaults to the carrier of
+        the default optical parameters of proc_sideband.
+    modulation : float
+        Amplitude of the fringes about a mean intensity of 0.5.
+    noise : float
+        Standard deviation of additive Gaussian noise.
+    rng : Optional[np.random.Generator]
+        Random number generator of the noise.
+    bit_depth : Optional[int]
+        Number of bits to which the pixel values are quantized, like a camera. The
+        values are not quantized if it is None.
+
+    Returns
+    -------
+    np.ndarray
+        Hologram with pixel values between 0 and 1.
+
+    """
+    num_rows, num_cols = phase.shape
+    carrier = default_carrier(num_cols) if carrier is None else carrier
+    y, x = np.ogrid[0:num_rows, 0:num_cols]
+
+    img = 0.5 + modulation * np.cos(
+        2 * np.pi * (carrier[0] * y / num_rows + carrier[1] * x / num_cols) + phase
+    )
+    if noise > 0:
+        rng = np.random.default_rng() if rng is None else rng
+        img += noise * rng.standard_normal(img.shape)
+
+    img = np.clip(img, 0, 1)
+    if bit_depth is not None:
+        max_value = 2**bit_depth - 1
+        img = np.round(img * max_value) / max_value
+
+    return img
+
+
+def synthetic_stack(
+    phase: np.ndarray,
+    num_frames: int,
+    carrier: Optional[Tuple[float, float]] = None,
+    noise: float = 0.005,
+    bit_depth: Optional[int] = 12,
+    seed: int = 0,
+) -> np.ndarray:
+    """Return a stack of holograms of the same phase object with independent noise.
+
+    Parameters
+    ----------
+    phase : np.ndarray
+        Phase of the object in radians, of shape (H, W).
+    num_frames : int
+        Number of frames of the stack.
+    carrier : Optional[Tuple[float, float]]
+        Row and column frequencies of the sideband in pixels.
+    noise : float
+        Standard deviation of the noise of each frame.
+    bit_depth : Optional[int]
+        Number of bits to which the pixel values are quantized.
+    seed : int
+        Seed of the noise.
+
+    Returns
+    -------
+    np.ndarray
+        Holograms of shape (T, H, W).
+
+    """
+    rng = np.random.default_rng(seed)
+
+    return np.stack(
+        [
+            sideband_hologram(
+                phase, carrier=carrier, noise=noise, rng=rng, bit_depth=bit_depth
+            )
+            for _ in range(num_frames)
+        ]
+    )
+
+
+def synthetic_frames(
+    num_frames: int,
+    num_px: int = 256,
+    fps: Optional[float] = None,
+    noise: float = 0.005,
+    seed: int = 0,
+) -> Iterator[np.ndarray]:
+    """Stand in for a camera by yielding holograms of a slowly growing phase bump.
+
+    Parameters
+    ----------
+    num_frames : int
+        Number of frames to yield.
+    num_px : int
+        Side length of the frames in pixels.
+    fps : Optional[float]
+        Frame rate at which frames are yielded, like a camera. Frames are yielded as
+        fast as they are requested if it is None.
+    noise : float
+        Standard deviation of the noise of each frame.
+    seed : int
+        Seed of the noise.
+
+    """
+    rng = np.random.default_rng(seed)
+    bump = gaussian_bump(num_px)
+
+    start = time.perf_counter()
+    for i in range(num_frames):
+        if fps is not None:
+            time.sleep(max(0.0, start + i / fps - time.perf_counter()))
+
+        yield sideband_hologram((1 + 0.01 * i) * bump, noise=noise, rng=rng)
@@ -1,96 +1,163 @@
 """Unwrap a time series of phase images."""
 
+from contextlib import ExitStack
 from pathlib import Path
+from typing import Optional
 
 import matplotlib.pyplot as plt
-from matplotlib import animation, colors
 import numpy as np
-import skimage.io as io
-import skimage.restoration as restoration
 
-from holoproc import proc_sideband
+from holoproc import proc_sideband_stack
+from holoproc.core import (
+    BackgroundReference,
+    Precision,
+    compute_height_map,
+    locate_carrier,
+)
+from holoproc.ingest import center_crop, iter_tiff_batches, tiff_shape
+from holoproc.render import render_movie
+from holoproc.stats import RunningStats
+from holoproc.store import open_writer
+from holoproc.unwrapping import UnwrapMethod, Unwrapper
 
 IMG_PATH = Path("/home/kmd/src/playground/holoproc/data/2023-05-08-Noise/noise.tif")
 
 
-def animate(imgs: np.ndarray, fps: int = 5, out_path: Path = None):
-    """Animate a time series of images."""
-    fig = plt.figure()
-    im = plt.imshow(imgs[0, :, :], animated=True)
+def animate(
+    imgs: np.ndarray, fps: int = 5, out_path: Path = None, batch_size: int = 64
+):
+    """Animate a time series of images.
 
-    vmin, vmax = np.min(imgs), np.max(imgs)
-    cb = plt.colorbar(im)
-    cb.set_label("phase (rad)")
-    im.set_clim([vmin, vmax])
-
-    def updatefig(i):
-        im.set_array(imgs[i, :, :])
-        return (im,)
+    The frames are color mapped in batches and encoded by FFmpeg without drawing a
+    figure for each of them.
 
-    ani = animation.FuncAnimation(
-        fig, updatefig, frames=imgs.shape[0], interval=1000 // fps, blit=True
-    )
-    writer = animation.FFMpegWriter(fps=10, extra_args=["-vcodec", "libx264"])
-    if out_path is not None:
-        ani.save(out_path, writer=writer)
-    else:
-        ani.save("phase_movie.mp4", writer=writer)
+    """
+    out_path = Path("phase_movie.mp4") if out_path is None else out_path
+    vmin, vmax = np.min(imgs), np.max(imgs)
+    batches = (imgs[i : i + batch_size] for i in range(0, imgs.shape[0], batch_size))
 
-    plt.show()
+    render_movie(batches, out_path, vmin=vmin, vmax=vmax, fps=fps)
 
 
-def main(img_path: Path = IMG_PATH, out_path: Path = None):
+def main(
+    img_path: Path = IMG_PATH,
+    out_path: Path = None,
+    precision: Precision = Precision.DOUBLE,
+    batch_size: int = 16,
+    workers: int = -1,
+    unwrap_method: UnwrapMethod = UnwrapMethod.QUALITY_GUIDED,
+    store_path: Optional[Path] = None,
+    store_format: str = "npy",
+):
     px_size_um = 5.2
     mag_obj = 20
     mag_4f = 4
-
-    img = io.imread(img_path)
+    wavelength_um = 0.641
+    dn = 0.59
 
     # The first two frames are the same ¯\_(ツ)_/¯
-    img = img[1:, :, :]
-
-    # Crop to 51 frames; use the first as the background
-    img = img[:51, :, :]
+    # Read 51 frames; use the first as the background
+    start, stop = 1, 52
 
     # Crop to num_px x num_px about the image center
     num_px = 256
-    img = img[
-        :,
-        ((img.shape[1] - num_px) // 2) : ((img.shape[1] + num_px) // 2),
-        ((img.shape[2] - num_px) // 2) : ((img.shape[2] + num_px) // 2),
-    ]
-
-    # Convert to single-channel float and normalize range to [0, 1]
-    max_range = np.iinfo(img.dtype).max
-    img = img.astype("float") / max_range
-
-    # Use the first frame as the background
-    bg = img[0, :, :]
-    img = img[1:, :, :]
-
-    # Preallocate arrays for results
-    imgs_r = {
-        "img": np.empty_like(img),
-        "img_fft": np.empty_like(img, dtype=np.complex128),
-        "phase": np.empty_like(img),
-        "phase_unwrapped": np.empty_like(img),
-    }
-
-    # Compute the phase images
-    bg_r = proc_sideband(bg, px_size_um=px_size_um, mag_obj=mag_obj, mag_4f=mag_4f)
-
-    for i, img_i in enumerate(img):
-        result = proc_sideband(
-            img_i, px_size_um=px_size_um, mag_obj=mag_obj, mag_4f=mag_4f
-        )
-        for k, v in result.items():
-            imgs_r[k][i, :, :] = v
-
-    # Phase unwrap the 3D wrappped phase data
-    unwrapped_3d = restoration.unwrap_phase(imgs_r["phase"])
+    crop = center_crop(tiff_shape(img_path)[-2:], num_px)
+
+    # Stream the frames in batches, converting them to float and normalizing their
+    # range to [0, 1] only after cropping
+    batches = iter_tiff_batches(
+        img_path,
+        batch_size=batch_size,
+        crop=crop,
+        start=start,
+        stop=stop,
+        dtype=precision.real_dtype,
+    )
+
+    # Accumulate the per-pixel statistics of the unwrapped phase one batch at a time,
+    # so that memory does not grow with the number of frames
+    stats = RunningStats((num_px, num_px))
+    reference = None
+
+    # Unwrap the frames of each batch in parallel
+    unwrapper = Unwrapper(workers=workers, method=unwrap_method)
+    background = None
+
+    # Only the unwrapped phase is needed, and it is written into the same buffer for
+    # every batch
+    unwrapped_buffer = np.empty((batch_size, num_px, num_px), precision.real_dtype)
+
+    # Optionally write the unwrapped phase and height stacks to chunked stores, one
+    # chunk per frame, so that single frames can be read back without decoding video
+    with ExitStack() as stack:
+        writers = {}
+        if store_path is not None:
+            for name in ("phase", "height"):
+                writers[name] = stack.enter_context(
+                    open_writer(
+                        Path(store_path) / name,
+                        (num_px, num_px),
+                        dtype=precision.real_dtype,
+                        format=store_format,
+                    )
+                )
+        stack.callback(unwrapper.close)
+
+        for batch in batches:
+            if background is None:
+                # Locate the carrier to a fraction of a pixel on the first frame and
+                # reuse it for all the others
+                carrier = locate_carrier(batch[0, :, :])
+
+                # Use the first frame as the background. Its filtered field is
+                # computed once and the phase of every other frame is taken relative
+                # to it.
+                background = BackgroundReference(
+                    batch[0, :, :],
+                    px_size_um=px_size_um,
+                    mag_obj=mag_obj,
+                    mag_4f=mag_4f,
+                    precision=precision,
+                    carrier=carrier,
+                )
+                batch = batch[1:, :, :]
+                if batch.shape[0] == 0:
+                    continue
+
+            # Compute the phase images relative to the background, each unwrapped in
+            # 2D
+            batch_r = proc_sideband_stack(
+                batch,
+                px_size_um=px_size_um,
+                mag_obj=mag_obj,
+                mag_4f=mag_4f,
+                precision=precision,
+                unwrapper=unwrapper,
+                background=background,
+                carrier=carrier,
+                outputs=["phase_unwrapped"],
+                out={"phase_unwrapped": unwrapped_buffer[: batch.shape[0]]},
+            )
+            unwrapped = batch_r["phase_unwrapped"]
+
+            # Frames that are unwrapped independently may differ by multiples of
+            # 2 pi. Remove the difference from the first frame to make them
+            # temporally consistent.
+            if reference is None:
+                reference = unwrapped[0].copy()
+            offsets = np.round((unwrapped - reference).mean(axis=(1, 2)) / (2 * np.pi))
+            unwrapped -= 2 * np.pi * offsets[:, np.newaxis, np.newaxis]
+
+            stats.update(unwrapped)
+
+            if writers:
+                writers["phase"].append(unwrapped)
+                writers["height"].append(
+                    compute_height_map(unwrapped, wavelength_um=wavelength_um, dn=dn)
+                )
 
     # Compute the std dev of the unwrapped phase
-    std_dev = np.std(unwrapped_3d, axis=0)
+    std_dev = stats.std()
 
     # Plot the std dev. Exclude the boundaries due to artifacts
     noise_map = std_dev[10:-10, 10:-10]
@@ -104,6 +171,3 @@ def main(img_path: Path = IMG_PATH, out_path: Path = None):
     plt.title("Temporal phase noise map over 1 second")
     plt.colorbar(label=r"$\sigma_{\phi}$, rad")
     plt.show()
-
-    # Save results
-    # animate(unwrapped_3d, out_path=Path("unwrapped_3d.mp4"))
@@ -0,0 +1,354 @@
+"""Phase unwrapping of frames and stacks of frames, optionally in parallel."""
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from enum import Enum
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import scipy.fft
+from skimage import restoration
+
+from .fft_backends import resolve_workers
+
+
+Tile = Tuple[slice, slice]
+AXES = (-2, -1)
+
+
+class UnwrapMethod(Enum):
+    """Phase unwrapping algorithms."""
+
+    QUALITY_GUIDED = "quality_guided"
+    LEAST_SQUARES = "least_squares"
+
+
+def unwrap(
+    phase: np.ndarray, method: UnwrapMethod = UnwrapMethod.QUALITY_GUIDED
+) -> np.ndarray:
+    """Unwrap a phase image, keeping the precision of the input.
+
+    The quality-guided algorithm of scikit-image follows paths through the most
+    reliable pixels first. The least-squares algorithm is faster, and its run time does
+    not depend on the image content, but it spreads the errors due to residues over
+    the whole image.
+
+    """
+    if method == UnwrapMethod.LEAST_SQUARES:
+        return unwrap_least_squares(phase)
+
+    return restoration.unwrap_phase(phase).astype(phase.dtype, copy=False)
+
+
+def wrap(phase: np.ndarray) -> np.ndarray:
+    """Wrap phases into the interval [-pi, pi)."""
+    return (phase + np.pi) % (2 * np.pi) - np.pi
+
+
+def divergence(gx: np.ndarray, gy: np.ndarray) -> np.ndarray:
+    """Return the divergence of a field of forward differences along the last two axes.
+
+    gx and gy are the differences along the columns and rows, with one column or row
+    fewer than the frames. Differences across the frame boundary are taken to be zero.
+
+    """
+    shape = gy.shape[:-2] + (gy.shape[-2] + 1, gy.shape[-1])
+    div = np.zeros(shape, dtype=np.result_type(gx, gy))
+    div[..., :, :-1] += gx
+    div[..., :, 1:] -= gx
+    div[..., :-1, :] += gy
+    div[..., 1:, :] -= gy
+
+    return div
+
+
+@lru_cache(maxsize=8)
+def laplacian_eigenvalues(shape: Tuple[int, int], dtype: np.dtype) -> np.ndarray:
+    """Return the eigenvalues of the discrete Neumann Laplacian in the DCT basis.
+
+    The eigenvalue of the constant term is replaced by 1 to allow division by the
+    array. Arrays are cached, so the returned array must not be modified.
+
+    """
+    rows = np.arange(shape[0])[:, np.newaxis]
+    cols = np.arange(shape[1])[np.newaxis, :]
+    eigenvalues = (
+        2 * np.cos(np.pi * rows / shape[0]) + 2 * np.cos(np.pi * cols / shape[1]) - 4
+    ).astype(dtype)
+    eigenvalues[0, 0] = 1
+    eigenvalues.flags.writeable = False
+
+    return eigenvalues
+
+
+def solve_poisson(rho: np.ndarray, workers: int = -1) -> np.ndarray:
+    """Solve the Poisson equation with Neumann boundaries over the last two axes.
+
+    The solution with zero mean is computed with a DCT, which diagonalizes the
+    discrete Laplacian.
+
+    """
+    rho_dct = scipy.fft.dctn(rho, axes=AXES, norm="ortho", workers=workers)
+    rho_dct /= laplacian_eigenvalues(rho.shape[-2:], rho_dct.dtype)
+    rho_dct[..., 0, 0] = 0
+
+    return scipy.fft.idctn(rho_dct, axes=AXES, norm="ortho", workers=workers)
+
+
+def unwrap_least_squares(
+    phases: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    max_iter: int = 10,
+    tol: float = 1e-6,
+    workers: int = -1,
+) -> np.ndarray:
+    """Unwrap phase images by least squares in the manner of Ghiglia and Romero.
+
+    Without weights, the unwrapped phase whose gradient best matches the wrapped
+    differences of neighboring pixels is found directly with one forward and one
+    inverse DCT. With weights, the weighted problem is solved by conjugate gradients,
+    preconditioned by the unweighted solution, for at most max_iter iterations so that
+    the run time is bounded.
+
+    The frames of a stack are unwrapped together, and the result is offset by a
+    constant per frame so that it matches the wrapped phase as closely as possible.
+
+    Parameters
+    ----------
+    phases : np.ndarray
+        Wrapped phase image of shape (H, W) or stack of images of shape (T, H, W).
+    weights : Optional[np.ndarray]
+        Non-negative weight of each pixel, e.g. a quality map, with the same shape as
+        phases. Pixels with zero weight are ignored.
+    max_iter : int
+        Maximum number of conjugate gradient iterations of the weighted solver.
+    tol : float
+        Relative residual at which the weighted solver stops early.
+    workers : int
+        Number of threads of the DCTs.
+
+    """
+    gx = wrap(np.diff(phases, axis=-1))
+    gy = wrap(np.diff(phases, axis=-2))
+
+    if weights is None:
+        unwrapped = solve_poisson(divergence(gx, gy), workers=workers)
+    else:
+        weights = np.asarray(weights, dtype=phases.dtype) ** 2
+        wx = np.minimum(weights[..., :, 1:], weights[..., :, :-1])
+        wy = np.minimum(weights[..., 1:, :], weights[..., :-1, :])
+
+        def apply(phi: np.ndarray) -> np.ndarray:
+            return -divergence(wx * np.diff(phi, axis=-1), wy * np.diff(phi, axis=-2))
+
+        unwrapped = _conjugate_gradients(
+            apply,
+            -divergence(wx * gx, wy * gy),
+            lambda r: -solve_poisson(r, workers=workers),
+            max_iter=max_iter,
+            tol=tol,
+        )
+
+    # Choose the constant that makes the result congruent with the wrapped phase
+    offset = np.angle(np.exp(1j * (phases - unwrapped)).mean(axis=AXES))
+    unwrapped += offset[..., np.newaxis, np.newaxis]
+
+    return unwrapped.astype(phases.dtype, copy=False)
+
+
+def _conjugate_gradients(
+    apply: Callable[[np.ndarray], np.ndarray],
+    b: np.ndarray,
+    precondition: Callable[[np.ndarray], np.ndarray],
+    max_iter: int,
+    tol: float,
+) -> np.ndarray:
+    """Solve apply(x) = b frame by frame with preconditioned conjugate gradients."""
+
+    def dot(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        return np.sum(u * v, axis=AXES, keepdims=True)
+
+    def divide(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        return np.divide(u, v, out=np.zeros_like(u), where=v != 0)
+
+    x = np.zeros_like(b)
+    r = b.copy()
+    z = precondition(r)
+    p = z.copy()
+    rz = dot(r, z)
+    b_norm = np.sqrt(dot(b, b))
+
+    for _ in range(max_iter):
+        ap = apply(p)
+        alpha = divide(rz, dot(p, ap))
+        x += alpha * p
+        r -= alpha * ap
+
+        if np.all(np.sqrt(dot(r, r)) <= tol * b_norm):
+            break
+
+        z = precondition(r)
+        rz_new = dot(r, z)
+        p = z + divide(rz_new, rz) * p
+        rz = rz_new
+
+    return x
+
+
+def tile_starts(length: int, tile_size: int, overlap: int) -> List[int]:
+    """Return the start indices of overlapping tiles that cover an axis of a length."""
+    if tile_size >= length:
+        return [0]
+
+    starts = list(range(0, length - tile_size + 1, tile_size - overlap))
+    if starts[-1] + tile_size < length:
+        starts.append(length - tile_size)
+
+    return starts
+
+
+def tiles(shape: Tuple[int, int], tile_size: int, overlap: int) -> List[Tile]:
+    """Return the row and column slices of overlapping tiles in raster order."""
+    return [
+        (slice(row, row + tile_size), slice(col, col + tile_size))
+        for row in tile_starts(shape[0], tile_size, overlap)
+        for col in tile_starts(shape[1], tile_size, overlap)
+    ]
+
+
+def stitch(
+    shape: Tuple[int, int], tiles: List[Tile], unwrapped: Iterable[np.ndarray]
+) -> np.ndarray:
+    """Stitch unwrapped, overlapping tiles into one frame.
+
+    The tiles are placed in order. Each tile is first shifted by the multiple of 2 pi
+    that best matches it to the pixels already placed where they overlap, and then
+    fills only the pixels that are not placed yet.
+
+    """
+    out: Optional[np.ndarray] = None
+    placed = np.zeros(shape, dtype=bool)
+    for tile, phase in zip(tiles, unwrapped):
+        if out is None:
+            out = np.empty(shape, dtype=phase.dtype)
+
+        overlap = placed[tile]
+        if overlap.any():
+            diff = np.median(phase[overlap] - out[tile][overlap])
+            phase = phase - 2 * np.pi * np.round(diff / (2 * np.pi))
+
+        out[tile] = np.where(overlap, out[tile], phase)
+        placed[tile] = True
+
+    return out
+
+
+class Unwrapper:
+    """Unwraps phase images, distributing frames and tiles over a process pool.
+
+    Frames are independent of one another, so the frames of a stack are unwrapped in
+    parallel. Frames that are larger than tile_size are also split into overlapping
+    tiles that are unwrapped in parallel and stitched back together by removing the
+    2 pi offsets between them.
+
+    The least-squares method instead unwraps the whole stack at once in the calling
+    process, using the workers as threads for its DCTs. It is not tiled.
+
+    The process pool is started on first use. Close the unwrapper, or use it as a
+    context manager, to shut it down.
+
+    Parameters
+    ----------
+    workers : int
+        Number of processes to use, as for resolve_workers. 1 unwraps in the calling
+        process.
+    tile_size : Optional[int]
+        Side length of the tiles in pixels. Frames are not tiled if it is None.
+    overlap : int
+        Number of pixels by which neighboring tiles overlap.
+    method : UnwrapMethod
+        Unwrapping algorithm.
+
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        tile_size: Optional[int] = None,
+        overlap: int = 32,
+        method: UnwrapMethod = UnwrapMethod.QUALITY_GUIDED,
+    ) -> None:
+        if tile_size is not None and tile_size <= overlap:
+            raise ValueError("The tile size must be larger than the overlap")
+
+        self.workers = resolve_workers(workers)
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.method = method
+        self._executor: Optional[Executor] = None
+
+    def __enter__(self) -> "Unwrapper":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the process pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _map(
+        self, func: Callable[[np.ndarray], np.ndarray], args: List[np.ndarray]
+    ) -> Iterator[np.ndarray]:
+        if self.workers == 1 or len(args) == 1:
+            return map(func, args)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        chunksize = max(1, len(args) // (4 * self.workers))
+        return self._executor.map(func, args, chunksize=chunksize)
+
+    def __call__(
+        self, phases: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Unwrap a phase image of shape (H, W) or a stack of shape (T, H, W).
+
+        The unwrapped phases are written into out if it is given.
+
+        """
+        if self.method == UnwrapMethod.LEAST_SQUARES:
+            unwrapped = unwrap_least_squares(phases, workers=self.workers)
+            if out is None:
+                return unwrapped
+
+            np.copyto(out, unwrapped)
+            return out
+
+        if phases.ndim == 2:
+            return self(
+                phases[np.newaxis], out=None if out is None else out[np.newaxis]
+            )[0]
+
+        out = np.empty_like(phases) if out is None else out
+        shape = phases.shape[-2:]
+        frame_tiles = (
+            [(slice(None), slice(None))]
+            if self.tile_size is None
+            else tiles(shape, self.tile_size, self.overlap)
+        )
+
+        unwrapped = self._map(
+            unwrap, [phase[tile] for phase in phases for tile in frame_tiles]
+        )
+        for i in range(phases.shape[0]):
+            if len(frame_tiles) == 1:
+                out[i] = next(unwrapped)
+            else:
+                out[i] = stitch(
+                    shape, frame_tiles, (next(unwrapped) for _ in frame_tiles)
+                )
+
+        return out
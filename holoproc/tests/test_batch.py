@@ -0,0 +1,107 @@
+import json
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from holoproc import proc_sideband_stack
+from holoproc.batch import BatchParams, WorkQueue, prepare_run, run, run_worker
+from holoproc.fft_backends import ScipyBackend
+from holoproc.store import NpyChunkReader, NpyChunkWriter
+from holoproc.synthetic import gaussian_bump, synthetic_stack
+
+PARAMS = BatchParams(num_px=None)
+
+
+def write_archive(input_dir, num_files=2, num_frames=3, num_px=64):
+    stacks = {}
+    for i in range(num_files):
+        holograms = synthetic_stack(gaussian_bump(num_px), num_frames, seed=i)
+        stack = np.round(holograms * 65535).astype(np.uint16)
+        name = f"day{i}/acq"
+        (input_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        tifffile.imwrite(input_dir / f"{name}.tif", stack, photometric="minisblack")
+        stacks[name.replace("/", "__")] = stack / 65535
+
+    return stacks
+
+
+def expected_phase(stack):
+    return proc_sideband_stack(stack, outputs=["phase_unwrapped"])["phase_unwrapped"]
+
+
+def test_run_worker_processes_each_file_once(tmp_path):
+    stacks = write_archive(tmp_path / "archive")
+
+    assert run_worker(tmp_path / "archive", tmp_path / "out", PARAMS, batch_size=2) == 2
+    assert run_worker(tmp_path / "archive", tmp_path / "out", PARAMS, batch_size=2) == 0
+
+    run_dir = tmp_path / "out" / PARAMS.id
+    assert (run_dir / "params.json").exists()
+    for task, stack in stacks.items():
+        assert (run_dir / "done" / f"{task}.json").exists()
+        assert not (run_dir / "claims" / task).exists()
+        np.testing.assert_allclose(
+            NpyChunkReader(run_dir / "phase" / task)[:], expected_phase(stack)
+        )
+
+
+def test_run_worker_resumes_task_of_dead_worker(tmp_path):
+    stacks = write_archive(tmp_path / "archive", num_files=1)
+    task, stack = next(iter(stacks.items()))
+    run_dir = prepare_run(tmp_path / "out", PARAMS)
+
+    # A worker that died after checkpointing its first batch
+    queue = WorkQueue(run_dir)
+    (run_dir / "claims" / task).write_text("other-host:1")
+    with NpyChunkWriter(run_dir / "partial" / task, (64, 64), np.float64) as writer:
+        writer.append(expected_phase(stack[:2]))
+
+    # Its claim is respected until its lease expires
+    assert run_worker(tmp_path / "archive", tmp_path / "out", PARAMS, batch_size=2) == 0
+    assert not queue.is_done(task)
+
+    os.utime(run_dir / "claims" / task, (0, 0))
+    assert run_worker(tmp_path / "archive", tmp_path / "out", PARAMS, batch_size=2) == 1
+    assert queue.is_done(task)
+    np.testing.assert_allclose(
+        NpyChunkReader(run_dir / "phase" / task)[:], expected_phase(stack)
+    )
+
+
+def test_batch_params_round_trip_through_json():
+    params = BatchParams(na=0.3, carrier=(1.5, -40.25), num_px=None)
+
+    assert BatchParams.from_dict(json.loads(json.dumps(params.to_dict()))) == params
+    assert BatchParams(na=0.3).id != BatchParams().id
+
+
+def test_batch_size_does_not_start_a_new_run(tmp_path):
+    write_archive(tmp_path / "archive")
+
+    assert run_worker(tmp_path / "archive", tmp_path / "out", PARAMS, batch_size=2) == 2
+    assert run_worker(tmp_path / "archive", tmp_path / "out", PARAMS, batch_size=3) == 0
+
+
+def test_run_passes_backend_to_worker_processes(tmp_path):
+    write_archive(tmp_path / "archive", num_files=3)
+
+    num_processed = run(
+        tmp_path / "archive",
+        tmp_path / "out",
+        PARAMS,
+        processes=2,
+        backend=ScipyBackend(workers=1),
+    )
+
+    assert num_processed == 3
+
+
+def test_batch_params_id_ignores_int_or_float():
+    assert BatchParams(mag_obj=20).id == BatchParams(mag_obj=20.0).id
+
+
+def test_run_rejects_zero_processes(tmp_path):
+    with pytest.raises(ValueError):
+        run(tmp_path / "archive", tmp_path / "out", PARAMS, processes=0)
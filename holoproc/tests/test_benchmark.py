@@ -0,0 +1,35 @@
+import numpy as np
+
+from holoproc.benchmark import benchmark, format_results
+from holoproc.synthetic import sideband_hologram, spherical_bead
+
+
+def test_benchmark_reports_speed_and_accuracy():
+    results = benchmark(sizes=[256], num_frames=2, repeats=1)
+
+    names = [r.name for r in results]
+    assert names == [
+        "proc_sideband",
+        "proc_sideband_stack",
+        "proc_sideband_stack (bead)",
+        "mask_fft",
+        "unwrap (quality_guided)",
+        "unwrap (least_squares)",
+    ]
+    assert all(r.frames_per_s > 0 for r in results)
+
+    rmse = {r.name: r.phase_rmse for r in results}
+    assert rmse["proc_sideband"] < 0.05
+    assert rmse["proc_sideband_stack"] < 0.05
+    assert rmse["proc_sideband_stack (bead)"] < 0.2
+    assert rmse["unwrap (quality_guided)"] < 1e-6
+    assert rmse["unwrap (least_squares)"] < 1e-6
+    assert rmse["mask_fft"] is None
+    assert "proc_sideband_stack" in format_results(results)
+
+
+def test_sideband_hologram_is_quantized():
+    img = sideband_hologram(spherical_bead(64), bit_depth=8)
+
+    assert img.min() >= 0 and img.max() <= 1
+    np.testing.assert_allclose(img * 255, np.round(img * 255), atol=1e-9)
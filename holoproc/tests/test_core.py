@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+
+from holoproc.core import (
+    OUTPUTS,
+    BackgroundReference,
+    Precision,
+    _filter_sideband,
+    compute_shift_px,
+    demodulate_cropped,
+    get_sideband_plan,
+    locate_carrier,
+    proc_sideband,
+    proc_sideband_stack,
+)
+from holoproc.fft_backends import NumpyBackend
+
+
+NUM_PX = 256
+NUM_FRAMES = 4
+
+
+@pytest.fixture
+def holograms():
+    """A stack of 16-bit off-axis holograms of a Gaussian phase bump, in [0, 1]."""
+    rng = np.random.default_rng(0)
+    shift_px = compute_shift_px(
+        num_px=NUM_PX, px_size_um=5.2, mag_obj=20, mag_4f=4, grating_period=3.3333
+    )
+
+    y, x = np.mgrid[0:NUM_PX, 0:NUM_PX]
+    phase = 2 * np.exp(-((x - NUM_PX / 2) ** 2 + (y - NUM_PX / 2) ** 2) / 512)
+
+    frames = []
+    for i in range(NUM_FRAMES):
+        img = 0.5 + 0.4 * np.cos(-2 * np.pi * shift_px * x / NUM_PX + phase + 0.1 * i)
+        img += 0.005 * rng.standard_normal(img.shape)
+        frames.append(np.clip(img, 0, 1))
+
+    max_range = np.iinfo(np.uint16).max
+    return np.round(np.array(frames) * max_range).astype(np.uint16) / max_range
+
+
+def wrap(phase):
+    return np.angle(np.exp(1j * phase))
+
+
+def test_proc_sideband_stack_matches_single_frames(holograms):
+    results = proc_sideband_stack(holograms)
+
+    for i, img in enumerate(holograms):
+        result = proc_sideband(img)
+        for key, value in result.items():
+            np.testing.assert_allclose(results[key][i], value, atol=1e-9)
+
+
+def test_proc_sideband_real_and_complex_input_agree(holograms):
+    real = proc_sideband(holograms[0])
+    cplx = proc_sideband(holograms[0].astype(np.complex128))
+
+    np.testing.assert_allclose(real["phase"], cplx["phase"], atol=1e-9)
+
+
+def test_proc_sideband_stack_single_precision_dtypes(holograms):
+    results = proc_sideband_stack(
+        holograms, precision=Precision.SINGLE, outputs=OUTPUTS
+    )
+
+    assert results["img"].dtype == np.float32
+    assert results["img_fft"].dtype == np.complex64
+    assert results["phase"].dtype == np.float32
+    assert results["phase_unwrapped"].dtype == np.float32
+
+
+def test_proc_sideband_stack_single_precision_phase_error(holograms):
+    double = proc_sideband_stack(holograms, precision=Precision.DOUBLE)
+    single = proc_sideband_stack(holograms, precision=Precision.SINGLE)
+
+    error = wrap(single["phase"].astype(np.float64) - double["phase"])
+    unwrapped_error = single["phase_unwrapped"].astype(np.float64)
+    unwrapped_error -= double["phase_unwrapped"]
+
+    assert np.sqrt(np.mean(error**2)) < 1e-5
+    assert np.max(np.abs(error)) < 1e-4
+    assert np.max(np.abs(unwrapped_error)) < 1e-4
+
+
+def test_proc_sideband_stack_relative_to_background(holograms):
+    background = BackgroundReference(holograms[0])
+    results = proc_sideband_stack(holograms[1:], background=background)
+
+    bg_phase = proc_sideband(holograms[0])["phase"]
+    for i, img in enumerate(holograms[1:]):
+        expected = wrap(proc_sideband(img)["phase"] - bg_phase)
+        np.testing.assert_allclose(wrap(results["phase"][i] - expected), 0, atol=1e-9)
+
+    # The frames differ from the background by a constant phase step of 0.1 rad
+    steps = np.median(results["phase_unwrapped"], axis=(1, 2))
+    np.testing.assert_allclose(steps, [0.1, 0.2, 0.3], atol=0.01)
+
+
+def test_locate_carrier_removes_sub_pixel_tilt():
+    y, x = np.mgrid[0:NUM_PX, 0:NUM_PX]
+    carrier = (2.3, -80.6)
+    img = 0.5 + 0.4 * np.cos(2 * np.pi * (carrier[0] * y + carrier[1] * x) / NUM_PX)
+
+    located = locate_carrier(img)
+    np.testing.assert_allclose(located, carrier, atol=0.05)
+
+    # The phase of the uniform object is flat away from the edges
+    phase = proc_sideband(img, carrier=located)["phase_unwrapped"]
+    assert np.ptp(phase[32:-32, 32:-32]) < 0.5
+
+
+def test_proc_sideband_stack_writes_requested_outputs_into_buffers(holograms):
+    expected = proc_sideband_stack(holograms)
+    out = {"phase_unwrapped": np.empty(holograms.shape)}
+
+    results = proc_sideband_stack(holograms, outputs=["phase"], out=out)
+
+    assert set(results) == {"phase", "phase_unwrapped"}
+    assert results["phase_unwrapped"] is out["phase_unwrapped"]
+    np.testing.assert_array_equal(out["phase_unwrapped"], expected["phase_unwrapped"])
+    np.testing.assert_array_equal(results["phase"], expected["phase"])
+
+
+def resample(imgs_fft, num_px):
+    """Evaluate the inverse FFT of band-limited FFTs on a coarser num_px grid.
+
+    Pixel m of the coarse grid lies at pixel m * N / num_px of the N x N grid, so the
+    inverse DFT is summed at those positions.
+
+    """
+    n = imgs_fft.shape[-1]
+    k = np.fft.fftfreq(n) * n
+    m = np.arange(num_px)
+    dft = np.exp(2j * np.pi * np.outer(m, k) / num_px)
+
+    return dft @ imgs_fft @ dft.T / n**2
+
+
+@pytest.mark.parametrize("carrier", [None, (0.3, -99.4)], ids=["integer", "sub-pixel"])
+def test_demodulate_cropped_matches_resampled_full_field(holograms, carrier):
+    plan = get_sideband_plan(
+        holograms.shape[-2:],
+        px_size_um=5.2,
+        wavelength_um=0.641,
+        mag_obj=20,
+        mag_4f=4,
+        na=0.4,
+        grating_period=3.3333,
+        carrier=carrier,
+    )
+
+    cropped = demodulate_cropped(holograms, carrier=carrier)
+
+    # The filtered FFT that proc_sideband_stack inverse transforms, resampled to the
+    # coarse grid, with the sub-pixel tilt removed at the coarse positions
+    imgs_fft, _ = _filter_sideband(holograms, plan, NumpyBackend())
+    expected = resample(imgs_fft, plan.crop_px)
+    m = np.arange(plan.crop_px) / plan.crop_px
+    expected *= np.exp(-2j * np.pi * plan.residual[0] * m)[:, np.newaxis]
+    expected *= np.exp(-2j * np.pi * plan.residual[1] * m)[np.newaxis, :]
+
+    assert cropped["field"].shape == (NUM_FRAMES, plan.crop_px, plan.crop_px)
+    np.testing.assert_allclose(cropped["field"], expected, atol=1e-9)
+
+
+def test_demodulate_cropped_pixel_size(holograms):
+    plan = get_sideband_plan(
+        holograms.shape[-2:],
+        px_size_um=5.2,
+        wavelength_um=0.641,
+        mag_obj=20,
+        mag_4f=4,
+        na=0.4,
+        grating_period=3.3333,
+    )
+
+    cropped = demodulate_cropped(holograms)
+
+    # The crop covers the same field of view as the frame in fewer pixels
+    expected = 5.2 / (20 * 4) * NUM_PX / plan.crop_px
+    assert plan.crop_px < NUM_PX
+    assert cropped["px_size_um"] == plan.crop_px_size_um
+    assert cropped["px_size_um"] == pytest.approx(expected)
+
+
+def test_demodulate_cropped_real_and_complex_input_agree(holograms):
+    real = demodulate_cropped(holograms)
+    cplx = demodulate_cropped(holograms.astype(np.complex128))
+
+    np.testing.assert_allclose(real["field"], cplx["field"], atol=1e-9)
+
+    plan = get_sideband_plan(
+        holograms.shape[-2:],
+        px_size_um=5.2,
+        wavelength_um=0.641,
+        mag_obj=20,
+        mag_4f=4,
+        na=0.4,
+        grating_period=3.3333,
+    )
+    np.testing.assert_allclose(
+        plan.apply_cropped(np.fft.rfft2(holograms), real=True),
+        plan.apply_cropped(np.fft.fft2(holograms)),
+        atol=1e-9,
+    )
@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+
+import numpy as np
+import pytest
+
+from holoproc import fft_backends
+from holoproc.fft_backends import (
+    FFTBackend,
+    NumpyBackend,
+    ScipyBackend,
+    get_backend,
+    pyfftw,
+    resolve_workers,
+    set_backend,
+)
+
+
+def backends():
+    yield ScipyBackend(workers=2)
+    if pyfftw is not None:
+        from holoproc.fft_backends import PyFFTWBackend
+
+        yield PyFFTWBackend(workers=2, planner_effort="FFTW_ESTIMATE")
+
+
+BACKENDS = list(backends())
+
+
+def test_fft_backend_is_abstract():
+    with pytest.raises(TypeError):
+        FFTBackend()
+
+
+def test_default_backend_is_numpy(monkeypatch):
+    monkeypatch.setattr(fft_backends, "_backend", None)
+
+    assert isinstance(get_backend(), NumpyBackend)
+
+
+def test_set_backend_replaces_default():
+    previous = get_backend()
+    backend = NumpyBackend()
+    try:
+        set_backend(backend)
+        assert get_backend() is backend
+    finally:
+        set_backend(previous)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, ids=lambda b: b.name)
+@pytest.mark.parametrize("kind", ["fft2", "ifft2", "rfft2"])
+def test_backend_matches_numpy(backend, kind):
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal((3, 32, 48))
+    if kind != "rfft2":
+        a = a + 1j * rng.standard_normal(a.shape)
+
+    expected = getattr(NumpyBackend(), kind)(a)
+
+    np.testing.assert_allclose(getattr(backend, kind)(a), expected, atol=1e-10)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, ids=lambda b: b.name)
+def test_backend_transforms_single_precision_in_single_precision(backend):
+    rng = np.random.default_rng(1)
+    a = rng.standard_normal((32, 32)).astype(np.float32)
+
+    a_fft = backend.fft2(a.astype(np.complex64))
+
+    assert a_fft.dtype == np.complex64
+    assert backend.rfft2(a).dtype == np.complex64
+    np.testing.assert_allclose(a_fft, np.fft.fft2(a.astype(np.float64)), atol=1e-3)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, ids=lambda b: b.name)
+def test_backend_is_safe_to_call_from_threads(backend):
+    rng = np.random.default_rng(2)
+    arrays = [rng.standard_normal((128, 128)) + 1j * i for i in range(8)]
+    backend.fft2(arrays[0])
+
+    def transform_repeatedly(a):
+        expected = np.fft.fft2(a)
+        return all(np.allclose(backend.fft2(a), expected) for _ in range(50))
+
+    with ThreadPoolExecutor(max_workers=len(arrays)) as executor:
+        assert all(executor.map(transform_repeatedly, arrays))
+
+
+def test_pyfftw_wisdom_round_trip(tmp_path):
+    pytest.importorskip("pyfftw")
+    from holoproc.fft_backends import PyFFTWBackend
+
+    wisdom_path = tmp_path / "wisdom.npz"
+    backend = PyFFTWBackend(planner_effort="FFTW_ESTIMATE", wisdom_path=wisdom_path)
+    backend.fft2(np.zeros((16, 16), dtype=np.complex128))
+    backend.save_wisdom()
+
+    # The wisdom is stored as plain bytes, which load without unpickling
+    with np.load(wisdom_path, allow_pickle=False) as data:
+        assert data["double"].tobytes() == pyfftw.export_wisdom()[0]
+    PyFFTWBackend(wisdom_path=wisdom_path)
+
+
+def test_pyfftw_backend_can_be_pickled():
+    pytest.importorskip("pyfftw")
+    from holoproc.fft_backends import PyFFTWBackend
+
+    backend = PyFFTWBackend(workers=1, planner_effort="FFTW_ESTIMATE")
+    a = np.arange(64.0).reshape(8, 8)
+    backend.fft2(a)
+
+    copy = pickle.loads(pickle.dumps(backend))
+
+    np.testing.assert_allclose(copy.fft2(a), np.fft.fft2(a), atol=1e-9)
+
+
+def test_resolve_workers_counts_back_from_cpus(monkeypatch):
+    monkeypatch.setattr(fft_backends.os, "cpu_count", lambda: 4)
+
+    assert resolve_workers(3) == 3
+    assert resolve_workers(-1) == 4
+    assert resolve_workers(-2) == 3
+    assert resolve_workers(-10) == 1
+    with pytest.raises(ValueError):
+        resolve_workers(0)
+    with pytest.raises(ValueError):
+        ScipyBackend(workers=0)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import tifffile
+
+from holoproc.ingest import center_crop, iter_tiff_batches, tiff_shape
+
+
+@pytest.fixture(params=[None, "zlib"], ids=["memmap", "compressed"])
+def tiff_path(request, tmp_path):
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 65536, size=(7, 20, 24), dtype=np.uint16)
+    path = tmp_path / "frames.tif"
+    tifffile.imwrite(path, frames, photometric="minisblack", compression=request.param)
+
+    return path, frames
+
+
+def test_center_crop():
+    rows, cols = center_crop((20, 24), 8)
+
+    assert (rows, cols) == (slice(6, 14), slice(8, 16))
+
+
+def test_tiff_shape(tiff_path):
+    path, frames = tiff_path
+
+    assert tiff_shape(path) == frames.shape
+
+
+def test_iter_tiff_batches_normalizes_and_crops(tiff_path):
+    path, frames = tiff_path
+    crop = center_crop(frames.shape[1:], 8)
+
+    batches = list(
+        iter_tiff_batches(
+            path, batch_size=2, crop=crop, start=1, stop=6, dtype=np.float32
+        )
+    )
+
+    assert [b.shape for b in batches] == [(2, 8, 8), (2, 8, 8), (1, 8, 8)]
+    assert all(b.dtype == np.float32 for b in batches)
+    expected = frames[1:6][(slice(None), *crop)] / 65535
+    np.testing.assert_allclose(np.concatenate(batches), expected, rtol=1e-6)
+
+
+def test_iter_tiff_batches_reads_float_frames_unscaled(tmp_path):
+    frames = np.linspace(0, 1, 3 * 4 * 4).reshape(3, 4, 4)
+    tifffile.imwrite(tmp_path / "frames.tif", frames, photometric="minisblack")
+
+    batches = list(iter_tiff_batches(tmp_path / "frames.tif", batch_size=16))
+
+    assert len(batches) == 1
+    np.testing.assert_allclose(batches[0], frames)
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from holoproc.core import compute_height_map, proc_sideband
+from holoproc.pipeline import Pipeline, Stage, format_metrics, sideband_stages
+from holoproc.synthetic import synthetic_frames
+
+
+def test_pipeline_preserves_order_and_records_metrics():
+    def slow_square(x):
+        time.sleep(0.001 * (x % 3))
+        return x**2
+
+    outputs = []
+    stages = [Stage("square", slow_square, workers=3), Stage("negate", lambda x: -x)]
+    metrics = Pipeline(stages).run(range(20), sink=outputs.append)
+
+    assert outputs == [-(x**2) for x in range(20)]
+    assert [m.count for m in metrics.values()] == [20, 20, 20, 20]
+    assert "square" in format_metrics(metrics)
+
+
+def test_pipeline_raises_stage_errors():
+    def fail_on_five(x):
+        if x == 5:
+            raise RuntimeError("bad frame")
+        return x
+
+    stages = [Stage("check", fail_on_five, workers=2, queue_size=2)]
+    with pytest.raises(RuntimeError, match="bad frame"):
+        Pipeline(stages).run(range(100))
+
+
+def test_sideband_stages_match_serial_processing():
+    bg, *frames = list(synthetic_frames(6, num_px=128))
+
+    heights = []
+    Pipeline(sideband_stages(bg)).run(frames, sink=heights.append)
+
+    bg_phase = proc_sideband(bg)["phase_unwrapped"]
+    for frame, height in zip(frames, heights):
+        expected = compute_height_map(
+            proc_sideband(frame)["phase_unwrapped"] - bg_phase,
+            wavelength_um=0.641,
+            dn=0.59,
+        )
+        np.testing.assert_allclose(height, expected, atol=1e-6)
+
+
+def test_pipeline_bounds_items_waiting_for_a_slow_item():
+    in_flight = [0, 0]
+    lock = threading.Lock()
+
+    def source():
+        for x in range(40):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            yield x
+
+    def sink(x):
+        with lock:
+            in_flight[0] -= 1
+
+    # The first item is so slow that every later item finishes before it
+    def slow_first(x):
+        time.sleep(0.2 if x == 0 else 0.0)
+        return x
+
+    stages = [Stage("slow", slow_first, workers=4, queue_size=2)]
+    Pipeline(stages, max_in_flight=6).run(source(), sink=sink)
+
+    assert in_flight == [0, 6]
+
+
+def test_pipeline_raises_sink_errors():
+    def sink(x):
+        if x == 3:
+            raise RuntimeError("disk full")
+
+    stages = [Stage("identity", lambda x: x, workers=2)]
+    with pytest.raises(RuntimeError, match="disk full"):
+        Pipeline(stages, max_in_flight=2).run(range(100), sink=sink)
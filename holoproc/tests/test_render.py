@@ -0,0 +1,28 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from holoproc.render import colormap_lut, render_movie, to_rgb
+
+
+def test_to_rgb_maps_limits_to_end_colors():
+    lut = colormap_lut("gray")
+    frames = np.array([[[-1.0, 0.0, 0.5, 1.0, 2.0, np.nan]]])
+
+    rgb = to_rgb(frames, vmin=0.0, vmax=1.0, lut=lut)
+
+    assert rgb.shape == (1, 1, 6, 3)
+    assert rgb.dtype == np.uint8
+    np.testing.assert_array_equal(rgb[0, 0, :, 0], [0, 0, 128, 255, 255, 0])
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="FFmpeg is not installed")
+def test_render_movie_writes_video(tmp_path):
+    frames = np.random.default_rng(0).random((12, 33, 40))
+    batches = (frames[i : i + 5] for i in range(0, 12, 5))
+
+    num_frames = render_movie(batches, tmp_path / "movie.mp4", vmin=0, vmax=1)
+
+    assert num_frames == 12
+    assert (tmp_path / "movie.mp4").stat().st_size > 0
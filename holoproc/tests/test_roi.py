@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from holoproc.roi import detect_objects, extract_rois, proc_rois, roi_origins
+from holoproc.synthetic import gaussian_bump, sideband_hologram
+
+NUM_PX = 512
+CENTERS = np.array([[100, 120], [300, 400], [420, 90]])
+
+
+def bumps(num_px=NUM_PX, centers=CENTERS, height=3.0, sigma_px=8.0):
+    y, x = np.mgrid[0:num_px, 0:num_px]
+    phase = np.zeros((num_px, num_px))
+    for row, col in centers:
+        phase += height * np.exp(-((y - row) ** 2 + (x - col) ** 2) / (2 * sigma_px**2))
+
+    return phase
+
+
+def test_extract_rois_moves_regions_inside_frame():
+    img = np.arange(100.0 * 80).reshape(100, 80)
+    centers = np.array([[50, 40], [2, 78]])
+
+    rois = extract_rois(img, centers, 16)
+
+    assert rois.shape == (2, 16, 16)
+    np.testing.assert_array_equal(rois[0], img[42:58, 32:48])
+    np.testing.assert_array_equal(rois[1], img[0:16, 64:80])
+    np.testing.assert_array_equal(roi_origins(centers, img.shape, 16)[1], [0, 64])
+    assert extract_rois(np.stack([img, img]), centers, 16).shape == (2, 2, 16, 16)
+
+    with pytest.raises(ValueError):
+        roi_origins(centers, img.shape, 128)
+
+
+def test_detect_objects_finds_bumps():
+    rng = np.random.default_rng(0)
+    img = sideband_hologram(bumps(), noise=0.005, rng=rng)
+    bg = sideband_hologram(np.zeros((NUM_PX, NUM_PX)), noise=0.005, rng=rng)
+
+    centers = detect_objects(img, bg, threshold_rad=1.0)
+
+    assert len(centers) == len(CENTERS)
+    for center in CENTERS:
+        assert np.min(np.linalg.norm(centers - center, axis=1)) < 3
+
+
+def test_proc_rois_recovers_phase_of_each_region():
+    truth = bumps()
+    rng = np.random.default_rng(1)
+    img = sideband_hologram(truth, noise=0.005, rng=rng)
+    bg = sideband_hologram(np.zeros_like(truth), noise=0.005, rng=rng)
+
+    results = proc_rois(img, CENTERS, 128, bg=bg)
+
+    phase = results["phase_unwrapped"]
+    expected = extract_rois(truth, CENTERS, 128)
+    assert phase.shape == (3, 128, 128)
+    for k in range(len(CENTERS)):
+        diff = phase[k] - expected[k]
+        inner = diff[16:-16, 16:-16]
+        assert np.sqrt(np.mean((inner - inner.mean()) ** 2)) < 0.1
+
+
+def test_proc_rois_matches_single_roi_of_gaussian_bump():
+    truth = gaussian_bump(256, height=2.0)
+    img = sideband_hologram(truth)
+
+    results = proc_rois(img, [[128, 128]], 128)
+
+    diff = results["phase_unwrapped"][0] - truth[64:192, 64:192]
+    inner = diff[16:-16, 16:-16]
+    assert np.sqrt(np.mean((inner - inner.mean()) ** 2)) < 0.1
@@ -0,0 +1,37 @@
+import numpy as np
+
+from holoproc.stats import RunningStats, merge_all
+
+
+def test_running_stats_match_numpy():
+    rng = np.random.default_rng(0)
+    frames = 3 + rng.standard_normal((37, 8, 9))
+
+    stats = RunningStats((8, 9))
+    for batch in np.array_split(frames, 5):
+        stats.update(batch)
+
+    assert stats.count == 37
+    np.testing.assert_allclose(stats.mean, frames.mean(axis=0))
+    np.testing.assert_allclose(stats.std(), frames.std(axis=0))
+    np.testing.assert_allclose(stats.variance(ddof=1), frames.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.min, frames.min(axis=0))
+    np.testing.assert_array_equal(stats.max, frames.max(axis=0))
+
+
+def test_running_stats_merge_partial_results():
+    rng = np.random.default_rng(1)
+    frames = rng.standard_normal((20, 4, 4))
+
+    partials = []
+    for part in np.array_split(frames, 3):
+        stats = RunningStats((4, 4))
+        for frame in part:
+            stats.update(frame)
+        partials.append(stats)
+
+    merged = merge_all(partials)
+
+    assert merged.count == 20
+    np.testing.assert_allclose(merged.mean, frames.mean(axis=0))
+    np.testing.assert_allclose(merged.std(), frames.std(axis=0))
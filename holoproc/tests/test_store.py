@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from holoproc.store import NpyChunkReader, StackWriter, open_writer
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma", None])
+def test_npy_chunk_store_round_trip(tmp_path, compression):
+    rng = np.random.default_rng(0)
+    frames = rng.standard_normal((10, 16, 12)).astype(np.float32)
+
+    with open_writer(
+        tmp_path / "phase", (16, 12), compression=compression, workers=2
+    ) as writer:
+        writer.append(frames[:7])
+        for frame in frames[7:]:
+            writer.append(frame)
+
+    reader = NpyChunkReader(tmp_path / "phase")
+
+    assert len(reader) == 10
+    assert reader.dtype == np.float32
+    np.testing.assert_array_equal(reader[3], frames[3])
+    np.testing.assert_array_equal(reader[-1], frames[-1])
+    np.testing.assert_array_equal(reader[2:9:3], frames[2:9:3])
+    np.testing.assert_array_equal(np.stack(list(reader)), frames)
+
+
+def test_npy_chunk_store_rejects_wrong_frame_shape(tmp_path):
+    with open_writer(tmp_path / "phase", (16, 12)) as writer:
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((2, 12, 16)))
+
+
+def test_stack_writer_is_abstract():
+    with pytest.raises(TypeError):
+        StackWriter()
+
+
+def test_zarr_writer_round_trip(tmp_path):
+    zarr = pytest.importorskip("zarr")
+    frames = np.random.default_rng(1).standard_normal((5, 8, 6)).astype(np.float32)
+
+    with open_writer(tmp_path / "phase.zarr", (8, 6), format="zarr") as writer:
+        writer.append(frames[:3])
+        writer.append(frames[3])
+        writer.append(frames[4])
+
+    array = zarr.open(str(tmp_path / "phase.zarr"), mode="r")
+    assert array.chunks == (1, 8, 6)
+    np.testing.assert_array_equal(array[:], frames)
+
+
+def test_hdf5_writer_round_trip(tmp_path):
+    h5py = pytest.importorskip("h5py")
+    frames = np.random.default_rng(2).standard_normal((5, 8, 6)).astype(np.float32)
+
+    with open_writer(tmp_path / "phase.h5", (8, 6), format="hdf5") as writer:
+        writer.append(frames[:3])
+        writer.append(frames[3])
+        writer.append(frames[4])
+
+    with h5py.File(tmp_path / "phase.h5", "r") as f:
+        assert f["frames"].chunks == (1, 8, 6)
+        np.testing.assert_array_equal(f["frames"][:], frames)
@@ -0,0 +1,28 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import tifffile
+
+from holoproc import temporal_unwrapping
+from holoproc.store import NpyChunkReader
+from holoproc.synthetic import gaussian_bump, synthetic_stack
+
+
+def test_main_with_one_frame_per_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(plt, "show", lambda: None)
+    holograms = synthetic_stack(gaussian_bump(300, sigma_px=30), num_frames=5)
+    img_path = tmp_path / "frames.tif"
+    tifffile.imwrite(
+        img_path,
+        np.round(holograms * 65535).astype(np.uint16),
+        photometric="minisblack",
+    )
+
+    # The first frame of the first batch is the background, which empties the batch
+    temporal_unwrapping.main(
+        img_path, batch_size=1, workers=1, store_path=tmp_path / "store"
+    )
+
+    # Frame 0 is skipped and frame 1 is the background
+    phase = NpyChunkReader(tmp_path / "store" / "phase")
+    assert phase.shape == (3, 256, 256)
+    assert np.all(np.isfinite(phase[:]))
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from holoproc.unwrapping import (
+    UnwrapMethod,
+    Unwrapper,
+    tiles,
+    unwrap,
+    unwrap_least_squares,
+)
+
+
+@pytest.fixture
+def wrapped():
+    """Wrapped phases of a steep ramp plus a Gaussian bump that varies in time."""
+    y, x = np.mgrid[0:200, 0:200]
+    phases = np.array(
+        [
+            0.3 * x
+            + 0.1 * y
+            + (5 + i) * np.exp(-((x - 90) ** 2 + (y - 110) ** 2) / 800)
+            for i in range(3)
+        ]
+    )
+
+    return phases, np.angle(np.exp(1j * phases))
+
+
+def remove_2pi_offset(actual, expected):
+    return actual - 2 * np.pi * np.round(np.mean(actual - expected) / (2 * np.pi))
+
+
+def test_tiles_cover_frame():
+    covered = np.zeros((200, 170), dtype=int)
+    for tile in tiles(covered.shape, tile_size=64, overlap=16):
+        covered[tile] += 1
+
+    assert covered.min() >= 1
+
+
+def test_tiled_unwrap_matches_whole_frames(wrapped):
+    phases, wrapped_phases = wrapped
+
+    unwrapped = Unwrapper(tile_size=64, overlap=16)(wrapped_phases)
+
+    for actual, expected in zip(unwrapped, phases):
+        np.testing.assert_allclose(remove_2pi_offset(actual, expected), expected)
+
+
+def test_parallel_unwrap_matches_serial(wrapped):
+    _, wrapped_phases = wrapped
+
+    with Unwrapper(workers=2) as unwrapper:
+        unwrapped = unwrapper(wrapped_phases)
+
+    np.testing.assert_array_equal(
+        unwrapped, np.stack([unwrap(phase) for phase in wrapped_phases])
+    )
+
+
+def test_least_squares_unwrap_recovers_phase(wrapped):
+    phases, wrapped_phases = wrapped
+
+    unwrapped = Unwrapper(method=UnwrapMethod.LEAST_SQUARES)(wrapped_phases)
+
+    for actual, expected in zip(unwrapped, phases):
+        np.testing.assert_allclose(
+            remove_2pi_offset(actual, expected), expected, atol=1e-8
+        )
+
+
+def test_weighted_least_squares_unwrap_ignores_zero_weights(wrapped):
+    phases, wrapped_phases = wrapped[0][0], wrapped[1][0]
+    rng = np.random.default_rng(0)
+
+    # Corrupt a block of pixels and give them zero weight
+    wrapped_phases = wrapped_phases.copy()
+    wrapped_phases[20:40, 20:40] = rng.uniform(-np.pi, np.pi, (20, 20))
+    weights = np.ones_like(wrapped_phases)
+    weights[20:40, 20:40] = 0
+
+    unwrapped = unwrap_least_squares(wrapped_phases, weights=weights, max_iter=200)
+    unwrapped = remove_2pi_offset(unwrapped, phases)
+
+    np.testing.assert_allclose(unwrapped[weights > 0], phases[weights > 0], atol=1e-3)
+
+
+def test_unwrapper_rejects_zero_workers():
+    with pytest.raises(ValueError):
+        Unwrapper(workers=0)
+    assert Unwrapper(workers=-10_000).workers == 1
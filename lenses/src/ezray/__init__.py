@@ -1 +1,6 @@
-from .api.optical_system import Axis, ParaxialModelID, OpticalSystem  # noqa: F401
+from .api.optical_system import (  # noqa: F401
+    Axis,
+    ParaxialModelID,
+    OpticalSystem,
+    SpotDiagramID,
+)
@@ -5,8 +5,9 @@ from typing import Sequence
 from ezray.core.general_ray_tracing import Gap, SequentialModel, Surface
 from ezray.models.sequential_model import DefaultSequentialModel
 from ezray.models.paraxial_model import ParaxialModel
+from ezray.models.spot_diagram import SpotDiagram, spot_diagrams
 from ezray.specs import ApertureSpec, FieldSpec, GapSpec, SurfaceSpec
-from ezray.specs.fields import Angle
+from ezray.specs.fields import Angle, PupilSampling, SquareGrid
 
 
 class Axis(Enum):
@@ -18,6 +19,15 @@ class Axis(Enum):
 type Wavelength = float
 type ParaxialModelID = tuple[Wavelength, Axis]
 type ParaxialModels = dict[ParaxialModelID, ParaxialModel]
+type SpotDiagramID = tuple[Wavelength, FieldSpec, Axis]
+type SpotDiagrams = dict[SpotDiagramID, SpotDiagram]
+
+
+"""Unit vectors in the object plane along which fields are displaced."""
+AXIS_VECTORS: dict[Axis, tuple[float, float]] = {
+    Axis.X: (1.0, 0.0),
+    Axis.Y: (0.0, 1.0),
+}
 
 
 @dataclass
@@ -76,6 +86,27 @@ class OpticalSystem:
             for axis in [Axis.X, Axis.Y]
         }
 
+    def spot_diagrams(
+        self, sampling: PupilSampling = SquareGrid(spacing=0.1)
+    ) -> SpotDiagrams:
+        """Compute a spot diagram for each wavelength, field and x, y axis combination.
+
+        Real rays are traced from each field point through the entrance pupil, which is
+        sampled according to the pupil sampling specification.
+
+        """
+        pupil = sampling.coordinates()
+
+        results: SpotDiagrams = {}
+        for (wavelength, axis), paraxial_model in self.paraxial_models.items():
+            fields = sorted(paraxial_model.fields)
+            spots = spot_diagrams(paraxial_model, fields, pupil, AXIS_VECTORS[axis])
+            results.update(
+                {(wavelength, field, axis): spot for field, spot in zip(fields, spots)}
+            )
+
+        return results
+
     def _surface_gap_sequence(
         self, gaps: Sequence[Gap], surfaces: Sequence[Surface]
     ) -> list[Gap | Surface]:
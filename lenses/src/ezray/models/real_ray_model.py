@@ -0,0 +1,252 @@
+"""Models for real (finite) ray tracing through optical systems."""
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+from ezray.core.general_ray_tracing import (
+    Conic,
+    Float,
+    SequentialModel,
+    Surface,
+    SurfaceType,
+    Toric,
+)
+from ezray.models.paraxial_model import ParaxialModel
+from ezray.specs.fields import Angle, FieldSpec, ObjectHeight
+
+
+@dataclass(frozen=True)
+class RealRayTraceResults:
+    """The results of a real ray trace.
+
+    Ns is the number of surfaces, and Nr is the number of rays. Positions are in the
+    global coordinate system whose origin lies at the vertex of the first surface after
+    the object. Directions are unit vectors of direction cosines.
+
+    terminated holds, for each ray, the ID of the surface at which the ray was
+    terminated, or 0 if the ray reached the image plane. The positions and directions of
+    a terminated ray at all surfaces after the one at which it terminated are NaN.
+
+    """
+
+    positions: npt.NDArray[Float]  # Ns x Nr x 3
+    directions: npt.NDArray[Float]  # Ns x Nr x 3
+    terminated: npt.NDArray[np.int_]  # Nr
+
+
+def _surface_shape(surface: Surface) -> tuple[float, float]:
+    """Return the curvature and conic constant of a surface."""
+    match surface:
+        case Toric():
+            raise ValueError("Toric surfaces are not supported by the real ray tracer")
+        case Conic(radius_of_curvature=roc, conic_constant=k):
+            return 1 / roc, k
+        case _:
+            return 1 / surface.radius_of_curvature, 0.0
+
+
+def intersect(
+    positions: npt.NDArray[Float],
+    directions: npt.NDArray[Float],
+    curvature: float,
+    conic_constant: float,
+) -> tuple[npt.NDArray[Float], npt.NDArray[Float]]:
+    """Intersect rays with a conic surface whose vertex lies at the origin.
+
+    Returns the points of intersection and the unit surface normals at those points.
+    Rays that miss the surface have NaN intersections.
+
+    """
+    c, k = curvature, conic_constant
+    p, d = positions, directions
+
+    # Solve a * t**2 + 2 * h * t + g = 0 for the distance t along each ray.
+    a = c * (d[:, 0] ** 2 + d[:, 1] ** 2) + c * (1 + k) * d[:, 2] ** 2
+    h = c * (p[:, 0] * d[:, 0] + p[:, 1] * d[:, 1]) + c * (1 + k) * p[:, 2] * d[:, 2]
+    h -= d[:, 2]
+    g = c * (p[:, 0] ** 2 + p[:, 1] ** 2) + c * (1 + k) * p[:, 2] ** 2 - 2 * p[:, 2]
+
+    # This form of the root is stable as the curvature goes to zero.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = g / (-h + np.sign(d[:, 2]) * np.sqrt(h**2 - a * g))
+
+    points = p + t[:, np.newaxis] * d
+
+    normals = np.column_stack(
+        (-c * points[:, 0], -c * points[:, 1], 1 - c * (1 + k) * points[:, 2])
+    )
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+
+    return points, normals
+
+
+def redirect(
+    directions: npt.NDArray[Float],
+    normals: npt.NDArray[Float],
+    surface_type: SurfaceType,
+    n0: float,
+    n1: float,
+) -> npt.NDArray[Float]:
+    """Return the directions of the rays after interacting with a surface.
+
+    Rays that undergo total internal reflection at a refracting surface have NaN
+    directions.
+
+    """
+    cos_i = np.sum(directions * normals, axis=1)
+
+    match surface_type:
+        case SurfaceType.REFRACTING:
+            # Orient the normals along the direction of propagation.
+            normals = normals * np.sign(cos_i)[:, np.newaxis]
+            cos_i = np.abs(cos_i)
+
+            mu = n0 / n1
+            with np.errstate(invalid="ignore"):
+                cos_t = np.sqrt(1 - mu**2 * (1 - cos_i**2))
+
+            return mu * directions + (cos_t - mu * cos_i)[:, np.newaxis] * normals
+        case SurfaceType.REFLECTING:
+            return directions - 2 * cos_i[:, np.newaxis] * normals
+        case _:
+            return directions
+
+
+def trace(
+    positions: npt.NDArray[Float],
+    directions: npt.NDArray[Float],
+    steps: SequentialModel,
+) -> RealRayTraceResults:
+    """Trace real rays through a sequential model.
+
+    Parameters
+    ----------
+    positions : npt.NDArray[Float]
+        Nr x 3 array of the starting positions of the rays in global coordinates.
+    directions : npt.NDArray[Float]
+        Nr x 3 array of the starting directions of the rays. They need not be
+        normalized.
+    steps : SequentialModel
+        The tracing steps of the system.
+
+    """
+    positions = np.atleast_2d(np.asarray(positions, dtype=np.float64))
+    directions = np.atleast_2d(np.asarray(directions, dtype=np.float64))
+    directions = directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+    # Pre-allocate the results. Shape is Ns X Nr X 3. The first surface is the object.
+    num_rays = positions.shape[0]
+    all_positions = np.empty((len(steps) + 1, num_rays, 3))
+    all_directions = np.empty((len(steps) + 1, num_rays, 3))
+    all_positions[0] = positions
+    all_directions[0] = directions
+    terminated = np.zeros(num_rays, dtype=np.int_)
+
+    z_vertex = 0.0
+    for surface_id, (gap_0, surface, gap_1) in enumerate(steps, start=1):
+        curvature, conic_constant = _surface_shape(surface)
+
+        # Move into the surface's local coordinate system and back.
+        local = positions - np.array([0.0, 0.0, z_vertex])
+        points, normals = intersect(local, directions, curvature, conic_constant)
+        positions = points + np.array([0.0, 0.0, z_vertex])
+
+        n0 = gap_0.refractive_index
+        n1 = gap_0.refractive_index if gap_1 is None else gap_1.refractive_index
+        directions = redirect(directions, normals, surface.surface_type, n0, n1)
+
+        # Terminate rays that miss the surface, fall outside its clear aperture, or are
+        # totally internally reflected.
+        r = np.hypot(points[:, 0], points[:, 1])
+        failed = (
+            np.isnan(positions).any(axis=1)
+            | np.isnan(directions).any(axis=1)
+            | (r > surface.semi_diameter)
+        )
+        newly_terminated = failed & (terminated == 0)
+        terminated[newly_terminated] = surface_id
+
+        directions[terminated != 0] = np.nan
+        positions[(terminated != 0) & ~newly_terminated] = np.nan
+
+        all_positions[surface_id] = positions
+        all_directions[surface_id] = directions
+
+        if gap_1 is not None:
+            z_vertex += gap_1.thickness
+
+    return RealRayTraceResults(all_positions, all_directions, terminated)
+
+
+def launch_rays(
+    paraxial_model: ParaxialModel,
+    field: FieldSpec,
+    pupil: npt.NDArray[Float],
+    axis: tuple[float, float] = (0.0, 1.0),
+) -> tuple[npt.NDArray[Float], npt.NDArray[Float]]:
+    """Create the rays from a field point that pass through points in the pupil.
+
+    Parameters
+    ----------
+    paraxial_model : ParaxialModel
+        Paraxial model of the system, used to locate the entrance pupil.
+    field : FieldSpec
+        The field point from which the rays originate.
+    pupil : npt.NDArray[Float]
+        Np x 2 array of normalized entrance pupil coordinates.
+    axis : tuple[float, float]
+        Unit vector in the object plane along which the field point is displaced.
+
+    Returns
+    -------
+    tuple[npt.NDArray[Float], npt.NDArray[Float]]
+        The Np x 3 starting positions and directions of the rays.
+
+    """
+    if paraxial_model.object_space_telecentric:
+        raise ValueError(
+            "Cannot launch real rays into an object space telecentric system"
+        )
+
+    enp = paraxial_model.entrance_pupil
+    pupil = np.atleast_2d(pupil)
+    axis_vector = np.array([axis[0], axis[1], 0.0])
+
+    # Points in the entrance pupil plane
+    targets = np.column_stack(
+        (
+            enp["semi_diameter"] * pupil[:, 0],
+            enp["semi_diameter"] * pupil[:, 1],
+            np.full(pupil.shape[0], enp["location"]),
+        )
+    )
+
+    seq_model = paraxial_model.sequential_model
+    if np.isinf(seq_model.gaps[0].thickness):
+        match field:
+            case Angle(angle=angle):
+                theta = np.deg2rad(angle)
+            case _:
+                raise ValueError(
+                    f"Field type is incompatible with an object at infinity: {field}"
+                )
+
+        direction = np.sin(theta) * axis_vector + np.array([0.0, 0.0, np.cos(theta)])
+        directions = np.broadcast_to(direction, targets.shape).copy()
+
+        return targets, directions
+
+    obj_loc = -seq_model.gaps[0].thickness
+    match field:
+        case Angle(angle=angle):
+            height = -(enp["location"] - obj_loc) * np.tan(np.deg2rad(angle))
+        case ObjectHeight(height=height):
+            pass
+        case _:
+            raise ValueError(f"Unknown field type: {field}")
+
+    origin = height * axis_vector + np.array([0.0, 0.0, obj_loc])
+    positions = np.broadcast_to(origin, targets.shape).copy()
+
+    return positions, targets - positions
@@ -0,0 +1,97 @@
+"""Spot diagrams computed from real ray traces."""
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from ezray.core.general_ray_tracing import Float
+from ezray.models.paraxial_model import ParaxialModel
+from ezray.models.real_ray_model import launch_rays, trace
+from ezray.specs.fields import FieldSpec
+
+
+@dataclass(frozen=True)
+class SpotDiagram:
+    """The intersections of a ray bundle with the image plane.
+
+    positions is an N x 2 array of the x, y coordinates of the N rays that were not
+    terminated. The RMS and geometric (GEO) radii are measured from the centroid of the
+    spot.
+
+    """
+
+    positions: npt.NDArray[Float]
+    chief_ray: npt.NDArray[Float]
+    centroid: npt.NDArray[Float]
+    rms_radius: float
+    geo_radius: float
+
+
+def spot_diagrams(
+    paraxial_model: ParaxialModel,
+    fields: Sequence[FieldSpec],
+    pupil: npt.NDArray[Float],
+    axis: tuple[float, float] = (0.0, 1.0),
+) -> list[SpotDiagram]:
+    """Compute the spot diagrams of a system for several fields.
+
+    The rays from all fields are traced together in a single pass, and the centroids
+    and radii of all the spots are computed at once.
+
+    Parameters
+    ----------
+    paraxial_model : ParaxialModel
+        Paraxial model of the system at the wavelength of the fields.
+    fields : Sequence[FieldSpec]
+        The fields for which to compute spot diagrams.
+    pupil : npt.NDArray[Float]
+        Np x 2 array of normalized entrance pupil coordinates to sample.
+    axis : tuple[float, float]
+        Unit vector in the object plane along which the field points are displaced.
+
+    Returns
+    -------
+    list[SpotDiagram]
+        One spot diagram per field, in the same order as the fields.
+
+    """
+    # The chief ray is prepended to the pupil samples of each field.
+    pupil = np.vstack(([0.0, 0.0], np.atleast_2d(pupil)))
+    num_fields, num_samples = len(fields), pupil.shape[0]
+
+    launched = [launch_rays(paraxial_model, field, pupil, axis) for field in fields]
+    positions = np.concatenate([p for p, _ in launched])
+    directions = np.concatenate([d for _, d in launched])
+
+    results = trace(positions, directions, paraxial_model.sequential_model)
+
+    # Reshape the image plane intersections to Nf x Np x 2
+    image_plane = results.positions[-1, :, :2].reshape(num_fields, num_samples, 2)
+    valid = (results.terminated == 0).reshape(num_fields, num_samples)
+
+    chief_rays = image_plane[:, 0, :]
+    if not valid[:, 0].all():
+        raise ValueError("The chief ray of at least one field was terminated")
+
+    image_plane, valid = image_plane[:, 1:, :], valid[:, 1:]
+    counts = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centroids = (
+            np.where(valid[..., np.newaxis], image_plane, 0).sum(axis=1)
+            / counts[:, np.newaxis]
+        )
+        r_sq = np.sum((image_plane - centroids[:, np.newaxis, :]) ** 2, axis=2)
+        rms_radii = np.sqrt(np.where(valid, r_sq, 0).sum(axis=1) / counts)
+    geo_radii = np.sqrt(np.where(valid, r_sq, -np.inf).max(axis=1, initial=0.0))
+
+    return [
+        SpotDiagram(
+            positions=image_plane[i][valid[i]],
+            chief_ray=chief_rays[i],
+            centroid=centroids[i],
+            rms_radius=rms_radii[i].item(),
+            geo_radius=geo_radii[i].item(),
+        )
+        for i in range(num_fields)
+    ]
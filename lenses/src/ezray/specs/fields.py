@@ -2,6 +2,9 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Self
 
+import numpy as np
+import numpy.typing as npt
+
 
 @dataclass(frozen=True)
 class SquareGrid:
@@ -19,6 +22,25 @@ class SquareGrid:
         if self.spacing < 0 or self.spacing > 1:
             raise ValueError("Spacing must be in the range [0, 1]")
 
+    def coordinates(self) -> npt.NDArray[np.float64]:
+        """Return the normalized pupil coordinates of the grid as an N x 2 array.
+
+        Only the points that lie inside the unit circle are returned. The grid is
+        symmetric about the pupil center, which is always one of the points.
+
+        """
+        if self.spacing == 0:
+            raise ValueError("Cannot sample the pupil with a spacing of zero")
+
+        half = np.arange(0, 1 + 1e-9, self.spacing)
+        axis = np.concatenate((-half[:0:-1], half))
+
+        x, y = np.meshgrid(axis, axis)
+        x, y = x.ravel(), y.ravel()
+        inside = x**2 + y**2 <= 1 + 1e-9
+
+        return np.column_stack((x[inside], y[inside]))
+
 
 type PupilSampling = SquareGrid
 
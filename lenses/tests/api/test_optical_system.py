@@ -1,6 +1,6 @@
 from ezray import Axis, OpticalSystem
 from ezray.specs.aperture import EntrancePupil
-from ezray.specs.fields import Angle, ObjectHeight
+from ezray.specs.fields import Angle, ObjectHeight, SquareGrid
 from ezray.specs.gaps import Gap
 from ezray.specs.surfaces import Conic, Image, Object
 
@@ -64,3 +64,13 @@ def test_optical_system_field_angles_and_telecentric(aperture, fields, gaps, sur
 
     with pytest.raises(ValueError):
         OpticalSystem(aperture, fields, gaps, surfaces, object_space_telecentric=True)
+
+
+def test_optical_system_spot_diagrams(aperture, fields, gaps, surfaces):
+    system = OpticalSystem(aperture, fields, gaps, surfaces)
+
+    spots = system.spot_diagrams(SquareGrid(spacing=0.5))
+
+    assert spots.keys() == {
+        (field.wavelength, field, axis) for field in fields for axis in [Axis.X, Axis.Y]
+    }
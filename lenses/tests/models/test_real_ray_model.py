@@ -0,0 +1,129 @@
+from math import inf
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from ezray.core.general_ray_tracing import (
+    Conic,
+    Gap,
+    Image,
+    Object,
+    SurfaceType,
+    Toric,
+)
+from ezray.models.paraxial_model import ParaxialModel
+from ezray.models.real_ray_model import launch_rays, trace
+from ezray.models.sequential_model import DefaultSequentialModel
+from ezray.models.spot_diagram import spot_diagrams
+from ezray.specs.fields import Angle
+
+
+@pytest.fixture
+def convexplano_lens():
+    """Convexplano lens with object at infinity."""
+    surf_0 = Object()
+    gap_0 = Gap(refractive_index=1.0, thickness=inf)
+    surf_1 = Conic(
+        semi_diameter=12.5,
+        radius_of_curvature=25.8,
+        surface_type=SurfaceType.REFRACTING,
+    )
+    gap_1 = Gap(refractive_index=1.515, thickness=5.3)
+    surf_2 = Conic(semi_diameter=12.5, surface_type=SurfaceType.REFRACTING)
+    gap_2 = Gap(refractive_index=1.0, thickness=46.59874)
+    surf_3 = Image()
+
+    fields = {Angle(angle=0.0), Angle(angle=5.0)}
+
+    sequential_model = DefaultSequentialModel(
+        [surf_0, gap_0, surf_1, gap_1, surf_2, gap_2, surf_3]
+    )
+
+    return ParaxialModel(sequential_model, fields)
+
+
+@pytest.fixture
+def flat_interface():
+    """A single flat interface between air and glass."""
+    return DefaultSequentialModel(
+        [
+            Object(),
+            Gap(refractive_index=1.0, thickness=inf),
+            Conic(semi_diameter=10, surface_type=SurfaceType.REFRACTING),
+            Gap(refractive_index=1.5, thickness=10.0),
+            Image(),
+        ]
+    )
+
+
+def test_trace_snells_law(flat_interface):
+    theta = np.deg2rad(20)
+    positions = np.array([[0.0, 0.0, -1.0]])
+    directions = np.array([[0.0, np.sin(theta), np.cos(theta)]])
+
+    results = trace(positions, directions, flat_interface)
+
+    assert results.terminated[0] == 0
+    assert_allclose(results.directions[1, 0, 1], np.sin(theta) / 1.5)
+    assert_allclose(np.linalg.norm(results.directions[1, 0]), 1.0)
+
+
+def test_trace_terminates_rays_outside_semi_diameter(flat_interface):
+    positions = np.array([[0.0, 0.0, -1.0], [0.0, 11.0, -1.0]])
+    directions = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, 1.0]])
+
+    results = trace(positions, directions, flat_interface)
+
+    assert_allclose(results.terminated, [0, 1])
+    assert np.isnan(results.positions[2, 1]).all()
+    assert_allclose(results.positions[2, 0], [0.0, 0.0, 10.0])
+
+
+def test_trace_toric_surfaces_not_supported():
+    model = DefaultSequentialModel(
+        [
+            Object(),
+            Gap(refractive_index=1.0, thickness=inf),
+            Toric(
+                semi_diameter=10,
+                radius_of_curvature=10,
+                radius_of_revolution=10,
+                surface_type=SurfaceType.REFRACTING,
+            ),
+            Gap(refractive_index=1.5, thickness=10.0),
+            Image(),
+        ]
+    )
+
+    with pytest.raises(ValueError):
+        trace(np.zeros((1, 3)), np.array([[0.0, 0.0, 1.0]]), model)
+
+
+def test_launch_rays_object_at_infinity(convexplano_lens):
+    pupil = np.array([[0.0, 0.0], [0.0, 1.0]])
+
+    positions, directions = launch_rays(convexplano_lens, Angle(angle=5.0), pupil)
+
+    assert_allclose(positions, [[0.0, 0.0, 0.0], [0.0, 12.5, 0.0]])
+    assert_allclose(directions[:, 1], np.sin(np.deg2rad(5.0)))
+
+
+def test_paraxial_rays_focus_at_back_focal_plane(convexplano_lens):
+    pupil = 1e-3 * np.array([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0], [0.0, -1.0]])
+
+    (spot,) = spot_diagrams(convexplano_lens, [Angle(angle=0.0)], pupil)
+
+    assert spot.rms_radius < 1e-6
+    assert_allclose(spot.centroid, [0.0, 0.0], atol=1e-12)
+
+
+def test_spot_diagram_chief_ray_close_to_paraxial(convexplano_lens):
+    pupil = np.array([[0.0, 0.5], [0.0, -0.5]])
+
+    _, spot = spot_diagrams(
+        convexplano_lens, [Angle(angle=0.0), Angle(angle=5.0)], pupil
+    )
+
+    assert_allclose(spot.chief_ray[1], convexplano_lens.chief_ray[-1, 0, 0], rtol=1e-3)
+    assert spot.geo_radius >= spot.rms_radius > 0
@@ -34,3 +34,15 @@ def test_field_angle_abs():
 def test_field_object_height_abs():
     a = ObjectHeight(height=-1.0, wavelength=1.0)
     assert abs(a) == ObjectHeight(height=1.0, wavelength=1.0)
+
+
+def test_pupil_sampling_square_grid_coordinates():
+    coords = SquareGrid(spacing=1.0).coordinates()
+
+    assert coords.shape == (5, 2)
+    assert [0.0, 0.0] in coords.tolist()
+
+
+def test_pupil_sampling_square_grid_zero_spacing():
+    with pytest.raises(ValueError):
+        SquareGrid(spacing=0.0).coordinates()
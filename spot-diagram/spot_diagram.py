@@ -1,15 +1,19 @@
 # /// script
 # requires-python = ">=3.13"
 # dependencies = [
+#     "ijson",
 #     "matplotlib",
 #     "numpy",
 #     "PySide6",
 # ]
 # ///
+import base64
+from collections import defaultdict
 import json
 from pathlib import Path
-from typing import Any, Optional, Sequence, TypedDict
+from typing import Any, Iterable, Iterator, Literal, Optional, Sequence, TextIO, TypedDict
 
+import ijson
 from matplotlib.axes import Axes
 from matplotlib.patches import Circle
 import matplotlib.pyplot as plt
@@ -36,6 +40,8 @@ FIELDS: list[Field] = [
     {"type": "Angle", "value": 5.0, "units": "deg"},
 ]
 AXES: list[str] = ["Y"]
+DENSITY_THRESHOLD: int = 100_000  # Rays above which spot diagrams are rasterized
+TRANSFORMED_FILE: Path = Path("transformed.json")
 IMAGE_SPACE_NAS: list[float] = [0.245166649, 0.242702895, 0.241607739]
 
 
@@ -59,6 +65,101 @@ class RayTraceResults(TypedDict):
     chief_ray: RayBundle
 
 
+class RayBundleArrays(TypedDict):
+    """A ray bundle stored as contiguous arrays.
+
+    positions and directions have shape (num_surfaces, num_rays, 3); terminated has
+    shape (num_rays,).
+
+    """
+    positions: np.ndarray
+    directions: np.ndarray
+    terminated: np.ndarray
+    reason_for_termination: dict[int, str]
+    num_surfaces: int
+
+
+class EnergyCurves(TypedDict):
+    """Fractions of the rays inside circles (encircled) and squares (ensquared).
+
+    The circles have radius and the squares have half-width equal to each entry of
+    radii, and both are centered on the chief ray.
+
+    """
+    radii: np.ndarray
+    encircled: np.ndarray
+    ensquared: np.ndarray
+
+
+class RayTraceResultsArrays(TypedDict):
+    wavelength_id: int
+    field_id: int
+    axis: str
+    ray_bundle: RayBundleArrays
+    chief_ray: RayBundleArrays
+
+
+BUNDLE_TYPES: tuple[str, str] = ("ray_bundle", "chief_ray")
+
+
+type ResultsKey = tuple[int, int, str]
+
+
+class IndexedResults:
+    """Columnar ray trace results indexed by (wavelength_id, field_id, axis).
+
+    The index is built once so that bundles are looked up in constant time. The
+    positions of the unterminated rays at the image plane are extracted on first access
+    and cached.
+
+    """
+
+    def __init__(self, results: Iterable[RayTraceResultsArrays]) -> None:
+        self._results: dict[ResultsKey, RayTraceResultsArrays] = {}
+        self._wavelength_ids: dict[tuple[int, str], list[int]] = defaultdict(list)
+        self._image_plane: dict[tuple[str, ResultsKey], np.ndarray] = {}
+
+        for result in results:
+            key = (result["wavelength_id"], result["field_id"], result["axis"])
+            self._results[key] = result
+            self._wavelength_ids[(result["field_id"], result["axis"])].append(
+                result["wavelength_id"]
+            )
+
+    def __iter__(self) -> Iterator[RayTraceResultsArrays]:
+        return iter(self._results.values())
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, wavelength_id: int, field_id: int, axis: str) -> RayTraceResultsArrays:
+        try:
+            return self._results[(wavelength_id, field_id, axis)]
+        except KeyError:
+            raise ValueError(
+                f"Ray bundle with wavelength_id={wavelength_id}, field_id={field_id}, axis={axis} not found."
+            ) from None
+
+    def wavelength_ids(self, field_id: int, axis: str) -> list[int]:
+        """Returns the IDs of the wavelengths for which a field and axis were traced."""
+        return self._wavelength_ids.get((field_id, axis), [])
+
+    def image_plane_positions(
+        self,
+        bundle_type: str,
+        wavelength_id: int,
+        field_id: int,
+        axis: str,
+    ) -> np.ndarray:
+        """Returns the positions of the unterminated rays of a bundle at the image plane."""
+        key = (bundle_type, (wavelength_id, field_id, axis))
+        if key not in self._image_plane:
+            bundle = self.get(wavelength_id, field_id, axis)[bundle_type]
+            self._image_plane[key] = get_positions_at_image_plane(bundle)
+
+        return self._image_plane[key]
+
+
 # ---------
 # Accessors
 def get_number_of_rays(bundle: RayBundle) -> int:
@@ -68,93 +169,97 @@ def get_number_of_rays(bundle: RayBundle) -> int:
     return len(rays) // num_surfaces
 
 
-def get_rays_at_surface(
-    bundle: RayBundle,
-    surface_id,
+def get_unterminated_mask(bundle: RayBundleArrays) -> np.ndarray:
+    """Returns a boolean mask that is True for the rays of a bundle that were not terminated."""
+    return bundle["terminated"] == 0
+
+
+def get_positions_at_surface(
+    bundle: RayBundleArrays,
+    surface_id: int,
     raise_on_any_terminated: bool = False
-) -> list[Ray]:
-    num_rays = get_number_of_rays(bundle)
-    rays = bundle["rays"][surface_id * num_rays : (surface_id + 1) * num_rays]
+) -> np.ndarray:
+    positions = bundle["positions"][surface_id]
 
-    terminated = bundle["terminated"]
+    mask = get_unterminated_mask(bundle)
     if raise_on_any_terminated:
-        if any(terminated):
+        if not mask.all():
             raise ValueError(
                 "Some rays are terminated. Cannot get rays at surface."
             )
-    else:
-        rays = [
-            ray for ray, terminated in zip(rays, terminated) if not terminated
-        ]
+        return positions
 
-    return rays
+    return positions[mask]
 
 
-def get_rays_at_image_plane(bundle: RayBundle, raise_on_terminated: bool = False) -> list[Ray]:
+def get_positions_at_image_plane(
+    bundle: RayBundleArrays, raise_on_terminated: bool = False
+) -> np.ndarray:
     num_surfaces = bundle["num_surfaces"]
-    rays_at_image_plane = get_rays_at_surface(bundle, num_surfaces - 1, raise_on_terminated)
 
-    return rays_at_image_plane
+    return get_positions_at_surface(bundle, num_surfaces - 1, raise_on_terminated)
 
 
 def get_bundle_by_ids(
     bundle_type: str,
-    results: list[RayTraceResults],
+    results: IndexedResults,
     wavelength_id: int,
     field_id: int,
     axis: str,
-) -> RayBundle:
-    for result in results:
-        if (
-            result["wavelength_id"] == wavelength_id
-            and result["field_id"] == field_id
-            and result["axis"] == axis
-        ):
-            return result[bundle_type]
-
-    raise ValueError(
-        f"Ray bundle with wavelength_id={wavelength_id}, field_id={field_id}, axis={axis} not found."
-    )
+) -> RayBundleArrays:
+    return results.get(wavelength_id, field_id, axis)[bundle_type]
 
 
 def get_ray_bundle_by_ids(
-    results: list[RayTraceResults],
+    results: IndexedResults,
     wavelength_id: int,
     field_id: int,
     axis: str,
-) -> RayBundle:
+) -> RayBundleArrays:
     return get_bundle_by_ids("ray_bundle", results, wavelength_id, field_id, axis)
 
 
 def get_chief_ray_by_ids(
-    results: list[RayTraceResults],
+    results: IndexedResults,
     wavelength_id: int,
     field_id: int,
     axis: str,
-) -> RayBundle:
+) -> RayBundleArrays:
     return get_bundle_by_ids("chief_ray", results, wavelength_id, field_id, axis)
 
 
 # -----------
 # Conversions
-def convert_rays_to_numpy_arrays(rays: list[Ray]) -> tuple[np.ndarray, np.ndarray]:
-    """Converts a list of rays to numpy arrays.
+def convert_bundle_to_arrays(bundle: RayBundle) -> RayBundleArrays:
+    """Converts a ray bundle into contiguous position, direction and terminated arrays.
 
-    Parameters
-    ----------
-    rays : list[Ray]
-        A list of Ray dictionaries containing position and direction.
-    
-    Returns
-    -------
-    tuple[np.ndarray, np.ndarray]
-        A tuple containing two numpy arrays: one for positions and one for directions.
+    The rays of a bundle are stored surface by surface, so the flat lists of positions
+    and directions are reshaped to (num_surfaces, num_rays, 3).
 
     """
-    positions = np.array([ray["pos"] for ray in rays])
-    directions = np.array([ray["dir"] for ray in rays])
+    num_surfaces = bundle["num_surfaces"]
+    num_rays = get_number_of_rays(bundle)
 
-    return positions, directions
+    positions = np.fromiter(
+        (x for ray in bundle["rays"] for x in ray["pos"]),
+        dtype=np.float64,
+        count=3 * num_surfaces * num_rays,
+    )
+    directions = np.fromiter(
+        (x for ray in bundle["rays"] for x in ray["dir"]),
+        dtype=np.float64,
+        count=3 * num_surfaces * num_rays,
+    )
+
+    return {
+        "positions": positions.reshape(num_surfaces, num_rays, 3),
+        "directions": directions.reshape(num_surfaces, num_rays, 3),
+        "terminated": np.asarray(bundle["terminated"], dtype=np.int64),
+        "reason_for_termination": {
+            int(k): v for k, v in bundle["reason_for_termination"].items()
+        },
+        "num_surfaces": num_surfaces,
+    }
 
 
 # ----
@@ -167,6 +272,137 @@ def read_results_file(file_path: Path) -> list[RayTraceResults]:
     return results
 
 
+def iter_results_file(file_path: Path) -> Iterator[RayTraceResultsArrays]:
+    """Streams the results from a file, converting one result at a time to arrays.
+
+    Only the result that is currently being converted is held in memory as Python
+    objects; the full object tree of the file is never built.
+
+    """
+    with open(file_path, "rb") as file:
+        for result in ijson.items(file, "rayTraceView.results.item", use_float=True):
+            yield {
+                "wavelength_id": result["wavelength_id"],
+                "field_id": result["field_id"],
+                "axis": result["axis"],
+                "ray_bundle": convert_bundle_to_arrays(result["ray_bundle"]),
+                "chief_ray": convert_bundle_to_arrays(result["chief_ray"]),
+            }
+
+
+def cache_path(file_path: Path) -> Path:
+    """Returns the path to the binary sidecar cache of a results file."""
+    return file_path.with_name(file_path.name + ".npz")
+
+
+def write_cache(file_path: Path, results: list[RayTraceResultsArrays]) -> None:
+    """Writes the columnar results to a binary sidecar cache next to the results file.
+
+    The size and modification time of the results file are stored alongside the arrays
+    so that a stale cache can be detected.
+
+    """
+    stat = file_path.stat()
+    metadata = {
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "results": [
+            {
+                "wavelength_id": result["wavelength_id"],
+                "field_id": result["field_id"],
+                "axis": result["axis"],
+                **{
+                    bundle_type: {
+                        "num_surfaces": result[bundle_type]["num_surfaces"],
+                        "reason_for_termination": result[bundle_type]["reason_for_termination"],
+                    }
+                    for bundle_type in BUNDLE_TYPES
+                },
+            }
+            for result in results
+        ],
+    }
+
+    arrays = {
+        f"{i}/{bundle_type}/{key}": result[bundle_type][key]
+        for i, result in enumerate(results)
+        for bundle_type in BUNDLE_TYPES
+        for key in ("positions", "directions", "terminated")
+    }
+
+    with open(cache_path(file_path), "wb") as file:
+        np.savez(file, metadata=np.array(json.dumps(metadata)), **arrays)
+
+
+def read_cache(file_path: Path) -> Optional[list[RayTraceResultsArrays]]:
+    """Reads the binary sidecar cache of a results file.
+
+    Returns None if there is no cache or if it is older than the results file.
+
+    """
+    path = cache_path(file_path)
+    if not path.exists():
+        return None
+
+    stat = file_path.stat()
+    with np.load(path) as data:
+        metadata = json.loads(data["metadata"].item())
+        if (
+            metadata["source_size"] != stat.st_size
+            or metadata["source_mtime_ns"] != stat.st_mtime_ns
+        ):
+            return None
+
+        return [
+            {
+                "wavelength_id": result["wavelength_id"],
+                "field_id": result["field_id"],
+                "axis": result["axis"],
+                **{
+                    bundle_type: {
+                        "positions": data[f"{i}/{bundle_type}/positions"],
+                        "directions": data[f"{i}/{bundle_type}/directions"],
+                        "terminated": data[f"{i}/{bundle_type}/terminated"],
+                        "reason_for_termination": {
+                            int(k): v
+                            for k, v in result[bundle_type]["reason_for_termination"].items()
+                        },
+                        "num_surfaces": result[bundle_type]["num_surfaces"],
+                    }
+                    for bundle_type in BUNDLE_TYPES
+                },
+            }
+            for i, result in enumerate(metadata["results"])
+        ]
+
+
+def read_results_file_columnar(
+    file_path: Path, use_cache: bool = False
+) -> list[RayTraceResultsArrays]:
+    """Reads a results file into columnar arrays.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path to the JSON results file.
+    use_cache : bool
+        If True, read the results from the binary sidecar cache when it is up to date,
+        and write the cache after parsing the JSON file otherwise.
+
+    """
+    if use_cache:
+        results = read_cache(file_path)
+        if results is not None:
+            return results
+
+    results = list(iter_results_file(file_path))
+
+    if use_cache:
+        write_cache(file_path, results)
+
+    return results
+
+
 def determine_layout(
     wavelengths: list[Spec],
     field_angles: list[Spec],
@@ -202,7 +438,7 @@ def determine_layout(
 
 
 def bounding_box(
-    results: list[RayTraceResults],
+    results: IndexedResults,
     field_id: int,
     axis: str,
     force_square: bool = True
@@ -217,14 +453,14 @@ def bounding_box(
     min_y = float("inf")
     max_y = float("-inf")
 
-    for result in results:
-        if result["field_id"] == field_id and result["axis"] == axis:
-            rays_at_image_plane = get_rays_at_image_plane(result["ray_bundle"])
-            positions, _ = convert_rays_to_numpy_arrays(rays_at_image_plane)
-            min_x = min(min_x, np.min(positions[:, 0]))
-            max_x = max(max_x, np.max(positions[:, 0]))
-            min_y = min(min_y, np.min(positions[:, 1]))
-            max_y = max(max_y, np.max(positions[:, 1]))
+    for wavelength_id in results.wavelength_ids(field_id, axis):
+        positions = results.image_plane_positions(
+            "ray_bundle", wavelength_id, field_id, axis
+        )
+        min_x = min(min_x, np.min(positions[:, 0]))
+        max_x = max(max_x, np.max(positions[:, 0]))
+        min_y = min(min_y, np.min(positions[:, 1]))
+        max_y = max(max_y, np.max(positions[:, 1]))
 
     if force_square:
         center_x = (min_x + max_x) / 2
@@ -262,6 +498,110 @@ def airy_disk_radius(
     return {"value": 0.61 * value / na, "units": units}
 
 
+type PlotMode = Literal["auto", "scatter", "density"]
+
+
+class Density(TypedDict):
+    """A spot diagram binned into a 2D histogram.
+
+    counts has rows along y, and extent is (min_x, max_x, min_y, max_y). energy holds
+    the energy curves about the center of the spot, if one was given.
+
+    """
+    counts: np.ndarray
+    extent: tuple[float, float, float, float]
+    energy: Optional[EnergyCurves]
+
+
+def cumulative_energy(offsets: np.ndarray, num_points: int = 100) -> EnergyCurves:
+    """Computes the encircled and ensquared energy curves from offsets from a center.
+
+    Each ray is counted in the first radius that contains it, and the counts are
+    accumulated, so the rays are neither sorted nor compared with every radius. Every
+    ray is assumed to carry the same energy.
+
+    """
+    r_circle = np.hypot(offsets[:, 0], offsets[:, 1])
+    r_square = np.max(np.abs(offsets), axis=1)
+
+    radii = np.linspace(0, np.max(r_circle) if len(r_circle) else 0.0, num_points)
+    num_rays = max(len(offsets), 1)
+
+    def cumulative(r: np.ndarray) -> np.ndarray:
+        first = np.searchsorted(radii, r, side="left")
+        counts = np.bincount(first, minlength=num_points)[:num_points]
+        return np.cumsum(counts) / num_rays
+
+    return {
+        "radii": radii,
+        "encircled": cumulative(r_circle),
+        "ensquared": cumulative(r_square),
+    }
+
+
+def rasterize(
+    positions: np.ndarray,
+    bbox: Optional[tuple[float, float, float, float]] = None,
+    bins: int = 256,
+    center: Optional[np.ndarray] = None,
+    num_points: int = 100,
+) -> Density:
+    """Bins the image plane positions of rays into a 2D histogram.
+
+    If a center is given, e.g. the chief ray, the encircled and ensquared energy curves
+    about it are computed in the same pass over the positions.
+
+    """
+    if bbox is None:
+        bbox = (
+            np.min(positions[:, 0]),
+            np.max(positions[:, 0]),
+            np.min(positions[:, 1]),
+            np.max(positions[:, 1]),
+        )
+    min_x, max_x, min_y, max_y = bbox
+
+    xy = positions[:, :2]
+    counts, _, _ = np.histogram2d(
+        xy[:, 1],
+        xy[:, 0],
+        bins=bins,
+        range=[[min_y, max_y], [min_x, max_x]],
+    )
+
+    energy = None
+    if center is not None:
+        energy = cumulative_energy(xy - center[:2], num_points)
+
+    return {"counts": counts, "extent": bbox, "energy": energy}
+
+
+def energy_curves(
+    positions: np.ndarray,
+    center: np.ndarray,
+    num_points: int = 100,
+) -> EnergyCurves:
+    """Computes the encircled and ensquared energy curves of a spot about a center."""
+    return cumulative_energy(positions[:, :2] - center[:2], num_points)
+
+
+def energy_radius(curves: EnergyCurves, fraction: float, kind: str = "encircled") -> float:
+    """Returns the smallest radius of the curves that holds a fraction of the energy."""
+    index = np.searchsorted(curves[kind], fraction, side="left")
+
+    return float(curves["radii"][min(index, len(curves["radii"]) - 1)])
+
+
+def plot_energy_curves(curves: EnergyCurves, ax: Axes) -> None:
+    ax.plot(curves["radii"], curves["encircled"], label="Encircled")
+    ax.plot(curves["radii"], curves["ensquared"], label="Ensquared")
+    ax.set_xlabel("Radius / Half-Width (mm)")
+    ax.set_ylabel("Fraction of Energy")
+    ax.set_ylim(0, 1.05)
+    ax.grid(True)
+    ax.legend()
+
+
 def plot_spot_diagram(
     positions: np.ndarray,
     ax: Axes,
@@ -270,15 +610,50 @@ def plot_spot_diagram(
     bbox: Optional[tuple[float, float, float, float]] = None,
     image_space_na: Optional[float] = None,
     chief_ray_position: Optional[np.ndarray] = None,
-) -> None:
-    ax.scatter(positions[:, 0], positions[:, 1], s=1)
+    mode: PlotMode = "auto",
+    bins: int = 256,
+) -> Optional[EnergyCurves]:
+    """Plots a spot diagram.
+
+    In scatter mode every ray is drawn as a point. In density mode the rays are binned
+    into a 2D histogram that is drawn as an image, which takes the same time to render
+    regardless of the number of rays. Auto mode uses density mode for bundles with more
+    than DENSITY_THRESHOLD rays.
+
+    In density mode the encircled and ensquared energy curves about the chief ray are
+    computed while binning, their 80% radii are shown in the title, and the curves are
+    returned. Otherwise None is returned.
+
+    """
+    if mode == "auto":
+        mode = "density" if len(positions) > DENSITY_THRESHOLD else "scatter"
+
+    curves = None
+    if mode == "density":
+        center = None if chief_ray_position is None else chief_ray_position[0]
+        density = rasterize(positions, bbox, bins, center=center)
+        curves = density["energy"]
+        ax.imshow(
+            np.ma.masked_equal(density["counts"], 0),
+            origin="lower",
+            extent=density["extent"],
+            interpolation="nearest",
+        )
+    else:
+        ax.scatter(positions[:, 0], positions[:, 1], s=1)
     ax.set_xlabel("X Position (mm)")
     ax.set_ylabel("Y Position (mm)")
     ax.set_aspect('equal', adjustable='box')
     ax.grid(True)
 
     if wavelength is not None and field is not None:
-        ax.set_title(f"Wavelength: {display_spec(wavelength, "0.4f")} µm, Field: {display_spec(field)}")
+        title = f"Wavelength: {display_spec(wavelength, "0.4f")} µm, Field: {display_spec(field)}"
+        if curves is not None:
+            title += (
+                f"\nEE80: {energy_radius(curves, 0.8):.4f} mm, "
+                f"ES80: {energy_radius(curves, 0.8, "ensquared"):.4f} mm"
+            )
+        ax.set_title(title)
 
     if bbox is not None:
         min_x, max_x, min_y, max_y = bbox
@@ -302,12 +677,59 @@ def plot_spot_diagram(
             )
         )
 
+    return curves
+
+class PanelJob(TypedDict):
+    """Everything that a worker process needs to render one spot diagram panel."""
+    positions: np.ndarray
+    chief_ray_position: np.ndarray
+    wavelength: Spec
+    field: Field
+    bbox: tuple[float, float, float, float]
+    image_space_na: float
+    mode: PlotMode
+    out_stem: Path
+    formats: tuple[str, ...]
+
+
+def iter_panels(
+    results: IndexedResults,
+    wavelengths_sorted: list[Spec],
+    fields_sorted: list[Field],
+    axis: str,
+    image_space_nas: list[float],
+) -> Iterator[tuple[int, int, dict[str, Any]]]:
+    """Yields the row, column and plotting arguments of each panel of an axis page."""
+    bboxes = [bounding_box(results, j, axis) for j in range(len(fields_sorted))]
+    for i, wavelength in enumerate(wavelengths_sorted):
+        for j, field in enumerate(fields_sorted):
+            chief_ray = get_chief_ray_by_ids(
+                results,
+                wavelength_id=i,
+                field_id=j,
+                axis=axis,
+            )
+            yield j, i, {
+                "positions": results.image_plane_positions(
+                    "ray_bundle", wavelength_id=i, field_id=j, axis=axis
+                ),
+                "chief_ray_position": get_positions_at_image_plane(
+                    chief_ray, raise_on_terminated=True
+                ),
+                "wavelength": wavelength,
+                "field": field,
+                "bbox": bboxes[j],
+                "image_space_na": image_space_nas[i],
+            }
+
+
 def plot_spot_diagrams(
-    results: list[RayTraceResults],
+    results: IndexedResults,
     wavelengths: list[Spec],
     fields: list[Field],
     axes: list[str],
     image_space_nas: list[float],
+    mode: PlotMode = "auto",
 ) -> None:
     wavelengths_sorted = sort_specs(wavelengths)
     fields_sorted = sort_specs(fields)
@@ -319,56 +741,165 @@ def plot_spot_diagrams(
         axes_sorted,
     )
 
-    _, axs = plt.subplots(
-        num_rows,
-        num_columns,
-        figsize=(num_columns * 5, num_rows * 5),
-        constrained_layout=True
-    )
-
-    axis = axes_sorted[0]
-    for i, wavelength in enumerate(wavelengths_sorted):
-        for j, field in enumerate(fields_sorted):
-            bbox = bounding_box(results, j, axis)
-            ax = axs[j, i] if num_rows > 1 else axs[i]
-            bundle = get_ray_bundle_by_ids(
-                results,
-                wavelength_id=i,
-                field_id=j,
-                axis=axis,
-            )
-            chief_ray = get_chief_ray_by_ids(
-                results,
-                wavelength_id=i,
-                field_id=j,
-                axis=axis,
-            )
-            rays_at_image_plane = get_rays_at_image_plane(bundle)
-            chief_ray_at_image_plane = get_rays_at_image_plane(chief_ray, raise_on_terminated=True)
-            positions, _ = convert_rays_to_numpy_arrays(rays_at_image_plane)
-            chief_ray_position, _ = convert_rays_to_numpy_arrays(chief_ray_at_image_plane)
+    # One page per axis
+    for axis in axes_sorted:
+        fig, axs = plt.subplots(
+            num_rows,
+            num_columns,
+            figsize=(num_columns * 5, num_rows * 5),
+            constrained_layout=True,
+            squeeze=False,
+        )
+        fig.suptitle(f"Axis: {axis}")
 
+        panels = iter_panels(
+            results, wavelengths_sorted, fields_sorted, axis, image_space_nas
+        )
+        for row, column, panel in panels:
             plot_spot_diagram(
-                positions,
-                ax,
-                wavelength,
-                field,
-                bbox=bbox,
-                image_space_na=image_space_nas[i],
-                chief_ray_position=chief_ray_position,
+                panel["positions"],
+                axs[row, column],
+                panel["wavelength"],
+                panel["field"],
+                bbox=panel["bbox"],
+                image_space_na=panel["image_space_na"],
+                chief_ray_position=panel["chief_ray_position"],
+                mode=mode,
             )
 
     plt.show()
 
 
+def render_panel(job: PanelJob) -> list[Path]:
+    """Renders a spot diagram and its energy curves to files with the Agg backend.
+
+    This is run in worker processes, so it creates and closes its own figure.
+
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5), constrained_layout=True)
+    spot_ax, energy_ax = fig.subplots(1, 2)
+
+    curves = plot_spot_diagram(
+        job["positions"],
+        spot_ax,
+        job["wavelength"],
+        job["field"],
+        bbox=job["bbox"],
+        image_space_na=job["image_space_na"],
+        chief_ray_position=job["chief_ray_position"],
+        mode=job["mode"],
+    )
+    if curves is None:
+        curves = energy_curves(job["positions"], job["chief_ray_position"][0])
+    plot_energy_curves(curves, energy_ax)
+
+    paths = []
+    for format in job["formats"]:
+        path = job["out_stem"].with_suffix(f".{format}")
+        fig.savefig(path)
+        paths.append(path)
+
+    return paths
+
+
+def _use_agg_backend() -> None:
+    plt.switch_backend("Agg")
+
+
+def render_report(
+    results: IndexedResults,
+    wavelengths: list[Spec],
+    fields: list[Field],
+    axes: list[str],
+    image_space_nas: list[float],
+    out_dir: Path,
+    formats: tuple[str, ...] = ("png",),
+    mode: PlotMode = "auto",
+    max_workers: Optional[int] = None,
+) -> Path:
+    """Renders every panel of every axis page to files without displaying them.
+
+    Each panel is rendered to its own files by a pool of worker processes. The PNG
+    panels are then assembled into a multi-page PDF report with one page per axis.
+
+    Returns the path to the PDF report.
+
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    wavelengths_sorted = sort_specs(wavelengths)
+    fields_sorted = sort_specs(fields)
+    axes_sorted = sorted(axes)
+    num_rows, num_columns, _ = determine_layout(
+        wavelengths_sorted,
+        fields_sorted,
+        axes_sorted,
+    )
+
+    if "png" not in formats:
+        formats = (*formats, "png")
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs: list[tuple[str, int, int, PanelJob]] = []
+    for axis in axes_sorted:
+        panels = iter_panels(
+            results, wavelengths_sorted, fields_sorted, axis, image_space_nas
+        )
+        for row, column, panel in panels:
+            job: PanelJob = {
+                **panel,
+                "mode": mode,
+                "out_stem": out_dir / f"spot_{axis}_field{row}_wavelength{column}",
+                "formats": formats,
+            }
+            jobs.append((axis, row, column, job))
+
+    with ProcessPoolExecutor(max_workers, initializer=_use_agg_backend) as executor:
+        rendered = list(executor.map(render_panel, [job for *_, job in jobs]))
+
+    report_path = out_dir / "spot_diagrams.pdf"
+    with PdfPages(report_path) as pdf:
+        for axis in axes_sorted:
+            fig = Figure(figsize=(num_columns * 10, num_rows * 5))
+            axs = fig.subplots(num_rows, num_columns, squeeze=False)
+            fig.suptitle(f"Axis: {axis}")
+            for (job_axis, row, column, _), paths in zip(jobs, rendered):
+                if job_axis != axis:
+                    continue
+                png = next(path for path in paths if path.suffix == ".png")
+                axs[row, column].imshow(plt.imread(png))
+                axs[row, column].set_axis_off()
+            pdf.savefig(fig)
+
+    return report_path
+
+
 def main(
     file_path: Path,
     wavelengths: list[Spec],
     fields: list[Field],
     axes: list[str],
     image_space_nas: list[float],
+    use_cache: bool = False,
+    report_dir: Optional[Path] = None,
 ) -> None:
-    results = read_results_file(file_path)
+    results = IndexedResults(read_results_file_columnar(file_path, use_cache=use_cache))
+
+    if report_dir is not None:
+        render_report(
+            results,
+            wavelengths,
+            fields,
+            axes,
+            image_space_nas,
+            report_dir,
+        )
+        return
+
     plot_spot_diagrams(
         results,
         wavelengths,
@@ -378,46 +909,130 @@ def main(
     )
 
 
-def ray_bundle_to_js(bundle: RayBundle, surfaceId: int) -> dict[str, Any]:
-    intersections_x = []
-    intersections_y = []
+type ExportFormat = Literal["json", "ndjson"]
+type ExportEncoding = Literal["list", "base64"]
+
+
+def decimate(positions: np.ndarray, max_points: Optional[int] = None) -> np.ndarray:
+    """Keeps every n-th ray so that at most max_points rays remain."""
+    if max_points is not None and max_points < 1:
+        raise ValueError(f"max_points must be at least 1, got {max_points}")
+
+    if max_points is None or len(positions) <= max_points:
+        return positions
+
+    step = -(-len(positions) // max_points)
+    return positions[::step]
+
 
-    rays = get_rays_at_surface(bundle, surfaceId)
-    for ray in rays:
-        intersections_x.append(ray["pos"][0])
-        intersections_y.append(ray["pos"][1])
+def encode_coordinates(values: np.ndarray, encoding: ExportEncoding = "list") -> Any:
+    """Encodes a 1D array of coordinates for the React component.
 
-    # remove rays whose corresponding terminated value is not 0
-    terminated = bundle["terminated"]
-    terminated_indices = [i for i, t in enumerate(terminated) if t != 0]
-    intersections_x = [x for i, x in enumerate(intersections_x) if i not in terminated_indices]
-    intersections_y = [y for i, y in enumerate(intersections_y) if i not in terminated_indices]
+    The base64 encoding holds the bytes of a little-endian Float32Array.
+
+    """
+    if encoding == "base64":
+        return base64.b64encode(values.astype("<f4").tobytes()).decode("ascii")
+
+    return values.tolist()
+
+
+def ray_bundle_to_js(
+    bundle: RayBundleArrays,
+    surfaceId: int,
+    encoding: ExportEncoding = "list",
+    max_points: Optional[int] = None,
+) -> dict[str, Any]:
+    positions = decimate(get_positions_at_surface(bundle, surfaceId), max_points)
 
     return {
-        "x": intersections_x,
-        "y": intersections_y,
+        "x": encode_coordinates(positions[:, 0], encoding),
+        "y": encode_coordinates(positions[:, 1], encoding),
     }
 
 
-def transform(file_path: Path) -> None:
-    """Transform data into the format required by the React component."""
-    results = read_results_file(file_path)
-    assert results[0]["ray_bundle"]["num_surfaces"] == results[0]["chief_ray"]["num_surfaces"]
-    num_surfaces = results[0]["ray_bundle"]["num_surfaces"]
-
-    transformed_results = []
+def iter_transformed_records(
+    results: Iterable[RayTraceResultsArrays],
+    encoding: ExportEncoding = "list",
+    max_points_per_surface: Optional[int] = None,
+) -> Iterator[dict[str, Any]]:
+    """Yields one record for the React component per result and surface."""
     for result in results:
+        assert result["ray_bundle"]["num_surfaces"] == result["chief_ray"]["num_surfaces"]
+        num_surfaces = result["ray_bundle"]["num_surfaces"]
+
         for surface_id in range(num_surfaces):
-            transformed_results.append({
+            yield {
                 "surfaceId": surface_id,
                 "wavelengthId": result["wavelength_id"],
                 "fieldId": result["field_id"],
-                "rayBundle": ray_bundle_to_js(result["ray_bundle"], surface_id),
-                "chiefRay": ray_bundle_to_js(result["chief_ray"], surface_id),
-            })
+                "rayBundle": ray_bundle_to_js(
+                    result["ray_bundle"], surface_id, encoding, max_points_per_surface
+                ),
+                "chiefRay": ray_bundle_to_js(result["chief_ray"], surface_id, encoding),
+            }
 
-    with open("transformed.json", "w") as file:
-        json.dump(transformed_results, file, indent=2)
+
+def write_records(
+    records: Iterable[dict[str, Any]],
+    file: TextIO,
+    format: ExportFormat = "json",
+) -> None:
+    """Writes records one at a time as either a compact JSON array or NDJSON."""
+    if format == "ndjson":
+        for record in records:
+            file.write(json.dumps(record, separators=(",", ":")))
+            file.write("\n")
+        return
+
+    file.write("[")
+    for i, record in enumerate(records):
+        if i > 0:
+            file.write(",")
+        file.write(json.dumps(record, separators=(",", ":")))
+    file.write("]")
+
+
+def transform(
+    file_path: Path,
+    out_path: Path = TRANSFORMED_FILE,
+    format: ExportFormat = "json",
+    encoding: ExportEncoding = "list",
+    max_points_per_surface: Optional[int] = None,
+    use_cache: bool = False,
+) -> None:
+    """Transform data into the format required by the React component.
+
+    Results are streamed from the input file and records are written as soon as they
+    are created, so neither the results nor the transformed records are held in memory
+    all at once.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path to the JSON results file.
+    out_path : Path
+        Path to the output file.
+    format : ExportFormat
+        "json" writes a single compact JSON array; "ndjson" writes one record per line.
+    encoding : ExportEncoding
+        "list" writes the coordinates as JSON numbers; "base64" writes them as base64
+        encoded Float32Arrays.
+    max_points_per_surface : Optional[int]
+        If given, the ray bundles at each surface are decimated to at most this many
+        rays.
+    use_cache : bool
+        If True, read the results through the binary sidecar cache.
+
+    """
+    if use_cache:
+        results = read_results_file_columnar(file_path, use_cache=True)
+    else:
+        results = iter_results_file(file_path)
+
+    records = iter_transformed_records(results, encoding, max_points_per_surface)
+    with open(out_path, "w") as file:
+        write_records(records, file, format)
 
 
 if __name__ == "__main__":
@@ -427,5 +1042,9 @@ if __name__ == "__main__":
         transform(DATA_FILE)
         sys.exit(0)
 
+    if len(sys.argv) > 2 and sys.argv[1] == "-r":
+        main(DATA_FILE, WAVELENGTHS, FIELDS, AXES, IMAGE_SPACE_NAS, report_dir=Path(sys.argv[2]))
+        sys.exit(0)
+
     plt.switch_backend("QtAgg")
     main(DATA_FILE, WAVELENGTHS, FIELDS, AXES, IMAGE_SPACE_NAS)
@@ -0,0 +1,232 @@
+import base64
+import json
+import os
+
+import matplotlib
+import numpy as np
+import pytest
+
+import spot_diagram as sd
+
+matplotlib.use("Agg")
+
+NUM_RAYS = 50
+NUM_SURFACES = 3
+WAVELENGTHS = sd.WAVELENGTHS[:2]
+FIELDS = sd.FIELDS
+IMAGE_SPACE_NAS = sd.IMAGE_SPACE_NAS[:2]
+
+
+def bundle(rng, num_rays, num_surfaces, terminated=()):
+    """A ray bundle with its rays stored surface by surface, as in the results file."""
+    rays = [
+        {"pos": rng.normal(size=3).tolist(), "dir": [0.0, 0.0, 1.0]}
+        for _ in range(num_surfaces * num_rays)
+    ]
+    flags = [1 if i in terminated else 0 for i in range(num_rays)]
+
+    return {
+        "rays": rays,
+        "terminated": flags,
+        "reason_for_termination": {str(i): "clipped" for i in terminated},
+        "num_surfaces": num_surfaces,
+    }
+
+
+@pytest.fixture
+def results_file(tmp_path):
+    rng = np.random.default_rng(0)
+    results = [
+        {
+            "wavelength_id": wavelength_id,
+            "field_id": field_id,
+            "axis": "Y",
+            "ray_bundle": bundle(rng, NUM_RAYS, NUM_SURFACES, terminated=(3, 7)),
+            "chief_ray": bundle(rng, 1, NUM_SURFACES),
+        }
+        for wavelength_id in range(len(WAVELENGTHS))
+        for field_id in range(len(FIELDS))
+    ]
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps({"rayTraceView": {"results": results}}))
+
+    return path
+
+
+def test_iter_results_file_matches_json_load(results_file):
+    expected = sd.read_results_file(results_file)
+
+    results = list(sd.iter_results_file(results_file))
+
+    assert len(results) == len(expected)
+    for result, raw in zip(results, expected):
+        arrays = sd.convert_bundle_to_arrays(raw["ray_bundle"])
+        np.testing.assert_array_equal(
+            result["ray_bundle"]["positions"], arrays["positions"]
+        )
+        assert result["ray_bundle"]["positions"].shape == (NUM_SURFACES, NUM_RAYS, 3)
+        assert result["ray_bundle"]["reason_for_termination"] == {
+            3: "clipped",
+            7: "clipped",
+        }
+
+
+def test_cache_round_trip_and_invalidation(results_file):
+    results = sd.read_results_file_columnar(results_file, use_cache=True)
+    assert sd.cache_path(results_file).exists()
+
+    cached = sd.read_cache(results_file)
+    assert cached is not None
+    for result, expected in zip(cached, results):
+        assert result["wavelength_id"] == expected["wavelength_id"]
+        for bundle_type in sd.BUNDLE_TYPES:
+            for key in ("positions", "directions", "terminated"):
+                np.testing.assert_array_equal(
+                    result[bundle_type][key], expected[bundle_type][key]
+                )
+            assert (
+                result[bundle_type]["reason_for_termination"]
+                == expected[bundle_type]["reason_for_termination"]
+            )
+
+    # A cache of a results file that has changed since is ignored
+    stat = results_file.stat()
+    os.utime(results_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert sd.read_cache(results_file) is None
+
+
+def test_indexed_results(results_file):
+    results = sd.IndexedResults(sd.iter_results_file(results_file))
+
+    assert len(results) == len(WAVELENGTHS) * len(FIELDS)
+    assert results.wavelength_ids(1, "Y") == [0, 1]
+    assert results.get(1, 0, "Y")["wavelength_id"] == 1
+    with pytest.raises(ValueError):
+        results.get(5, 0, "Y")
+
+    positions = results.image_plane_positions("ray_bundle", 0, 1, "Y")
+    assert positions.shape == (NUM_RAYS - 2, 3)
+    assert results.image_plane_positions("ray_bundle", 0, 1, "Y") is positions
+
+
+@pytest.mark.parametrize("encoding", ["list", "base64"])
+def test_transform_ndjson_with_decimation(results_file, tmp_path, encoding):
+    out_path = tmp_path / "transformed.ndjson"
+
+    sd.transform(
+        results_file,
+        out_path,
+        format="ndjson",
+        encoding=encoding,
+        max_points_per_surface=10,
+    )
+
+    records = [json.loads(line) for line in out_path.read_text().splitlines()]
+    assert len(records) == len(WAVELENGTHS) * len(FIELDS) * NUM_SURFACES
+
+    first = next(sd.iter_results_file(results_file))
+    expected = sd.get_positions_at_surface(first["ray_bundle"], 0)[::5, 0]
+    x = records[0]["rayBundle"]["x"]
+    if encoding == "base64":
+        x = np.frombuffer(base64.b64decode(x), dtype="<f4")
+    np.testing.assert_allclose(x, expected, rtol=1e-6)
+
+
+def test_transform_json_matches_cached_transform(results_file, tmp_path):
+    sd.transform(results_file, tmp_path / "a.json")
+    sd.transform(results_file, tmp_path / "b.json", use_cache=True)
+    sd.transform(results_file, tmp_path / "c.json", use_cache=True)
+
+    records = json.loads((tmp_path / "a.json").read_text())
+    assert len(records) == len(WAVELENGTHS) * len(FIELDS) * NUM_SURFACES
+    assert records[0]["surfaceId"] == 0
+    assert len(records[0]["rayBundle"]["x"]) == NUM_RAYS - 2
+    assert (tmp_path / "b.json").read_text() == (tmp_path / "a.json").read_text()
+    assert (tmp_path / "c.json").read_text() == (tmp_path / "a.json").read_text()
+
+
+def test_rasterize_counts_rays_and_computes_energy():
+    rng = np.random.default_rng(1)
+    positions = rng.normal(size=(1000, 3))
+    center = np.zeros(3)
+
+    density = sd.rasterize(positions, bins=32, center=center)
+
+    assert density["counts"].shape == (32, 32)
+    assert density["counts"].sum() == len(positions)
+    assert sd.rasterize(positions, bins=32)["energy"] is None
+
+    # The energy curves match counting the rays inside each circle and square
+    curves = density["energy"]
+    offsets = positions[:, :2] - center[:2]
+    r_circle = np.hypot(offsets[:, 0], offsets[:, 1])
+    r_square = np.max(np.abs(offsets), axis=1)
+    radii = curves["radii"]
+    np.testing.assert_allclose(
+        curves["encircled"], [np.mean(r_circle <= r) for r in radii]
+    )
+    np.testing.assert_allclose(
+        curves["ensquared"], [np.mean(r_square <= r) for r in radii]
+    )
+    assert curves["encircled"][-1] == 1.0
+    assert np.all(curves["ensquared"] >= curves["encircled"])
+
+
+def test_plot_spot_diagram_returns_energy_only_in_density_mode():
+    from matplotlib.figure import Figure
+
+    rng = np.random.default_rng(2)
+    positions = rng.normal(size=(500, 3))
+    chief_ray_position = np.zeros((1, 3))
+    ax = Figure().subplots()
+
+    curves = sd.plot_spot_diagram(
+        positions,
+        ax,
+        WAVELENGTHS[0],
+        FIELDS[0],
+        chief_ray_position=chief_ray_position,
+        mode="density",
+    )
+
+    assert curves is not None
+    assert "EE80" in ax.get_title()
+    assert (
+        sd.plot_spot_diagram(
+            positions, ax, chief_ray_position=chief_ray_position, mode="scatter"
+        )
+        is None
+    )
+
+
+def test_render_report(results_file, tmp_path):
+    results = sd.IndexedResults(sd.read_results_file_columnar(results_file))
+
+    report = sd.render_report(
+        results,
+        WAVELENGTHS,
+        FIELDS,
+        sd.AXES,
+        IMAGE_SPACE_NAS,
+        tmp_path / "report",
+        formats=("svg",),
+        mode="density",
+        max_workers=2,
+    )
+
+    assert report.exists()
+    assert report.read_bytes().startswith(b"%PDF")
+    for stem in ("spot_Y_field0_wavelength0", "spot_Y_field1_wavelength1"):
+        assert (tmp_path / "report" / f"{stem}.png").exists()
+        assert (tmp_path / "report" / f"{stem}.svg").exists()
+
+
+def test_decimate_keeps_at_most_max_points():
+    positions = np.arange(30.0).reshape(10, 3)
+
+    assert len(sd.decimate(positions, 3)) == 3
+    np.testing.assert_array_equal(sd.decimate(positions, 3)[:, 0], [0, 12, 24])
+    assert sd.decimate(positions) is positions
+    for max_points in (0, -2):
+        with pytest.raises(ValueError):
+            sd.decimate(positions, max_points)